@@ -1,25 +1,73 @@
-from .core import ChainFactoryEngine, ChainFactoryEngineConfig
-from .core.factory import ChainFactory
-from .core.components import (
-    FactoryDefinitions,
-    FactoryPrompt,
-    FactoryOutput,
-    FactoryInput,
-)
-from .core.parsing.class_from_dict import create_class_from_dict
-
-Engine = ChainFactoryEngine  # alias
-EngineConfig = ChainFactoryEngineConfig  # alias
-
-__all__ = [
-    "ChainFactoryEngine",
-    "ChainFactoryEngineConfig",
-    "Engine",
-    "EngineConfig",
-    "ChainFactory",
-    "FactoryDefinitions",
-    "FactoryPrompt",
-    "FactoryOutput",
-    "FactoryInput",
-    "create_class_from_dict",
-]
+"""
+The public API of chainfactory. The names are imported on first access, so `import chainfactory`
+(e.g. by the CLI or a tool module) doesn't pay for the engine and its dependencies up front.
+"""
+
+import importlib
+from typing import TYPE_CHECKING, Any
+
+if TYPE_CHECKING:
+    from .core import ChainFactoryEngine, ChainFactoryEngineConfig
+    from .core.factory import ChainFactory
+    from .core.registry import ChainRegistry
+    from .core.engine.cancellation import (
+        CancelToken,
+        ChainCancelledError,
+        ChainTimeoutError,
+    )
+    from .core.engine.cassette import Cassette, CassetteMissError
+    from .core.engine.checkpoints import CheckpointStore, SQLiteCheckpointStore
+    from .core.engine.distributed import ChainFactoryWorker, SQLiteTaskQueue, TaskQueue
+    from .core.components import (
+        FactoryDefinitions,
+        FactoryPrompt,
+        FactoryOutput,
+        FactoryInput,
+    )
+    from .core.parsing.class_from_dict import create_class_from_dict
+
+    Engine = ChainFactoryEngine  # alias
+    EngineConfig = ChainFactoryEngineConfig  # alias
+
+_EXPORTS: dict[str, tuple[str, str]] = {
+    "ChainFactoryEngine": (".core.engine", "ChainFactoryEngine"),
+    "ChainFactoryEngineConfig": (".core.engine", "ChainFactoryEngineConfig"),
+    "Engine": (".core.engine", "ChainFactoryEngine"),  # alias
+    "EngineConfig": (".core.engine", "ChainFactoryEngineConfig"),  # alias
+    "ChainFactory": (".core.factory", "ChainFactory"),
+    "ChainRegistry": (".core.registry", "ChainRegistry"),
+    "CancelToken": (".core.engine.cancellation", "CancelToken"),
+    "ChainCancelledError": (".core.engine.cancellation", "ChainCancelledError"),
+    "ChainTimeoutError": (".core.engine.cancellation", "ChainTimeoutError"),
+    "Cassette": (".core.engine.cassette", "Cassette"),
+    "CassetteMissError": (".core.engine.cassette", "CassetteMissError"),
+    "CheckpointStore": (".core.engine.checkpoints", "CheckpointStore"),
+    "SQLiteCheckpointStore": (".core.engine.checkpoints", "SQLiteCheckpointStore"),
+    "TaskQueue": (".core.engine.distributed", "TaskQueue"),
+    "SQLiteTaskQueue": (".core.engine.distributed", "SQLiteTaskQueue"),
+    "ChainFactoryWorker": (".core.engine.distributed", "ChainFactoryWorker"),
+    "FactoryDefinitions": (".core.components", "FactoryDefinitions"),
+    "FactoryPrompt": (".core.components", "FactoryPrompt"),
+    "FactoryOutput": (".core.components", "FactoryOutput"),
+    "FactoryInput": (".core.components", "FactoryInput"),
+    "create_class_from_dict": (
+        ".core.parsing.class_from_dict",
+        "create_class_from_dict",
+    ),
+}
+
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name: str) -> Any:
+    if name not in _EXPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+    module_name, attribute = _EXPORTS[name]
+    value = getattr(importlib.import_module(module_name, __name__), attribute)
+    globals()[name] = value  # later accesses skip __getattr__
+    return value
+
+
+def __dir__() -> list[str]:
+    return sorted(list(globals()) + __all__)
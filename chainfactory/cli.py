@@ -0,0 +1,559 @@
+"""
+The `chainfactory` command line interface.
+
+    chainfactory warmup chains/ --provider openai --model gpt-4o --ping
+    chainfactory run chain.fctr --input inputs.jsonl --concurrency 8 --profile > outputs.jsonl
+    chainfactory worker chain.fctr --queue .chainfactory/tasks.db --concurrency 8
+"""
+
+import argparse
+import dataclasses
+import importlib
+import json
+import math
+import os
+import sys
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any
+
+from chainfactory.core.engine import ChainFactoryEngine, ChainFactoryEngineConfig
+from chainfactory.core.engine.distributed import ChainFactoryWorker, SQLiteTaskQueue
+from chainfactory.core.factory import ChainFactoryLink
+from chainfactory.core.utils import count_tokens, to_jsonable
+
+
+def _add_engine_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument(
+        "--config",
+        default=None,
+        help="engine config to use, as `module:attribute` (e.g. to register tools)",
+    )
+    parser.add_argument("--provider", choices=["openai", "anthropic", "ollama"])
+    parser.add_argument("--model", default=None)
+    parser.add_argument("--temperature", type=float, default=None)
+    parser.add_argument(
+        "--max-parallel-chains",
+        type=int,
+        default=None,
+        help="maximum number of concurrent model calls within a run",
+    )
+    parser.add_argument(
+        "--adaptive-concurrency",
+        action="store_true",
+        default=None,
+        help="adapt the concurrent calls to every model to its latency and throttling",
+    )
+
+
+def _engine_config(args: argparse.Namespace) -> ChainFactoryEngineConfig:
+    """
+    Create the engine config from the `--config` object, overridden by the other flags.
+    """
+    config = ChainFactoryEngineConfig()
+    if args.config:
+        module_name, _, attribute = args.config.partition(":")
+        config = getattr(importlib.import_module(module_name), attribute or "config")
+
+        if not isinstance(config, ChainFactoryEngineConfig):
+            raise ValueError(f"{args.config} is not a ChainFactoryEngineConfig.")
+
+    overrides = {
+        "provider": args.provider,
+        "model": args.model,
+        "temperature": args.temperature,
+        "max_parallel_chains": args.max_parallel_chains,
+        "adaptive_concurrency": args.adaptive_concurrency,
+    }
+
+    return dataclasses.replace(
+        config,
+        pause_between_executions=False,
+        **{k: v for k, v in overrides.items() if v is not None},
+    )
+
+
+def _fctr_files(paths: list[str]) -> list[str]:
+    """
+    Expand the directories among the paths into the .fctr files they contain.
+    """
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, names in sorted(os.walk(path)):
+                files.extend(
+                    os.path.join(root, name)
+                    for name in sorted(names)
+                    if name.endswith(".fctr")
+                )
+        else:
+            files.append(path)
+
+    return files
+
+
+def warmup(args: argparse.Namespace) -> int:
+    """
+    Load the chains, resolve their templates (filling `.chainfactory/cache`) and warm up their engines.
+    """
+    config = _engine_config(args)
+    report = {}
+    failed = False
+
+    for path in _fctr_files(args.paths):
+        timings = {}
+        try:
+            start = time.perf_counter()
+            engine = ChainFactoryEngine.from_file(path, config=config)
+            timings["load"] = round(time.perf_counter() - start, 4)
+            timings.update(engine.warmup(ping=args.ping))
+            timings["total"] = round(sum(timings.values()), 4)
+        except Exception as e:
+            failed = True
+            timings["error"] = str(e)  # type: ignore
+            if not args.json:
+                traceback.print_exc()
+
+        report[path] = timings
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        for path, timings in report.items():
+            print(path)
+            for step, value in timings.items():
+                if step == "error":
+                    print(f"  {step}: {value}")
+                else:
+                    print(f"  {step}: {value:.4f}s")
+
+    return 1 if failed else 0
+
+
+class RateLimiter:
+    """
+    Spaces out the start of the runs to at most `rate` per second, across all the threads.
+    """
+
+    def __init__(self, rate: float | None):
+        self.interval = 1 / rate if rate else 0
+        self.next_start = time.monotonic()
+        self.lock = threading.Lock()
+
+    def wait(self) -> None:
+        if not self.interval:
+            return
+
+        with self.lock:
+            now = time.monotonic()
+            start = max(now, self.next_start)
+            self.next_start = start + self.interval
+
+        if start > now:
+            time.sleep(start - now)
+
+
+def _dumps(value: Any) -> str:
+    return json.dumps(to_jsonable(value, default=str))
+
+
+def _read_inputs(path: str) -> list[dict]:
+    """
+    Read the inputs from a JSON file (an object or a list of objects) or a JSONL file. `-` is stdin.
+    """
+    if path == "-":
+        content = sys.stdin.read()
+    else:
+        with open(path, "r") as f:
+            content = f.read()
+
+    try:
+        inputs = json.loads(content)
+    except json.JSONDecodeError:
+        inputs = []
+        for i, line in enumerate(content.splitlines(), start=1):
+            if not line.strip():
+                continue
+
+            try:
+                inputs.append(json.loads(line))
+            except json.JSONDecodeError as e:
+                raise ValueError(f"Invalid JSON on line {i} of {path}: {e.msg}.") from e
+
+    if isinstance(inputs, dict):
+        inputs = [inputs]
+
+    if not isinstance(inputs, list) or not all(isinstance(i, dict) for i in inputs):
+        raise ValueError("The inputs must be JSON objects.")
+
+    return inputs
+
+
+def _percentile(values: list[float], percentile: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, math.ceil(percentile * len(ordered)) - 1)]
+
+
+def _profile(
+    engine: ChainFactoryEngine,
+    traces: list[list[dict]],
+    model: str,
+    wall_time: float,
+    failed: int,
+) -> dict:
+    """
+    Aggregate the traces of all the runs into per-stage timings and token counts. When the
+    provider doesn't report the usage, the tokens are estimated (prefixed with `~`) from the
+    prompt templates, the inputs and the outputs of every stage.
+    """
+    stages = {}
+    for name, data in engine.chains.items():
+        times = [
+            entry["execution_time"]
+            for trace in traces
+            for entry in trace
+            if entry["name"] == name
+        ]
+        if not times:
+            continue
+
+        stage = {
+            "runs": len(times),
+            "total_s": round(sum(times), 4),
+            "mean_s": round(sum(times) / len(times), 4),
+            "p50_s": round(_percentile(times, 0.5), 4),
+            "p95_s": round(_percentile(times, 0.95), 4),
+            "max_s": round(max(times), 4),
+        }
+
+        link = data["link"]
+        if isinstance(link, ChainFactoryLink) and link.prompt:
+            entries = [
+                entry for trace in traces for entry in trace if entry["name"] == name
+            ]
+            usages = [entry["usage"] for entry in entries if entry.get("usage")]
+
+            if any(usage["calls"] for usage in usages):  # reported by the provider
+                stage["input_tokens"] = sum(u["input_tokens"] for u in usages)
+                stage["output_tokens"] = sum(u["output_tokens"] for u in usages)
+                stage["cached_tokens"] = sum(u["cache_read_tokens"] for u in usages)
+            else:
+                template_tokens = count_tokens(link.prompt.template or "", model)
+                input_tokens = 0
+                output_tokens = 0
+                for entry in entries:
+                    calls = len(entry["out"]) if link._link_type == "parallel" else 1
+                    input_tokens += template_tokens * calls + count_tokens(
+                        _dumps(entry["in"]), model
+                    )
+                    output_tokens += count_tokens(_dumps(entry["out"]), model)
+
+                stage["input_tokens"] = f"~{input_tokens}"
+                stage["output_tokens"] = f"~{output_tokens}"
+
+        stages[name] = stage
+
+    return {
+        "runs": len(traces) + failed,
+        "failed": failed,
+        "wall_time_s": round(wall_time, 4),
+        "runs_per_s": (
+            round((len(traces) + failed) / wall_time, 4) if wall_time else None
+        ),
+        "stages": stages,
+    }
+
+
+def _print_profile(profile: dict) -> None:
+    print(
+        f"runs: {profile['runs']}  failed: {profile['failed']}  "
+        f"wall time: {profile['wall_time_s']:.2f}s  runs/s: {profile['runs_per_s']}",
+        file=sys.stderr,
+    )
+
+    columns = [
+        "runs",
+        "total_s",
+        "mean_s",
+        "p50_s",
+        "p95_s",
+        "max_s",
+        "input_tokens",
+        "output_tokens",
+        "cached_tokens",
+    ]
+    width = max([len("stage")] + [len(name) for name in profile["stages"]])
+    print("stage".ljust(width) + "".join(c.rjust(18) for c in columns), file=sys.stderr)
+    for name, stage in profile["stages"].items():
+        print(
+            name.ljust(width)
+            + "".join(str(stage.get(c, "-")).rjust(18) for c in columns),
+            file=sys.stderr,
+        )
+
+
+def run(args: argparse.Namespace) -> int:
+    """
+    Run a chain over a batch of JSON inputs and write one JSON output per line, in input order.
+    """
+    config = _engine_config(args)
+    if args.queue:
+        config = dataclasses.replace(config, task_queue=SQLiteTaskQueue(args.queue))
+
+    engine = ChainFactoryEngine.from_file(args.path, config=config)
+    inputs = _read_inputs(args.input)
+
+    if args.dry_run:
+        for i, input in enumerate(inputs):
+            for name, prompt in engine.render_prompts(input).items():
+                print(f"=== input {i} / {name} ===")
+                print(prompt)
+                print()
+
+        return 0
+
+    local = threading.local()
+    limiter = RateLimiter(args.rate_limit)
+
+    def execute(indexed: tuple[int, dict]) -> dict:
+        index, input = indexed
+        if not hasattr(
+            local, "engine"
+        ):  # engines keep the trace of their run, one per thread
+            local.engine = ChainFactoryEngine(engine.factory, config)
+            local.engine.dedup_caches = engine.dedup_caches  # shared across threads
+
+        run_engine: ChainFactoryEngine = local.engine
+        run_engine.execution_trace = {}
+        run_engine.execution_trace_list = []
+        limiter.wait()
+
+        record: dict[str, Any] = {"index": index, "input": input}
+        try:
+            output = run_engine.run(input, timeout=args.timeout)
+            if len(run_engine.execution_trace_list) < len(run_engine.chains):
+                raise ValueError("The run stopped before the last chainlink.")
+
+            record["output"] = output
+        except Exception as e:
+            record["error"] = str(e)
+
+        record["trace"] = run_engine.execution_trace_list
+        return record
+
+    output_file = open(args.output, "w") if args.output else sys.stdout
+    trace_file = open(args.trace_out, "w") if args.trace_out else None
+    traces = []
+    failed = 0
+    start = time.perf_counter()
+
+    try:
+        with ThreadPoolExecutor(args.concurrency) as executor:
+            for record in executor.map(execute, enumerate(inputs)):
+                if "error" in record:
+                    failed += 1
+                    output_file.write(_dumps({"error": record["error"]}) + "\n")
+                else:
+                    traces.append(record["trace"])
+                    output_file.write(_dumps(record["output"]) + "\n")
+
+                output_file.flush()
+
+                if trace_file:
+                    record["trace"] = [
+                        {
+                            "name": entry["name"],
+                            "type": entry["type"],
+                            "is_tool": entry["is_tool"],
+                            "execution_time": entry["execution_time"],
+                            "skipped": entry["skipped"],
+                            "in": entry["in"],
+                            "out": entry["out"],
+                            "model": entry["model"],
+                            "usage": entry["usage"],
+                            "concurrency": entry["concurrency"],
+                        }
+                        for entry in record["trace"]
+                    ]
+                    trace_file.write(_dumps(record) + "\n")
+
+                if not args.profile:
+                    traces.clear()
+    finally:
+        if output_file is not sys.stdout:
+            output_file.close()
+
+        if trace_file:
+            trace_file.close()
+
+    if args.profile:
+        _print_profile(
+            _profile(engine, traces, config.model, time.perf_counter() - start, failed)
+        )
+
+    return 1 if failed else 0
+
+
+def worker(args: argparse.Namespace) -> int:
+    """
+    Execute the parallel elements that `run --queue` (or engines with a task queue) dispatch
+    for the chains, until interrupted or idle for `--idle-timeout` seconds.
+    """
+    config = _engine_config(args)
+    engines = [
+        ChainFactoryEngine.from_file(path, config=config)
+        for path in _fctr_files(args.paths)
+    ]
+    if not engines:
+        raise ValueError("No .fctr files found.")
+
+    chain_worker = ChainFactoryWorker(
+        engines,
+        SQLiteTaskQueue(args.queue),
+        concurrency=args.concurrency,
+        worker_id=args.worker_id,
+    )
+    print(
+        f"Worker {chain_worker.worker_id} serving {len(engines)} chain(s) from {args.queue}",
+        file=sys.stderr,
+    )
+    executed = chain_worker.run(idle_timeout=args.idle_timeout)
+    print(
+        f"Executed {executed} task(s), {chain_worker.failed} failed.", file=sys.stderr
+    )
+    return 0
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(prog="chainfactory")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    warmup_parser = subparsers.add_parser(
+        "warmup",
+        help="Load chains and set up their templates, models and connections ahead of time.",
+    )
+    warmup_parser.add_argument(
+        "paths", nargs="+", help=".fctr files or directories containing them"
+    )
+    warmup_parser.add_argument(
+        "--ping",
+        action="store_true",
+        help="send a minimal request to the provider to check the connection",
+    )
+    warmup_parser.add_argument(
+        "--json", action="store_true", help="print the report as JSON"
+    )
+    _add_engine_arguments(warmup_parser)
+    warmup_parser.set_defaults(handler=warmup)
+
+    run_parser = subparsers.add_parser(
+        "run", help="Run a chain over a batch of JSON or JSONL inputs."
+    )
+    run_parser.add_argument("path", help="the .fctr file to run")
+    run_parser.add_argument(
+        "--input",
+        "-i",
+        default="-",
+        help="JSON or JSONL file with the inputs (default: stdin)",
+    )
+    run_parser.add_argument(
+        "--output",
+        "-o",
+        default=None,
+        help="JSONL file for the outputs (default: stdout)",
+    )
+    run_parser.add_argument(
+        "--concurrency",
+        "-c",
+        type=int,
+        default=1,
+        help="number of inputs processed concurrently",
+    )
+    run_parser.add_argument(
+        "--rate-limit",
+        type=float,
+        default=None,
+        help="maximum number of runs started per second",
+    )
+    run_parser.add_argument(
+        "--timeout",
+        type=float,
+        default=None,
+        help="deadline of every run in seconds, split across its stages",
+    )
+    run_parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="print per-stage timings and token estimates to stderr",
+    )
+    run_parser.add_argument(
+        "--trace-out",
+        default=None,
+        help="JSONL file for the execution trace of every run",
+    )
+    run_parser.add_argument(
+        "--dry-run",
+        action="store_true",
+        help="print the rendered prompts without calling the model; only the variables of the "
+        "sequential links reading the chain input are filled, the others stay as placeholders",
+    )
+    run_parser.add_argument(
+        "--queue",
+        default=None,
+        help="SQLite task queue to dispatch the parallel elements to `chainfactory worker` processes",
+    )
+    _add_engine_arguments(run_parser)
+    run_parser.set_defaults(handler=run)
+
+    worker_parser = subparsers.add_parser(
+        "worker",
+        help="Execute the parallel elements dispatched to a task queue by other processes.",
+    )
+    worker_parser.add_argument(
+        "paths", nargs="+", help=".fctr files or directories containing them"
+    )
+    worker_parser.add_argument(
+        "--queue",
+        default=".chainfactory/tasks.db",
+        help="SQLite task queue to take the tasks from (default: .chainfactory/tasks.db)",
+    )
+    worker_parser.add_argument(
+        "--concurrency",
+        "-c",
+        type=int,
+        default=1,
+        help="number of tasks executed concurrently",
+    )
+    worker_parser.add_argument(
+        "--idle-timeout",
+        type=float,
+        default=None,
+        help="exit after this many seconds without tasks (default: run until interrupted)",
+    )
+    worker_parser.add_argument(
+        "--worker-id", default=None, help="name of the worker (default: host:pid)"
+    )
+    _add_engine_arguments(worker_parser)
+    worker_parser.set_defaults(handler=worker)
+
+    args = parser.parse_args(argv)
+
+    if getattr(args, "concurrency", 1) < 1:
+        parser.error("--concurrency must be greater than 0")
+
+    if getattr(args, "rate_limit", None) is not None and args.rate_limit <= 0:
+        parser.error("--rate-limit must be greater than 0")
+
+    if getattr(args, "timeout", None) is not None and args.timeout <= 0:
+        parser.error("--timeout must be greater than 0")
+
+    if getattr(args, "idle_timeout", None) is not None and args.idle_timeout <= 0:
+        parser.error("--idle-timeout must be greater than 0")
+
+    return args.handler(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,21 +1,49 @@
-from .engine import ChainFactoryEngine, ChainFactoryEngineConfig
-from .factory import ChainFactory, ChainFactoryLink
-from .components import (
-    FactoryDefinitions,
-    FactoryPrompt,
-    FactoryOutput,
-    FactoryInput,
-    FactoryMask,
-)
-
-__all__ = [
-    "ChainFactoryEngine",
-    "ChainFactoryEngineConfig",
-    "ChainFactory",
-    "ChainFactoryLink",
-    "FactoryDefinitions",
-    "FactoryPrompt",
-    "FactoryOutput",
-    "FactoryInput",
-    "FactoryMask",
-]
+import importlib
+from typing import TYPE_CHECKING, Any
+
+if TYPE_CHECKING:
+    from .engine import ChainFactoryEngine, ChainFactoryEngineConfig
+    from .factory import ChainFactory, ChainFactoryLink
+    from .registry import ChainRegistry
+    from .components import (
+        FactoryDefinitions,
+        FactoryPrompt,
+        FactoryOutput,
+        FactoryInput,
+        FactoryMask,
+        FactoryReduce,
+        FactoryDedup,
+        FactoryCascade,
+    )
+
+# imported on first access, see chainfactory/__init__.py
+_EXPORTS: dict[str, str] = {
+    "ChainFactoryEngine": ".engine",
+    "ChainFactoryEngineConfig": ".engine",
+    "ChainFactory": ".factory",
+    "ChainFactoryLink": ".factory",
+    "ChainRegistry": ".registry",
+    "FactoryDefinitions": ".components",
+    "FactoryPrompt": ".components",
+    "FactoryOutput": ".components",
+    "FactoryInput": ".components",
+    "FactoryMask": ".components",
+    "FactoryReduce": ".components",
+    "FactoryDedup": ".components",
+    "FactoryCascade": ".components",
+}
+
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name: str) -> Any:
+    if name not in _EXPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+    value = getattr(importlib.import_module(_EXPORTS[name], __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__() -> list[str]:
+    return sorted(list(globals()) + __all__)
@@ -1,9 +1,17 @@
 import re
-from typing import Any, Literal
+import json
+import types
+from enum import Enum
+from typing import TYPE_CHECKING, Any, Literal, Mapping, Union, get_args, get_origin
 
+import farmhash
 from pydantic import BaseModel, Field
 
 from .parsing.class_from_dict import create_class_from_dict
+from .parsing.predicate import Predicate
+
+if TYPE_CHECKING:
+    from .engine.chainfactory_engine_config import ModelProfile
 
 
 class FactoryMask:
@@ -66,6 +74,133 @@ class FactoryMask:
         return matches
 
 
+class FactoryReduce:
+    """
+    This type is the representation of the `reduce` section of a chain factory file (only for convex chainlinks).
+    """
+
+    type: Literal["single", "tree"] = "single"
+    chunk_tokens: int = 4000
+
+    def __init__(
+        self,
+        type: Literal["single", "tree"] = "single",
+        chunk_tokens: int | None = None,
+    ):
+        if type not in ["single", "tree"]:
+            raise ValueError(
+                f"Invalid reduce type: {type}. Must be one of 'single' or 'tree'."
+            )
+
+        self.type = type
+
+        if chunk_tokens is not None:
+            if not isinstance(chunk_tokens, int) or chunk_tokens < 1:
+                raise ValueError("FactoryReduce.chunk_tokens must be greater than 0.")
+
+            self.chunk_tokens = chunk_tokens
+
+
+class FactoryDedup:
+    """
+    This type is the representation of the `dedup` section of a chain factory file (only for parallel chainlinks).
+    Elements whose normalized inputs are equal share a single result.
+    """
+
+    fields: list[str] | None = None
+    normalize: list[Literal["whitespace", "case"]] = ["whitespace", "case"]
+    cache_size: int = 10000
+
+    def __init__(
+        self,
+        fields: list[str] | None = None,
+        normalize: list[Literal["whitespace", "case"]] | None = None,
+        cache_size: int | None = None,
+    ):
+        if fields is not None:
+            if not isinstance(fields, list) or not fields:
+                raise ValueError("FactoryDedup.fields must be a non-empty list.")
+
+            self.fields = [str(field).replace(".", "$") for field in fields]
+
+        if normalize is not None:
+            for option in normalize:
+                if option not in ["whitespace", "case"]:
+                    raise ValueError(
+                        f"Invalid dedup normalization: {option}. Must be one of 'whitespace' or 'case'."
+                    )
+
+            self.normalize = normalize
+
+        if cache_size is not None:
+            if not isinstance(cache_size, int) or cache_size < 0:
+                raise ValueError("FactoryDedup.cache_size must be 0 or greater.")
+
+            self.cache_size = cache_size
+
+    def matches(self, variable: str, field: str) -> bool:
+        """
+        Check if an input variable (e.g. `emails$element$body`) is addressed by a field (e.g. `body`).
+        """
+        return variable == field or variable.endswith("$" + field)
+
+    def key(self, input: Mapping) -> str:
+        """
+        Hash the normalized values of the dedup fields (all the variables by default) of an input.
+        """
+        values = {
+            variable: self._normalize(value)
+            for variable, value in sorted(input.items())
+            if self.fields is None
+            or any(self.matches(variable, field) for field in self.fields)
+        }
+
+        return str(farmhash.FarmHash64(json.dumps(values, sort_keys=True, default=str)))
+
+    def _normalize(self, value: Any) -> Any:
+        if isinstance(value, str):
+            if "whitespace" in self.normalize:
+                value = " ".join(value.split())
+
+            if "case" in self.normalize:
+                value = value.lower()
+
+            return value
+
+        if isinstance(value, BaseModel):
+            value = value.model_dump()
+
+        if isinstance(value, Mapping):
+            return {k: self._normalize(v) for k, v in value.items()}
+
+        if isinstance(value, (list, tuple)):
+            return [self._normalize(item) for item in value]
+
+        return value
+
+
+class FactoryCascade:
+    """
+    This type is the representation of the `cascade` section of a chain factory file.
+    The outputs matching the `when` predicate are generated again with the cascade model.
+    """
+
+    when: Predicate
+    model: "str | ModelProfile"
+
+    def __init__(self, when: str, model: "str | ModelProfile"):
+        if not when:
+            raise ValueError(
+                "FactoryCascade cannot be initialized without a predicate."
+            )
+
+        if not model:
+            raise ValueError("FactoryCascade cannot be initialized without a model.")
+
+        self.when = Predicate(when)
+        self.model = model
+
+
 class FactoryDefinitions:
     """
     This type is the representation of the `def` section of a chain factory file. It contains defined types.
@@ -92,6 +227,7 @@ class FactoryDefinitions:
 
         self.definitions = definitions
 
+        created = []
         for name, definition in definitions.items():
             self.defined_types[name] = create_class_from_dict(
                 class_name=name,
@@ -99,7 +235,14 @@ class FactoryDefinitions:
                 base_class=BaseModel,
                 defined_types=self.defined_types,
                 default_value_class=Field,
+                forward_refs=set(definitions.keys()),
             )
+            created.append(self.defined_types[name])
+
+        # resolve the references to types defined further down in the section
+        for defined_type in created:
+            if not defined_type.__pydantic_complete__:
+                defined_type.model_rebuild(_types_namespace=dict(self.defined_types))
 
     def extend(self, definitions: "FactoryDefinitions"):
         """
@@ -184,6 +327,18 @@ class FactoryPrompt:
 
         return matches
 
+    def split_template(self) -> tuple[str, str]:
+        """
+        Split the template into its static prefix, the text before the first variable, and the
+        variable suffix. The prefix is the same for every call, which providers can cache.
+        """
+        assert self.template
+        match = re.search(r"(?<!\{)\{(?!\{)[^}]+\}", self.template)
+        if not match:
+            return self.template, ""
+
+        return self.template[: match.start()], self.template[match.start() :]
+
 
 class FactoryOutput:
     """
@@ -193,6 +348,7 @@ class FactoryOutput:
     _type: type
     attributes: dict
     _NAME: str = "ChainFactoryOutput"
+    _MIN_TOKENS: int = 64  # smallest estimated budget
 
     def __init__(self, attributes: dict, definitions: dict[str, type] | None = None):
         """
@@ -206,3 +362,53 @@ class FactoryOutput:
             defined_types=definitions,
             default_value_class=Field,
         )
+
+    def estimate_max_tokens(self) -> int | None:
+        """
+        Estimate an output token budget from the schema. Only bounded outputs, made of booleans,
+        numbers, literals and enums (e.g. `is_spam: bool`), are estimated. Outputs with free
+        text, lists or mappings are unbounded and return None.
+        """
+        tokens = self._estimate_tokens(self._type)
+        if tokens is None:
+            return None
+
+        return max(self._MIN_TOKENS, tokens * 2)  # room for the provider's framing
+
+    @classmethod
+    def _estimate_tokens(cls, annotation: Any) -> int | None:
+        """
+        Estimate the number of tokens of a value of the annotation in JSON, or None if unbounded.
+        """
+        if isinstance(annotation, type) and issubclass(annotation, BaseModel):
+            total = 2  # braces
+            for name, field in annotation.model_fields.items():
+                tokens = cls._estimate_tokens(field.annotation)
+                if tokens is None:
+                    return None
+
+                total += len(name) // 3 + 4 + tokens  # quoted key, colon and comma
+
+            return total
+
+        if annotation is bool or annotation is type(None) or annotation is None:
+            return 2
+
+        if annotation in (int, float):
+            return 8
+
+        if isinstance(annotation, type) and issubclass(annotation, Enum):
+            return max(len(str(member.value)) // 3 + 3 for member in annotation)
+
+        origin = get_origin(annotation)
+        if origin is Literal:
+            return max(len(str(value)) // 3 + 3 for value in get_args(annotation))
+
+        if origin is Union or origin is types.UnionType:
+            estimates = [cls._estimate_tokens(arg) for arg in get_args(annotation)]
+            if any(estimate is None for estimate in estimates):
+                return None
+
+            return max(estimates)  # type: ignore
+
+        return None
@@ -1,9 +1,22 @@
-from colorama import init
 from .chainfactory_engine import ChainFactoryEngine, ChainFactoryEngineConfig
-
-init(autoreset=True)
+from .debugger import ChainFactoryDebugger
+from .cancellation import CancelToken, ChainCancelledError, ChainTimeoutError
+from .cassette import Cassette, CassetteMissError
+from .checkpoints import CheckpointStore, SQLiteCheckpointStore
+from .distributed import ChainFactoryWorker, SQLiteTaskQueue, TaskQueue
 
 __all__ = [
     "ChainFactoryEngine",
     "ChainFactoryEngineConfig",
+    "ChainFactoryDebugger",
+    "CancelToken",
+    "ChainCancelledError",
+    "ChainTimeoutError",
+    "Cassette",
+    "CassetteMissError",
+    "CheckpointStore",
+    "SQLiteCheckpointStore",
+    "TaskQueue",
+    "SQLiteTaskQueue",
+    "ChainFactoryWorker",
 ]
@@ -0,0 +1,105 @@
+"""
+This module implements the cooperative cancellation of runs. A `CancelToken` is passed to
+`ChainFactoryEngine.run` and checked by the engine while it waits on the model calls and tools
+of a stage, so a cancelled or expired run raises `ChainCancelledError` without waiting for the
+remaining calls. Queued calls are dropped and async tools are cancelled; synchronous requests
+already in flight complete in the background and their results are discarded.
+"""
+
+import threading
+import time
+
+
+class ChainCancelledError(RuntimeError):
+    """
+    Raised when a run is cancelled through its token.
+    """
+
+
+class ChainTimeoutError(ChainCancelledError, TimeoutError):
+    """
+    Raised when a run, or a stage of it, exceeds its deadline.
+    """
+
+
+class CancelToken:
+    """
+    A token to cancel a run from another thread, with an optional deadline.
+
+    Usage:
+        token = CancelToken(timeout=30)
+        threading.Timer(5, token.cancel).start()
+        engine.run({"topic": "python"}, cancel=token)
+    """
+
+    def __init__(
+        self,
+        timeout: float | None = None,
+        parent: "CancelToken | None" = None,
+        name: str = "run",
+    ):
+        if timeout is not None and timeout <= 0:
+            raise ValueError("timeout must be greater than 0")
+
+        self.name = name
+        self.parent = parent
+        self.reason: str | None = None
+        self.deadline: float | None = (
+            None if timeout is None else time.monotonic() + timeout
+        )
+        self._event = threading.Event()
+
+        if parent and parent.deadline is not None:
+            if self.deadline is None or parent.deadline < self.deadline:
+                self.deadline = parent.deadline
+
+    def cancel(self, reason: str = "Cancelled by the caller.") -> None:
+        """
+        Cancel the run. Safe to call from any thread, more than once.
+        """
+        if not self._event.is_set():
+            self.reason = reason
+            self._event.set()
+
+    @property
+    def cancelled(self) -> bool:
+        """
+        True once the token, or its parent, is cancelled or expired.
+        """
+        return (
+            self._event.is_set()
+            or self.expired
+            or (self.parent is not None and self.parent.cancelled)
+        )
+
+    @property
+    def expired(self) -> bool:
+        return self.deadline is not None and time.monotonic() >= self.deadline
+
+    def remaining(self) -> float | None:
+        """
+        The seconds left until the deadline, or None without a deadline.
+        """
+        if self.deadline is None:
+            return None
+
+        return max(0.0, self.deadline - time.monotonic())
+
+    def child(self, timeout: float | None = None, name: str = "run") -> "CancelToken":
+        """
+        A token cancelled with this one, with a deadline no later than this one's.
+        """
+        return CancelToken(timeout=timeout, parent=self, name=name)
+
+    def raise_if_cancelled(self) -> None:
+        """
+        Raise `ChainTimeoutError` if the deadline passed, `ChainCancelledError` if cancelled.
+        """
+        if self.parent is not None:
+            self.parent.raise_if_cancelled()
+
+        if self._event.is_set():
+            raise ChainCancelledError(f"The {self.name} was cancelled: {self.reason}")
+
+        if self.expired:
+            raise ChainTimeoutError(f"The {self.name} exceeded its deadline.")
@@ -0,0 +1,200 @@
+"""
+This module records the model and tool calls of the engine into a cassette file and replays
+them, for deterministic offline runs: performance regression tests of the engine itself, or
+profiling a recorded production trace without network access.
+"""
+
+import asyncio
+import gzip
+import json
+import threading
+import time
+from collections import deque
+from typing import IO, Any, Awaitable, Callable, Literal
+
+import farmhash
+
+from chainfactory.core.utils import to_jsonable
+
+
+class CassetteMissError(LookupError):
+    """
+    Raised on replay when a call was not recorded in the cassette.
+    """
+
+
+class Cassette:
+    """
+    A record of the calls made by the engines it's configured on. Every call is keyed by its
+    kind (`chain` or `tool`), the name of the link and its request: the input of the prompt
+    or the arguments of the tool. The cassette is a JSON lines file, gzipped if the path ends
+    with `.gz`, with one call per line.
+
+    In `record` mode the calls are executed and appended to the file as they complete. In
+    `replay` mode the recorded responses are served back, in the order they were recorded for
+    identical requests, after the original latency or immediately (`latency="zero"`). The model
+    clients are not created on replay, so no credentials or network access are needed.
+
+    Usage:
+        with Cassette("tests/haiku.jsonl.gz", mode="record") as cassette:
+            Engine.from_file("examples/haiku.fctr", config=EngineConfig(cassette=cassette))(topic="python")
+
+        cassette = Cassette("tests/haiku.jsonl.gz", mode="replay", latency="original")
+    """
+
+    def __init__(
+        self,
+        path: str,
+        mode: Literal["record", "replay"] = "replay",
+        latency: Literal["original", "zero"] = "zero",
+    ):
+        if mode not in ["record", "replay"]:
+            raise ValueError(
+                f"Invalid cassette mode: {mode}. Must be one of 'record' or 'replay'."
+            )
+
+        if latency not in ["original", "zero"]:
+            raise ValueError(
+                f"Invalid cassette latency: {latency}. Must be one of 'original' or 'zero'."
+            )
+
+        self.path = path
+        self.mode = mode
+        self.latency = latency
+        self._lock = threading.Lock()
+        self._file: IO[str] | None = None
+        self._calls: dict[tuple[str, str, str], deque[dict]] = {}
+        self._last: dict[tuple[str, str, str], dict] = {}
+
+        if mode == "record":
+            self._file = self._open("w")
+        else:
+            with self._open("r") as file:
+                for line in file:
+                    if line.strip():
+                        call = json.loads(line)
+                        key = (call["kind"], call["name"], call["key"])
+                        self._calls.setdefault(key, deque()).append(call)
+
+    @property
+    def recording(self) -> bool:
+        return self.mode == "record"
+
+    def _open(self, mode: str) -> IO[str]:
+        if self.path.endswith(".gz"):
+            return gzip.open(self.path, mode + "t", encoding="utf-8")  # type: ignore
+
+        return open(self.path, mode, encoding="utf-8")
+
+    @staticmethod
+    def _key(request: Any) -> str:
+        return str(
+            farmhash.FarmHash64(json.dumps(to_jsonable(request), sort_keys=True))
+        )
+
+    def _record(
+        self,
+        kind: str,
+        name: str,
+        request: Any,
+        response: Any,
+        latency: float,
+        usage: dict | None = None,
+    ) -> None:
+        call = {
+            "kind": kind,
+            "name": name,
+            "key": self._key(request),
+            "request": to_jsonable(request),
+            "response": to_jsonable(response),
+            "latency": round(latency, 6),
+        }
+        if usage:
+            call["usage"] = usage
+
+        line = json.dumps(call, separators=(",", ":"))
+        with self._lock:
+            if self._file is None:
+                raise ValueError(f"Cassette {self.path} is closed.")
+
+            self._file.write(line + "\n")
+            self._file.flush()
+
+    def _replay(self, kind: str, name: str, request: Any) -> dict:
+        key = (kind, name, self._key(request))
+        with self._lock:
+            calls = self._calls.get(key)
+            if calls:
+                self._last[key] = calls.popleft()
+            elif key not in self._last:
+                raise CassetteMissError(
+                    f"No {kind} call of {name} recorded in {self.path} for this request."
+                )
+
+            return self._last[key]  # repeated requests reuse the last response
+
+    def call(
+        self,
+        kind: str,
+        name: str,
+        request: Any,
+        fn: Callable[[], Any],
+        usage: Callable[[], dict] | None = None,
+    ) -> tuple[Any, dict | None]:
+        """
+        Record the call of `fn`, or replay it. Returns the response (as recorded JSON on replay)
+        and the token usage of the call, if any.
+        """
+        if self.recording:
+            start = time.perf_counter()
+            response = fn()
+            call_usage = usage() if usage else None
+            self._record(
+                kind,
+                name,
+                request,
+                response,
+                time.perf_counter() - start,
+                call_usage,
+            )
+            return response, call_usage
+
+        call = self._replay(kind, name, request)
+        if self.latency == "original":
+            time.sleep(call["latency"])
+
+        return call["response"], call.get("usage")
+
+    async def call_async(
+        self,
+        kind: str,
+        name: str,
+        request: Any,
+        fn: Callable[[], Awaitable[Any]],
+    ) -> Any:
+        """
+        Record the call of the coroutine function `fn`, or replay it.
+        """
+        if self.recording:
+            start = time.perf_counter()
+            response = await fn()
+            self._record(kind, name, request, response, time.perf_counter() - start)
+            return response
+
+        call = self._replay(kind, name, request)
+        if self.latency == "original":
+            await asyncio.sleep(call["latency"])
+
+        return call["response"]
+
+    def close(self) -> None:
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def __enter__(self) -> "Cassette":
+        return self
+
+    def __exit__(self, *_) -> None:
+        self.close()
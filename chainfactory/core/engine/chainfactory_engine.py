@@ -1,22 +1,85 @@
+import copy
+import inspect
+import json
+import math
+import farmhash
+import asyncio
+import pickle
+import threading
 import time
-import traceback
-from pprint import pprint
-from typing import Any, Literal
-from concurrent.futures import ThreadPoolExecutor, as_completed
-
-from langchain.prompts import ChatPromptTemplate
-from langchain_openai import ChatOpenAI
-from langchain_anthropic import ChatAnthropic
-from langchain_ollama import ChatOllama
-from langchain_core.runnables import RunnableSerializable
-from colorama import Back, Fore, Style
+import uuid
+from collections import ChainMap
+from dataclasses import dataclass, field
+from pprint import pformat
+from typing import Any, Callable, Literal, Mapping
+from concurrent.futures import (
+    ALL_COMPLETED,
+    FIRST_COMPLETED,
+    FIRST_EXCEPTION,
+    Future,
+    ThreadPoolExecutor,
+    wait,
+)
+from concurrent.futures.process import BrokenProcessPool
+
+from langchain_core.prompts import ChatPromptTemplate, HumanMessagePromptTemplate
+from langchain_core.messages import AIMessage
+from langchain_core.runnables import (
+    RunnableConfig,
+    RunnableLambda,
+    RunnableSerializable,
+)
 
 from chainfactory.core.factory import (
     ChainFactoryLink,
     ChainFactory,
     ChainFactoryTool,
 )
-from .chainfactory_engine_config import ChainFactoryEngineConfig
+from chainfactory.core.log import enable_console_logging, get_logger, lazy
+from chainfactory.core.parsing.predicate import Predicate, PredicateError
+from chainfactory.core.types import OverlayDict
+from chainfactory.core.utils import LRUCache, count_tokens, to_jsonable
+from .executors import (
+    PicklingCheckError,
+    call_tool_batch,
+    call_tool_chunk,
+    ensure_picklable,
+    get_process_pool,
+    run_coroutine_sync,
+    shutdown_process_pool,
+    warmup_process_pool,
+)
+from .cancellation import CancelToken
+from .cassette import Cassette
+from .concurrency import AdaptiveLimiter, get_limiter, schedule_save_limits
+from .chainfactory_engine_config import ChainFactoryEngineConfig, ModelProfile
+from .debugger import ChainFactoryDebugger
+from .models import UsageTracker, get_model, json_schema
+
+logger = get_logger("engine")
+
+_CANCEL_POLL_INTERVAL = 0.05  # seconds between checks of the cancel token while waiting
+_QUEUE_POLL_INTERVAL = 0.05  # seconds between checks of the task queue for results
+
+# the token of the stage a pool thread is working for, so the calls waiting for a slot of an
+# adaptive limiter are dropped when the stage fails or is cancelled
+_stage = threading.local()
+
+
+@dataclass
+class RunContext:
+    """
+    The state of one run of the engine, passed down to the links it executes, so that
+    concurrent runs on the same engine don't see each other's state: the trace of the run, whose
+    outputs are the inputs of the next links, and its cancel token. With a checkpoint store, it
+    holds the ID of the run and the stages checkpointed by its previous attempts.
+    """
+
+    cancel: CancelToken | None = None
+    run_id: str | None = None
+    checkpoints: dict[str, dict] = field(default_factory=dict)
+    trace: dict[str, dict] = field(default_factory=dict)
+    trace_list: list[dict] = field(default_factory=list)
 
 
 class ChainFactoryEngine:
@@ -28,28 +91,51 @@ class ChainFactoryEngine:
         self.factory = factory
         self.config = config
         self.chains = self._create_chains(factory.links, config)
+        self.data_dependencies: dict[str, list[str]] = {}
+        self.dependencies = self._resolve_dependencies()
+        self.stages_left = self._count_stages_left()
         self.execution_trace = {}
         self.execution_trace_list = []
+        self.debugger: ChainFactoryDebugger | None = None
+        self.dedup_caches: dict[str, LRUCache] = {
+            name: LRUCache(data["link"].dedup.cache_size)
+            for name, data in self.chains.items()
+            if isinstance(data["link"], ChainFactoryLink) and data["link"].dedup
+        }
+
+        # in development, printing the traces prints the logs to the console, as they used to be
+        # printed. In production the logging setup is left to the application
+        if config.console_logging or (
+            config.profile == "development"
+            and (config.print_trace or config.print_trace_for_single_chain)
+        ):
+            enable_console_logging()
+
+        if config.pause_between_executions:
+            ChainFactoryDebugger(self)
 
     @staticmethod
     def _print_trace(trace: list[dict[str, dict]]):
         """
-        Print the execution trace.
+        Log the execution trace. Inputs and outputs are only formatted if the records are emitted.
         """
-        print(Fore.YELLOW + "Execution Trace:" + Style.RESET_ALL)
+        logger.info("Execution Trace:")
         for res in trace:
-            print(
-                Back.WHITE
-                + Fore.BLACK
-                + f"{res['name']}: {res['execution_time']} seconds"
-                + Fore.RESET
-                + Style.RESET_ALL
+            logger.info(
+                "%s: %s seconds\nInput:\n%s\nOutput:\n%s\n",
+                res["name"],
+                res["execution_time"],
+                lazy(
+                    lambda res=res: pformat(
+                        ChainFactoryEngine._materialize(res["input"])
+                    )
+                ),
+                lazy(
+                    lambda res=res: pformat(
+                        ChainFactoryEngine._materialize(res["output"])
+                    )
+                ),
             )
-            print(Fore.WHITE + "Input:" + Style.BRIGHT)
-            pprint(res["input"])
-            print(Fore.WHITE + "Output:" + Style.BRIGHT)
-            pprint(res["output"])
-            print("" + Style.RESET_ALL)
 
     def __call__(self, *args, **kwargs) -> Any:
         """
@@ -65,13 +151,56 @@ class ChainFactoryEngine:
         else:
             chain_input = kwargs
 
+        return self.run(chain_input)
+
+    def run(
+        self,
+        input: dict,
+        cancel: CancelToken | None = None,
+        timeout: float | None = None,
+        run_id: str | None = None,
+    ) -> Any:
+        """
+        Run the chain on an input, like calling the engine. The run can be cancelled from another
+        thread with a `CancelToken`, and is bounded by `timeout` seconds (default:
+        `config.timeout`). The deadline is split across the remaining stages, so a slow stage
+        cannot use up the time of the stages after it. Raises `ChainCancelledError`, or
+        `ChainTimeoutError` when the deadline passes.
+
+        With a `checkpoint_store` in the config, the progress of the run is checkpointed under
+        `run_id` (a new ID by default), see `resume`. Every exception raised by a checkpointed
+        run, ValueErrors included, reaches the caller and carries the ID as its `run_id`
+        attribute, so the run can be resumed. Without a store, a ValueError is logged and
+        replaced by a generic one.
+        """
+        timeout = timeout if timeout is not None else self.config.timeout
+        if timeout is not None:
+            cancel = CancelToken(timeout=timeout, parent=cancel)
+
         trace = {}
+        context = RunContext(cancel=cancel)
+        store = self.config.checkpoint_store
+        if store is not None:
+            context.run_id = run_id or uuid.uuid4().hex
+            store.start_run(context.run_id, self._fingerprint(), input)
+            context.checkpoints = store.load_stages(context.run_id)
 
         try:
-            trace = self._execute_chains(initial_input=chain_input)
-        except ValueError:
-            traceback.print_exc()
+            trace = self._execute_chains(initial_input=input, context=context)
+
+            if store is not None and len(trace) == len(self.chains):
+                store.finish_run(context.run_id)  # type: ignore
+        except BaseException as e:
+            if store is None and isinstance(e, ValueError):
+                logger.exception("Execution of the chain failed.")
+            else:
+                if context.run_id is not None:
+                    e.run_id = context.run_id  # type: ignore[attr-defined]
+                raise
         finally:
+            if self.config.adaptive_concurrency:
+                schedule_save_limits()
+
             if self.config.print_trace:
                 if len(trace) > 1:
                     self._print_trace(trace)
@@ -85,7 +214,285 @@ class ChainFactoryEngine:
                 "ChainFactoryEngine.__call__() failed. Trace contains zero results."
             )
 
-        return trace[-1]["output"]
+        return self._materialize(trace[-1]["output"])
+
+    def resume(
+        self,
+        run_id: str,
+        cancel: CancelToken | None = None,
+        timeout: float | None = None,
+    ) -> Any:
+        """
+        Resume a checkpointed run on its original input. The completed stages and the completed
+        elements of parallel stages are restored from the checkpoint store instead of running
+        again. Only runs of the same chain can be resumed.
+        """
+        store = self.config.checkpoint_store
+        if store is None:
+            raise ValueError("Runs can only be resumed with a checkpoint_store.")
+
+        try:
+            input = store.load_input(run_id)
+        except KeyError as e:
+            raise ValueError(f"Unknown run: {run_id}.") from e
+
+        return self.run(input, cancel=cancel, timeout=timeout, run_id=run_id)
+
+    def warmup(self, ping: bool = False) -> dict[str, float]:
+        """
+        Set up ahead of time what the first run would otherwise set up lazily: prompt templates,
+        JSON schemas of the outputs, the tokenizer used by tree reduces and the workers of the
+        process pool. With `ping`, a minimal request is sent to every model to open its connection.
+
+        The templates and the structured output runnables are already resolved when the engine is
+        created. Returns the time in seconds each step took.
+        """
+        timings = {}
+
+        def step(name: str, fn) -> None:
+            start = time.perf_counter()
+            fn()
+            timings[name] = round(time.perf_counter() - start, 4)
+
+        def prompts():
+            for name, chain in self.chains.items():
+                link = chain["link"]
+                if isinstance(link, ChainFactoryLink) and link.prompt:
+                    chain["prompt"].format_messages(
+                        **{var: "" for var in link.prompt.input_variables or []}
+                    )
+
+        def schemas():
+            for chain in self.chains.values():
+                link = chain["link"]
+                if isinstance(link, ChainFactoryLink) and link.output:
+                    json_schema(link.output._type)
+
+        links = [chain["link"] for chain in self.chains.values()]
+
+        step("prompts", prompts)
+        step("schemas", schemas)
+
+        tokenizer_models = {
+            chain["model"].model
+            for chain in self.chains.values()
+            if isinstance(chain["link"], ChainFactoryLink)
+            and chain["link"].reduce
+            and chain["link"].reduce.type == "tree"
+        }
+        if tokenizer_models:
+            step(
+                "tokenizer",
+                lambda: [count_tokens("", model) for model in tokenizer_models],
+            )
+
+        if any(
+            isinstance(link, ChainFactoryTool) and link.target == "process"
+            for link in links
+        ):
+            step(
+                "process_pool",
+                lambda: warmup_process_pool(self.config.max_process_workers),
+            )
+
+        if ping and any(isinstance(link, ChainFactoryLink) for link in links):
+            step("connection", self._ping)
+
+        return timings
+
+    def render_prompts(self, initial_input: dict) -> dict[str, str]:
+        """
+        Render the prompts of the chainlinks without calling the model, e.g. for a dry run. The
+        variables of the links consuming the chain input are filled from `initial_input`, the
+        variables produced by other links while running are left as placeholders.
+        """
+        prompts = {}
+        for name, data in self.chains.items():
+            link = data["link"]
+            if not isinstance(link, ChainFactoryLink) or not link.prompt:
+                continue
+
+            template = link.prompt.template or ""
+            input_variables = link.prompt.input_variables or []
+            input = {}
+
+            if (
+                self.data_dependencies[name] == ["input"]
+                and link._link_type == "sequential"
+            ):
+                input = self._get_next_step_input(input_variables, initial_input)
+
+            for var in input_variables:
+                template = template.replace(
+                    "{" + var + "}",
+                    (
+                        str(input[var])
+                        if var in input
+                        else "{" + var.replace("$", ".") + "}"
+                    ),
+                )
+
+            prompts[name] = template
+
+        return prompts
+
+    def _ping(self) -> None:
+        """
+        Send a minimal request to every model used by the chainlinks, e.g. to open the
+        connections before serving traffic.
+        """
+        model_profiles = [data.get("model") for data in self.chains.values()] + [
+            data["cascade"]["model"]
+            for data in self.chains.values()
+            if "cascade" in data
+        ]
+
+        pinged = set()
+        for model_profile in model_profiles:
+            if not model_profile or model_profile.describe() in pinged:
+                continue
+
+            pinged.add(model_profile.describe())
+
+            try:
+                llm = get_model(
+                    provider=model_profile.provider,
+                    model=model_profile.model,
+                    temperature=model_profile.temperature,
+                    model_kwargs=model_profile.model_kwargs,
+                    max_tokens=model_profile.max_tokens,
+                )
+
+                if model_profile.provider == "ollama":
+                    llm.invoke("ping")
+                else:
+                    llm.invoke("ping", max_tokens=1)
+            except Exception as e:
+                raise ValueError(
+                    f"Failed to reach {model_profile.provider} provider: {str(e)}"
+                ) from e
+
+    @staticmethod
+    def _materialize(value: Any) -> Any:
+        """
+        Flatten overlay mappings into plain dictionaries, e.g. before returning or printing them.
+        """
+        if isinstance(value, OverlayDict):
+            return value.dict()
+
+        if isinstance(value, list):
+            return [ChainFactoryEngine._materialize(item) for item in value]
+
+        return value
+
+    @staticmethod
+    def _invoke_chain(chain: RunnableSerializable, input: Mapping) -> Any:
+        """
+        Invoke a chainlink's runnable. Prompt templates need a plain dictionary as their input.
+        """
+        if not isinstance(input, dict):
+            input = dict(input)
+
+        return chain.invoke(input)
+
+    def _wait(self, futures: list[Future], cancel: CancelToken | None = None) -> list:
+        """
+        Wait for the futures and return their results in order. In fail-fast mode, the first
+        failure is raised as soon as it happens. A cancelled or expired token raises while
+        waiting. On errors, the futures that haven't started are cancelled.
+        """
+        pending = set(futures)
+        try:
+            while pending:
+                timeout = None
+                if cancel is not None:
+                    cancel.raise_if_cancelled()
+                    remaining = cancel.remaining()
+                    timeout = _CANCEL_POLL_INTERVAL
+                    if remaining is not None:
+                        timeout = min(timeout, remaining)
+
+                done, pending = wait(
+                    pending,
+                    timeout=timeout,
+                    return_when=(
+                        FIRST_EXCEPTION if self.config.fail_fast else ALL_COMPLETED
+                    ),
+                )
+
+                if self.config.fail_fast:
+                    for future in done:
+                        future.result()  # raises the first failure
+
+            return [future.result() for future in futures]
+        except BaseException:
+            for future in futures:
+                future.cancel()
+
+            raise
+
+    def _gather(
+        self,
+        fn: Callable[[Any], Any],
+        items: list,
+        cancel: CancelToken | None = None,
+        workers: int | None = None,
+    ) -> list:
+        """
+        Call `fn` on every item on a thread pool of `workers` threads (default:
+        `max_parallel_chains`), preserving the order of the items. See `_wait` for failures and
+        cancellation: the pool is shut down without waiting for the calls still in flight, and
+        the calls still waiting for a slot of an adaptive limiter are dropped.
+        """
+        if cancel is not None:
+            cancel.raise_if_cancelled()
+
+        token = CancelToken(parent=cancel, name="stage")
+
+        def call(item: Any) -> Any:
+            _stage.cancel = token
+            try:
+                return fn(item)
+            finally:
+                _stage.cancel = None
+
+        executor = ThreadPoolExecutor(workers or self.config.max_parallel_chains)
+        try:
+            results = self._wait(
+                [executor.submit(call, item) for item in items], cancel
+            )
+        except BaseException:
+            token.cancel("Another element of the stage failed.")
+            executor.shutdown(wait=False, cancel_futures=True)
+            raise
+
+        executor.shutdown(wait=False)
+        return results
+
+    def _chain_workers(self) -> int:
+        """
+        The threads of a pool calling a model. With adaptive concurrency, the limiters of the
+        models bound the calls in flight, so the pool must not be the bottleneck.
+        """
+        if self.config.adaptive_concurrency:
+            return self.config.max_adaptive_concurrency
+
+        return self.config.max_parallel_chains
+
+    def _call(
+        self,
+        fn: Callable[[Any], Any],
+        item: Any,
+        cancel: CancelToken | None = None,
+    ) -> Any:
+        """
+        Call `fn` on a single item. With a cancel token, the call runs on a helper thread so the
+        stage can be abandoned when the token is cancelled or expires.
+        """
+        if cancel is None:
+            return fn(item)
+
+        return self._gather(fn, [item], cancel)[0]
 
     def _execute_parallel_chain(self, previous: dict, current: dict) -> list:
         """
@@ -95,6 +502,9 @@ class ChainFactoryEngine:
         link: ChainFactoryLink | ChainFactoryTool = current["link"]
         previous_output: dict = previous["output"]
 
+        if previous_output and not isinstance(previous_output, Mapping):
+            previous_output = previous_output.dict()
+
         matching_vars = []
         matching_list_vars = []
         link_is_tool = isinstance(link, ChainFactoryTool)
@@ -117,7 +527,7 @@ class ChainFactoryEngine:
                 matching_vars.append(var)
 
             if "element" in var:
-                varsplit = var.split("$")
+                varsplit = var.replace(".", "$").split("$")
                 if varsplit[0] == "element":
                     raise ValueError(
                         f"Field address cannot start with 'element' in {link._name}."
@@ -169,6 +579,11 @@ class ChainFactoryEngine:
         iterable_len = len(previous_output[matching_list_vars[-1]["parent"]])
 
         for i in range(iterable_len):
+            if link._filter and not self._keep_element(
+                link, previous_output, matching_list_vars, i
+            ):
+                continue
+
             current_input = {}
             for var in matching_vars:
                 current_input[var] = previous_output[var]
@@ -193,35 +608,313 @@ class ChainFactoryEngine:
 
             current_inputs.append(current_input)
 
+        if link._filter:
+            current["filter"] = {
+                "elements": iterable_len,
+                "kept": len(current_inputs),
+                "dropped": iterable_len - len(current_inputs),
+            }
+
+        if isinstance(link, ChainFactoryTool):
+            # with a task queue, the elements are executed by the workers
+            remote = self.config.task_queue is not None and not link.batch
+
+            if link.target == "process" and not remote:
+                return self._execute_process_tool(
+                    link, current_inputs, current.get("cancel")
+                )
+
+            if link.batch:
+                return self._call(
+                    link.execute_batch, current_inputs, current.get("cancel")
+                )
+
+            if link.is_async and not remote:
+                return run_coroutine_sync(
+                    self._execute_async_tool(
+                        link, current_inputs, current.get("cancel")
+                    )
+                )
+
+        if isinstance(link, ChainFactoryLink) and link.dedup:
+            assert chain
+            return self._execute_deduplicated(link, chain, current_inputs, current)
+
         # execute the chains in parallel, preserving the order of the inputs
-        with ThreadPoolExecutor(self.config.max_parallel_chains) as executor:
-            futures = []
+        if isinstance(link, ChainFactoryTool):
+            return self._execute_elements(
+                current["name"],
+                link._execute,
+                current_inputs,
+                current.get("cancel"),
+                run_id=current.get("run_id"),
+            )
+
+        if not chain:
+            raise ValueError(
+                f"Chain cannot be None at this stage. Please report this issue."
+            )
+
+        results = self._execute_elements(
+            current["name"],
+            lambda input: self._invoke_chain(chain, input),
+            current_inputs,
+            current.get("cancel"),
+            self._chain_workers(),
+            current.get("run_id"),
+        )
+
+        return self._escalate(current, current_inputs, results)
+
+    def _execute_deduplicated(
+        self,
+        link: ChainFactoryLink,
+        chain: RunnableSerializable,
+        inputs: list[dict],
+        current: dict,
+    ) -> list:
+        """
+        Execute a parallel chainlink once per distinct element. Elements with the same dedup key
+        share the result, either of another element of this run or of a previous run.
+        """
+        assert link.dedup
+        cache = self.dedup_caches[link._name]
+        keys = [link.dedup.key(input) for input in inputs]
+        missing = object()
+
+        results = {}
+        pending = {}
+        for key, input in zip(keys, inputs):
+            if key in results or key in pending:
+                continue
+
+            result = cache.get(key, missing)
+            if result is missing:
+                pending[key] = input
+            else:
+                results[key] = result
+
+        if self.config.task_queue is not None:
+            distinct = self._dispatch(
+                link._name, list(pending.values()), current.get("cancel")
+            )
+        else:
+            distinct = self._gather(
+                lambda input: self._invoke_chain(chain, input),
+                list(pending.values()),
+                current.get("cancel"),
+                self._chain_workers(),
+            )
+
+        outputs = self._escalate(current, list(pending.values()), distinct)
+
+        for key, output in zip(pending, outputs):
+            results[key] = output
+            cache.put(key, output)
+
+        current["dedup"] = {
+            "elements": len(inputs),
+            "unique": len(results),
+            "cache_hits": len(results) - len(pending),
+            "calls": len(pending),
+        }
+
+        return [results[key] for key in keys]
+
+    @staticmethod
+    def _keep_element(
+        link: ChainFactoryLink | ChainFactoryTool,
+        previous_output: Mapping,
+        matching_list_vars: list[dict],
+        i: int,
+    ) -> bool:
+        """
+        Evaluate the filter of a parallel link on the i-th element. The iterable fields of the
+        previous output stand for their i-th element, whose fields can also be used directly.
+        """
+        assert link._filter
+
+        elements = {
+            var["parent"]: previous_output[var["parent"]][i]
+            for var in matching_list_vars
+        }
+        element = elements[matching_list_vars[-1]["parent"]]
+        fields = element if isinstance(element, Mapping) else {}
+        if hasattr(element, "model_dump"):
+            fields = element.model_dump()
+
+        return ChainFactoryEngine._test(
+            link._filter,
+            ChainMap({"element": element}, elements, fields, previous_output),
+            link._name,
+            "filter",
+        )
+
+    @staticmethod
+    def _test(predicate: Predicate, variables: Any, name: str, section: str) -> bool:
+        """
+        Evaluate a predicate of a link. A predicate that fails on some values, e.g. `len(reply)`
+        on a missing reply, is false for them instead of failing the whole stage.
+        """
+        try:
+            return predicate(variables)
+        except PredicateError as e:
+            logger.warning(
+                "The %s predicate of %s failed and is treated as false: %s",
+                section,
+                name,
+                e,
+            )
+            return False
+
+    def _escalate(self, current: dict, inputs: list, outputs: list) -> list:
+        """
+        Generate the outputs matching the cascade predicate of a chainlink again on the cascade
+        model. Only the matching elements are dispatched, the others keep their output.
+        """
+        link = current["link"]
+        cascade = self.chains[current["name"]].get("cascade")
+        if not cascade or not isinstance(link, ChainFactoryLink) or not link.cascade:
+            return outputs
+
+        escalated = [
+            i
+            for i, output in enumerate(outputs)
+            if self._test(link.cascade.when, output, current["name"], "cascade")
+        ]
+
+        outputs = list(outputs)
+        if escalated:
+            results = self._gather(
+                lambda i: self._invoke_chain(cascade["chain"], inputs[i]),
+                escalated,
+                current.get("cancel"),
+                self._chain_workers(),
+            )
+
+            for i, result in zip(escalated, results):
+                outputs[i] = result
+
+        stats = current.setdefault(
+            "cascade",
+            {"model": cascade["model"].describe(), "elements": 0, "escalated": 0},
+        )
+        stats["elements"] += len(outputs)
+        stats["escalated"] += len(escalated)
+
+        return outputs
+
+    def _execute_process_tool(
+        self,
+        link: ChainFactoryTool,
+        inputs: list[dict],
+        cancel: CancelToken | None = None,
+    ) -> list[dict]:
+        """
+        Execute a tool on the shared process pool, once for every input. The inputs are submitted
+        in chunks to amortize the pickling and inter-process overhead. They are checked to be
+        picklable before they are submitted, and the outputs in the workers, so the errors raised
+        by the tool itself are not mistaken for pickling failures.
+        """
+        if not link.fn:
+            raise ValueError("ChainFactoryTool.fn is None. Cannot execute.")
+
+        pool, workers = get_process_pool(self.config.max_process_workers)
+        prepared = [link._prepare_input(input) for input in inputs]
+        chunksize = max(1, math.ceil(len(prepared) / (workers * 4)))
+
+        try:
+            ensure_picklable(prepared, "inputs")
+            futures = [
+                pool.submit(
+                    call_tool_batch if link.batch else call_tool_chunk,
+                    link.fn,
+                    prepared[i : i + chunksize],
+                )
+                for i in range(0, len(prepared), chunksize)
+            ]
             results = []
-            for input in current_inputs:
-                if isinstance(link, ChainFactoryTool):
-                    fn = lambda x: link.execute(**x)
-                    future = executor.submit(fn, input)
+            chunk_results = self._wait(futures, cancel)
+            for i, chunk_result in zip(range(0, len(inputs), chunksize), chunk_results):
+                chunk = inputs[i : i + chunksize]
+                if link.batch:
+                    results.extend(link._merge_batch_result(chunk, chunk_result))
                 else:
-                    if not chain:
-                        raise ValueError(
-                            f"Chain cannot be None at this stage. Please report this issue."
-                        )
-                    future = executor.submit(chain.invoke, input)
+                    results.extend(
+                        link._merge_result(input, res)
+                        for input, res in zip(chunk, chunk_result)
+                    )
+        except BrokenProcessPool:
+            shutdown_process_pool(wait=False)
+            raise
+        except PicklingCheckError as e:
+            raise ValueError(
+                f"Tool {link._name} could not be executed in a process pool. Its inputs and outputs must be picklable: {str(e)}"
+            ) from e
+
+        return results
+
+    async def _execute_async_tool(
+        self,
+        link: ChainFactoryTool,
+        inputs: list[dict],
+        cancel: CancelToken | None = None,
+    ) -> list[dict]:
+        """
+        Execute an async tool once for every input on a single event loop, with at most
+        `max_parallel_chains` calls in flight. On the first failure (in fail-fast mode) or when
+        the token is cancelled, the calls still running are cancelled.
+        """
+        semaphore = asyncio.Semaphore(self.config.max_parallel_chains)
+
+        async def execute(input: dict) -> dict:
+            async with semaphore:
+                return await link.execute_async(input)
+
+        tasks = [asyncio.ensure_future(execute(input)) for input in inputs]
+        pending = set(tasks)
+        try:
+            while pending:
+                timeout = None
+                if cancel is not None:
+                    cancel.raise_if_cancelled()
+                    remaining = cancel.remaining()
+                    timeout = _CANCEL_POLL_INTERVAL
+                    if remaining is not None:
+                        timeout = min(timeout, remaining)
+
+                done, pending = await asyncio.wait(
+                    pending,
+                    timeout=timeout,
+                    return_when=(
+                        asyncio.FIRST_EXCEPTION
+                        if self.config.fail_fast
+                        else asyncio.ALL_COMPLETED
+                    ),
+                )
 
-                futures.append(future)
+                if self.config.fail_fast:
+                    for task in done:
+                        task.result()  # raises the first failure
+
+            return [task.result() for task in tasks]
+        finally:
+            for task in pending:
+                task.cancel()
 
-            for future in as_completed(futures):
-                output = future.result()
-                results.append(output)
+            if pending:
+                await asyncio.wait(pending)
 
-            return results
+            for task in tasks:
+                if not task.cancelled():
+                    task.exception()  # mark the other failures as retrieved
 
     @staticmethod
     def _get_nested_value(d: dict, keys: list[str]):
         """
         Recursively fetches value from a nested dictionary using a list of keys.
         """
-        if not keys or not isinstance(d, dict):
+        if not keys or not isinstance(d, Mapping):
             return None
         if len(keys) == 1:
             return d.get(keys[0], None)
@@ -232,16 +925,19 @@ class ChainFactoryEngine:
         input_variables: list[str],
         previous_output: dict | Any,
         aliases: dict[str, str] | None = None,
+        trace: dict[str, dict] | None = None,
     ):
         """
-        Get the input for the next step.
+        Get the input for the next step. Variables naming a link are looked up in the `trace`
+        of the run (default: the trace of the engine).
         """
+        trace = self.execution_trace if trace is None else trace
         input = {}
         keys = []
         if not aliases:
             aliases = {}
 
-        if not isinstance(previous_output, dict):
+        if not isinstance(previous_output, Mapping):
             previous_output = previous_output.dict()
 
         for var in input_variables:
@@ -258,8 +954,8 @@ class ChainFactoryEngine:
             if not keys:
                 continue
 
-            if keys[0] in self.execution_trace.keys():
-                prev = self.execution_trace[keys[0]]
+            if keys[0] in trace.keys():
+                prev = trace[keys[0]]
                 input[alias or var] = self._get_nested_value(prev, keys[1:])
             else:
                 prev = previous_output
@@ -294,208 +990,749 @@ class ChainFactoryEngine:
                 if isinstance(link, ChainFactoryTool):
                     input_variables = link.input.input_variables or []
                     aliases = link.input.aliases
-                    executor = lambda x: link.execute(**x)
+                    if link.target == "process":
+                        executor = lambda x: self._execute_process_tool(
+                            link, [x], current.get("cancel")
+                        )[0]
+                    else:
+                        executor = lambda x: self._call(
+                            link._execute, x, current.get("cancel")
+                        )
                 elif isinstance(link, ChainFactoryLink):
                     assert chain
                     assert link.prompt
                     input_variables = link.prompt.input_variables or []
                     aliases = {}
-                    executor = chain.invoke
+                    executor = lambda x: self._escalate(
+                        current,
+                        [x],
+                        [
+                            self._call(
+                                lambda x: self._invoke_chain(chain, x),
+                                x,
+                                current.get("cancel"),
+                            )
+                        ],
+                    )[0]
                 else:
                     raise ValueError("Invalid link type.")
 
                 input = self._get_next_step_input(
-                    input_variables, previous_output, aliases
+                    input_variables, previous_output, aliases, current.get("trace")
                 )
 
                 result = executor(input)
                 return result
             case "parallel":
                 assert previous_link._name in previous_output
-                previous_output = self.execution_trace[previous_link._name]
+                previous_output = previous_output[previous_link._name]
                 assert isinstance(previous_output, list)
 
                 if isinstance(link, ChainFactoryTool):
                     input_variables = link.input.input_variables or []
                     input = [
-                        self._get_next_step_input(input_variables, item)
+                        self._get_next_step_input(
+                            input_variables, item, trace=current.get("trace")
+                        )
                         for item in previous_output
                     ]
 
-                    return link.execute(*input)
+                    if link.batch:
+                        return self._call(
+                            link.execute_batch, input, current.get("cancel")
+                        )
+
+                    return self._call(
+                        lambda input: link.execute(*input),
+                        input,
+                        current.get("cancel"),
+                    )
 
                 assert chain
                 assert link.mask
 
-                input = {
-                    link._name: [
-                        f"({i + 1}) "
-                        + link.mask.render(
-                            {
-                                k: output.get(k.split("$")[-1])
-                                for k in link.mask.variables
-                            }
-                        )
-                        for i, output in enumerate(previous_output)
-                    ]
-                }
+                masked = [
+                    f"({i + 1}) "
+                    + link.mask.render(
+                        {k: output.get(k.split("$")[-1]) for k in link.mask.variables}
+                    )
+                    for i, output in enumerate(previous_output)
+                ]
+
+                if link.reduce and link.reduce.type == "tree":
+                    return self._execute_tree_reduce(link, chain, masked, current)
 
-                return chain.invoke(input)
+                input = {link._name: masked}
+                output = self._call(
+                    lambda input: self._invoke_chain(chain, input),
+                    input,
+                    current.get("cancel"),
+                )
+                return self._escalate(current, [input], [output])[0]
             case _:
                 raise ValueError(
                     f"Invalid link type: {previous_link._link_type} for chain {previous['name']}"
                 )
 
-    def _proceed_yes_no(
+    def _chunk_by_tokens(
         self,
-        next_chain_name: str,
-        is_tool: bool | None = False,
-    ) -> bool:
-        if not self.config.pause_between_executions:
-            return True
-
-        if next_chain_name:
-            print(
-                Fore.GREEN
-                + f"\nNext to be executed: {next_chain_name}"
-                + (" (tool) " if is_tool else " (chainlink) ")
-                + Style.RESET_ALL
+        items: list[str],
+        chunk_tokens: int,
+        min_items: int = 1,
+        model: str | None = None,
+    ) -> list[list[str]]:
+        """
+        Greedily pack items into chunks of at most `chunk_tokens` tokens of `model`, preserving
+        the order. A chunk always holds at least `min_items` items, even if that exceeds the budget.
+        """
+        chunks = []
+        chunk = []
+        chunk_size = 0
+
+        for item in items:
+            item_size = count_tokens(item, model)
+
+            if (
+                chunk
+                and len(chunk) >= min_items
+                and chunk_size + item_size > chunk_tokens
+            ):
+                chunks.append(chunk)
+                chunk = []
+                chunk_size = 0
+
+            chunk.append(item)
+            chunk_size += item_size
+
+        if chunk:
+            if len(chunk) < min_items and chunks:
+                chunks[-1].extend(chunk)
+            else:
+                chunks.append(chunk)
+
+        return chunks
+
+    def _execute_tree_reduce(
+        self,
+        link: ChainFactoryLink,
+        chain: RunnableSerializable,
+        masked: list[str],
+        current: dict | None = None,
+    ) -> Any:
+        """
+        Reduce the masked outputs of a parallel chain as a tree. The masked list is split into
+        context-sized chunks that are reduced in parallel, the partial results are then rendered
+        and reduced again until a single chunk remains. Only the final reduce is cascaded.
+
+        The chunks get the tokens of `chunk_tokens` left by the rest of the prompt template.
+        """
+        assert link.reduce
+
+        model = self.chains[link._name]["model"].model
+        template = link.prompt.template if link.prompt and link.prompt.template else ""
+        template_tokens = count_tokens(
+            template.replace("{" + link._name + "}", ""), model
+        )
+        budget = link.reduce.chunk_tokens - template_tokens
+        if budget < 1:
+            logger.warning(
+                "The prompt of '%s' takes %d tokens, more than its chunk_tokens of %d.",
+                link._name,
+                template_tokens,
+                link.reduce.chunk_tokens,
             )
+            budget = 1
 
+        items = masked
+        min_items = 1  # oversized leaves may be reduced alone, partials must merge
         while True:
-            response = (
-                input(Fore.WHITE + "Proceed? (Yes/No): " + Style.RESET_ALL)
-                .strip()
-                .lower()
+            chunks = self._chunk_by_tokens(items, budget, min_items, model=model)
+
+            cancel = current.get("cancel") if current else None
+            if len(chunks) == 1:
+                input = {link._name: chunks[0]}
+                output = self._call(
+                    lambda input: self._invoke_chain(chain, input), input, cancel
+                )
+                if current is None:
+                    return output
+
+                return self._escalate(current, [input], [output])[0]
+
+            partials = self._gather(
+                lambda chunk: self._invoke_chain(chain, {link._name: chunk}),
+                chunks,
+                cancel,
+                self._chain_workers(),
             )
 
-            if response in ["yes", "y", ""]:
-                print(
-                    Fore.GREEN
-                    + f"Executing chainlink: {next_chain_name}"
-                    + Style.RESET_ALL
+            items = [
+                f"({i + 1}) "
+                + json.dumps(
+                    dict(partial) if isinstance(partial, Mapping) else partial.dict(),
+                    default=str,
                 )
-                return True
-            elif response in ["no", "n"]:
-                print(Fore.RED + f"Terminating execution." + Style.RESET_ALL)
-                return False
-            else:
-                continue  # ask again
+                for i, partial in enumerate(partials)
+            ]
+            min_items = 2
 
-    def _execute_chains(self, initial_input: dict) -> list[dict[str, Any]]:
+    def _resolve_dependencies(self) -> dict[str, list[str]]:
         """
-        Execute the chains, while piping the outputs to successive chains.
+        Resolve the links each link depends on. A link depends on the links in its `needs` section,
+        or on the preceding link if it has none. `other_link.field` references in the inputs are
+        added as ordering-only dependencies, so they are resolved before the link runs.
         """
-        previous_output = None
-        previous_chain_name = None
-        previous_chain = None
-        previous_link = None
+        dependencies = {}
+        previous_name = "input"
 
-        should_proceed = True
         for name, data in self.chains.items():
-            chain: RunnableSerializable | None = data["chain"]
             link: ChainFactoryLink | ChainFactoryTool = data["link"]
+            needs = link._needs if link._needs is not None else [previous_name]
+
+            if isinstance(link, ChainFactoryTool):
+                input_variables = link.input.input_variables or []
+            else:
+                input_variables = (
+                    link.prompt.input_variables if link.prompt else []
+                ) or []
+
+            references = []
+            for var in input_variables:
+                referenced = var.replace("$", ".").split(".")[0]
+                if (
+                    referenced in dependencies
+                    and referenced not in needs
+                    and referenced not in references
+                ):
+                    references.append(referenced)
+
+            self.data_dependencies[name] = needs
+            dependencies[name] = needs + references
+            previous_name = name
+
+        return dependencies
+
+    def _get_previous(
+        self, name: str, initial_input: dict, trace: dict[str, dict]
+    ) -> dict:
+        """
+        Get the `previous` step for a link from the outputs of the links it needs, in the
+        `trace` of the run. The outputs of multiple needed links are joined into a single
+        overlay, later links taking precedence.
+        """
+        outputs = []
+        for need in self.data_dependencies[name]:
+            if need == "input":
+                outputs.append(initial_input)
+                continue
+
+            output = trace[need]["out"]
+            if self.chains[need]["link"]._link_type == "parallel":
+                output = {need: output}
 
-            should_proceed = self._proceed_yes_no(
-                next_chain_name=name,
-                is_tool=isinstance(link, ChainFactoryTool),
+            outputs.append(output)
+
+        needs = self.data_dependencies[name]
+        if len(needs) == 1 and needs[0] != "input":
+            return {
+                "name": needs[0],
+                "output": outputs[0] or initial_input,
+                "link": self.chains[needs[0]]["link"],
+                "chain": self.chains[needs[0]]["chain"],
+            }
+
+        return {
+            "name": ", ".join(needs),
+            "output": (
+                outputs[0] if len(outputs) == 1 else OverlayDict(*reversed(outputs))
             )
+            or initial_input,
+            "link": None,
+            "chain": None,
+        }
 
-            if not should_proceed:
-                break
+    def _count_stages_left(self) -> dict[str, int]:
+        """
+        Count the stages left from every link to the end of the chain, the link included: the
+        length of the longest path through the links depending on it.
+        """
+        dependents: dict[str, list[str]] = {name: [] for name in self.chains}
+        for name, dependencies in self.dependencies.items():
+            for dependency in dependencies:
+                if dependency in dependents:
+                    dependents[dependency].append(name)
+
+        stages_left: dict[str, int] = {}
+        for name in reversed(list(self.chains)):  # dependents are declared after
+            stages_left[name] = 1 + max(
+                (stages_left[dependent] for dependent in dependents[name]), default=0
+            )
 
-            if not previous_output:
-                previous_output = initial_input
+        return stages_left
 
-            if previous_link and previous_link._link_type == "parallel":
-                assert isinstance(previous_output, list)
+    def _stage_token(self, name: str, cancel: CancelToken | None) -> CancelToken | None:
+        """
+        The cancel token of a link for a run cancelled by `cancel`. Under a deadline, the link
+        gets an equal share of the time left with the stages after it.
+        """
+        if cancel is None:
+            return None
 
-                def try_convert_to_dict(item):
-                    try:
-                        return item.dict()
-                    except:
-                        return item
+        remaining = cancel.remaining()
+        if remaining is None:
+            return cancel
 
-                if not isinstance(previous_output[0], dict):
-                    previous_output = [
-                        try_convert_to_dict(item) for item in previous_output
-                    ]
+        cancel.raise_if_cancelled()
+        return cancel.child(
+            timeout=max(remaining / self.stages_left[name], 1e-3),
+            name=f"stage {name}",
+        )
 
-                previous_output = {
-                    previous_link._name: previous_output,
-                }
+    def _execute_link(
+        self, name: str, initial_input: dict, context: RunContext
+    ) -> dict[str, Any]:
+        """
+        Execute a single link on the outputs of the links it needs and record it in the trace.
+        """
+        data = self.chains[name]
+        chain: RunnableSerializable | None = data["chain"]
+        link: ChainFactoryLink | ChainFactoryTool = data["link"]
+        usage: UsageTracker | None = data.get("usage")
+
+        if usage:
+            usage.reset()
+
+        previous = self._get_previous(name, initial_input, context.trace)
+        current = {
+            "name": name,
+            "output": None,
+            "link": link,
+            "chain": chain,
+            "cancel": self._stage_token(name, context.cancel),
+            "run_id": context.run_id,
+            "trace": context.trace,
+        }
+
+        if name in context.checkpoints:
+            return self._skip_link(name, previous, context, context.checkpoints[name])
+
+        if link._when and not self._test(link._when, previous["output"], name, "when"):
+            return self._skip_link(name, previous, context)
+
+        t1 = time.time()
+        match link._link_type:
+            case "sequential":
+                output = self._execute_sequential_chain(previous, current)
+            case "parallel":
+                output = self._execute_parallel_chain(previous, current)
+            case _:
+                raise ValueError(f"Invalid link type: {link._link_type}")
+        t2 = time.time()
+
+        assert output is not None
+        output_dict = None
+
+        if isinstance(output, list):
+            output_dict = [
+                item if isinstance(item, Mapping) else item.dict() for item in output
+            ]
+        elif not isinstance(output, Mapping):
+            output_dict = output.dict()
+        else:
+            output_dict = output
+
+        # a single entry is shared by the trace dict and list, nothing is copied
+        trace_entry = {
+            "name": name,
+            "type": link._link_type,
+            "is_tool": isinstance(link, ChainFactoryTool),
+            "needs": self.data_dependencies[name],
+            "input": previous["output"],
+            "in": previous["output"],
+            "output": output,
+            "out": output_dict,
+            "delta": (output.delta if isinstance(output, OverlayDict) else output_dict),
+            "execution_time": t2 - t1,
+            "usage": usage.snapshot() if usage else None,
+            "dedup": current.get("dedup"),
+            "cascade": current.get("cascade"),
+            "filter": current.get("filter"),
+            "concurrency": (
+                data["limiter"].snapshot(name) if data.get("limiter") else None
+            ),
+            "skipped": False,
+            "restored": False,
+            "model": data["model"].describe() if data.get("model") else None,
+        }
+        context.trace[name] = trace_entry
+        context.trace_list.append(trace_entry)
+        self.execution_trace[name] = trace_entry
+        self.execution_trace_list.append(trace_entry)
+        self._save_checkpoint(name, trace_entry, context.run_id)
+
+        if self.debugger:
+            self.debugger.after_link(name, self._materialize(output_dict))
+        elif output_dict and (
+            self.config.print_trace or self.config.print_trace_for_single_chain
+        ):
+            logger.info(
+                "Output from '%s':\n%s",
+                name,
+                lazy(lambda: pformat(self._materialize(output_dict))),
+            )
 
-            previous = {
-                "name": previous_chain_name,
-                "output": previous_output,
-                "link": previous_link,
-                "chain": previous_chain,
-            }
+        return trace_entry
 
-            current = {
-                "name": name,
-                "output": None,
-                "link": link,
-                "chain": chain,
-            }
+    def _skip_link(
+        self,
+        name: str,
+        previous: dict,
+        context: RunContext,
+        checkpoint: dict | None = None,
+    ) -> dict[str, Any]:
+        """
+        Record a link whose `when` guard is false as a zero-cost trace entry. A skipped
+        sequential link passes its input through, a skipped parallel link outputs no elements.
+        Links completed by a previous attempt of the run are restored from their `checkpoint`.
+        """
+        link = self.chains[name]["link"]
+        if checkpoint is not None:
+            output = checkpoint["out"]
+            if not checkpoint["skipped"]:
+                output = self._restore_output(link, output)
+        elif link._link_type == "parallel":
+            output = []
+        else:
+            output = previous["output"]
+
+        trace_entry = {
+            "name": name,
+            "type": link._link_type,
+            "is_tool": isinstance(link, ChainFactoryTool),
+            "needs": self.data_dependencies[name],
+            "input": previous["output"],
+            "in": previous["output"],
+            "output": output,
+            "out": output if checkpoint is None else checkpoint["out"],
+            "delta": {} if isinstance(output, Mapping) else output,
+            "execution_time": 0.0,
+            "usage": None,
+            "dedup": None,
+            "cascade": None,
+            "filter": None,
+            "concurrency": None,
+            "skipped": True if checkpoint is None else checkpoint["skipped"],
+            "restored": checkpoint is not None,
+            "model": None,
+        }
+        context.trace[name] = trace_entry
+        context.trace_list.append(trace_entry)
+        self.execution_trace[name] = trace_entry
+        self.execution_trace_list.append(trace_entry)
+
+        if checkpoint is not None:
+            logger.info(
+                "Restored '%s' from the checkpoint of run %s.", name, context.run_id
+            )
+        else:
+            self._save_checkpoint(name, trace_entry, context.run_id)
+            logger.info("Skipped '%s', its when condition is false.", name)
 
-            t1 = time.time()
-            match link._link_type:
-                case "sequential":
-                    output = self._execute_sequential_chain(previous, current)
-                case "parallel":
-                    output = self._execute_parallel_chain(previous, current)
-                case _:
-                    raise ValueError(f"Invalid link type: {link._link_type}")
-            t2 = time.time()
-
-            assert output
-            output_dict = None
-
-            if not isinstance(output, dict):
-                output_dict = output.dict()
-            else:
-                output_dict = output
-
-            self.execution_trace[name] = {
-                "name": name,
-                "type": link._link_type,
-                "is_tool": isinstance(link, ChainFactoryTool),
-                "input": previous_output,
-                "in": previous_output,
-                "output": output,
-                "out": output_dict,
-                "execution_time": t2 - t1,
-            }
-            self.execution_trace_list.append(
-                {
-                    "name": name,
-                    "type": link._link_type,
-                    "is_tool": isinstance(link, ChainFactoryTool),
-                    "input": previous_output,
-                    "in": previous_output,
-                    "output": output,
-                    "out": output_dict,
-                    "execution_time": t2 - t1,
-                }
+        return trace_entry
+
+    def _save_checkpoint(
+        self, name: str, trace_entry: dict, run_id: str | None
+    ) -> None:
+        """
+        Checkpoint the output of a completed link under `run_id`, if the engine has a
+        checkpoint store.
+        """
+        store = self.config.checkpoint_store
+        if store is not None and run_id:
+            store.save_stage(
+                run_id,
+                name,
+                {"out": trace_entry["out"], "skipped": trace_entry["skipped"]},
             )
 
-            if output_dict and (
-                self.config.print_trace
-                or self.config.print_trace_for_single_chain
-                or self.config.pause_between_executions
-            ):
-                print(Fore.CYAN + f"\nOutput from '{name}':" + Style.RESET_ALL)
-                print("=" * 100)
-                pprint(output_dict)
-                print("=" * 100)
+    @staticmethod
+    def _restore_output(link: ChainFactoryLink | ChainFactoryTool, output: Any) -> Any:
+        """
+        Rebuild the output models of a chainlink from their checkpointed JSON. Tool outputs are
+        restored as dictionaries.
+        """
+        if not isinstance(link, ChainFactoryLink) or not link.output:
+            return output
+
+        if isinstance(output, list):
+            return [link.output._type.model_validate(item) for item in output]
+
+        return link.output._type.model_validate(output)
+
+    def _fingerprint(self) -> str:
+        """
+        Fingerprint the links of the chain, so checkpoints are only restored by the same chain.
+        """
+        parts = [
+            (
+                name,
+                data["link"]._link_type,
+                (
+                    data["link"].prompt.template
+                    if isinstance(data["link"], ChainFactoryLink)
+                    and data["link"].prompt
+                    else None
+                ),
+            )
+            for name, data in self.chains.items()
+        ]
+        return str(farmhash.FarmHash64(repr(parts)))
 
-            previous_output = output
-            previous_chain_name = name
-            previous_chain = chain
-            previous_link = link
+    def _execute_elements(
+        self,
+        name: str,
+        fn: Callable[[Any], Any],
+        inputs: list,
+        cancel: CancelToken | None = None,
+        workers: int | None = None,
+        run_id: str | None = None,
+    ) -> list:
+        """
+        Call `fn` on every input of a parallel stage, see `_gather`, or dispatch the inputs to
+        the workers of the task queue. With a checkpoint store, every element is checkpointed
+        under `run_id` as it completes, and the elements completed by a previous attempt of the
+        run are restored instead of running again.
+        """
+        store = self.config.checkpoint_store
+        queue = self.config.task_queue
+        if store is None or not run_id:
+            if queue is not None:
+                return self._dispatch(name, inputs, cancel)
+
+            return self._gather(fn, inputs, cancel, workers)
+
+        link = self.chains[name]["link"]
+        completed = store.load_elements(run_id, name)
+        if completed:
+            logger.info(
+                "Restored %d of %d elements of '%s' from the checkpoint of run %s.",
+                len(completed),
+                len(inputs),
+                name,
+                run_id,
+            )
 
-        return self.execution_trace_list
+        if queue is not None:
+            missing = [i for i in range(len(inputs)) if i not in completed]
+            outputs = self._dispatch(
+                name,
+                [inputs[i] for i in missing],
+                cancel,
+                lambda j, output: store.save_element(run_id, name, missing[j], output),
+            )
+            results = dict(zip(missing, outputs))
+            return [
+                results[i] if i in results else self._restore_output(link, completed[i])
+                for i in range(len(inputs))
+            ]
+
+        def execute(i: int) -> Any:
+            if i in completed:
+                return self._restore_output(link, completed[i])
+
+            output = fn(inputs[i])
+            store.save_element(run_id, name, i, output)
+            return output
+
+        return self._gather(execute, list(range(len(inputs))), cancel, workers)
+
+    def _dispatch(
+        self,
+        name: str,
+        inputs: list,
+        cancel: CancelToken | None = None,
+        on_result: Callable[[int, Any], None] | None = None,
+    ) -> list:
+        """
+        Enqueue the inputs of a parallel stage as tasks of the task queue and wait for the
+        workers to execute them, see `ChainFactoryWorker`. `on_result` is called with the index
+        and the output of every element as it's collected. The tasks are removed from the queue
+        once the stage completes, fails or is cancelled.
+
+        If no worker claims any of the remaining tasks for `task_pickup_timeout` seconds, e.g.
+        because no worker loaded this chain, a warning is logged halfway and the stage fails.
+        """
+        queue = self.config.task_queue
+        assert queue is not None
+        pickup_timeout = self.config.task_pickup_timeout
+
+        data = self.chains[name]
+        link = data["link"]
+        task_ids = queue.put(self._fingerprint(), name, inputs)
+        index = {task_id: i for i, task_id in enumerate(task_ids)}
+        pending = set(task_ids)
+        results: list[Any] = [None] * len(inputs)
+        errors = []
+        waiting_since = time.monotonic()  # the last time a worker made progress
+        warned = False
+
+        try:
+            while pending:
+                if cancel is not None:
+                    cancel.raise_if_cancelled()
+
+                tasks = queue.results(list(pending))
+                for task in tasks:
+                    pending.discard(task.id)
+                    i = index[task.id]
+                    if task.status == "failed":
+                        error = RuntimeError(
+                            f"Element {i} of '{name}' failed on worker {task.worker}: {task.error}"
+                        )
+                        if self.config.fail_fast:
+                            raise error
+
+                        errors.append(error)
+                        continue
+
+                    if task.usage and "usage" in data:
+                        data["usage"].add(task.usage)
+
+                    results[i] = self._restore_output(link, task.output)
+                    if on_result is not None:
+                        on_result(i, task.output)
+
+                if tasks:
+                    waiting_since = time.monotonic()
+                elif pending:
+                    waited = time.monotonic() - waiting_since
+                    if pickup_timeout is not None and waited >= pickup_timeout / 2:
+                        if queue.unclaimed(list(pending)) < len(pending):
+                            waiting_since = time.monotonic()  # some are running
+                            warned = False
+                        elif waited >= pickup_timeout:
+                            raise TimeoutError(
+                                f"No worker picked up the tasks of '{name}' for {pickup_timeout}s. Start a worker with the same chain files and tools (`chainfactory worker`)."
+                            )
+                        elif not warned:
+                            logger.warning(
+                                "No worker picked up the %d tasks of '%s' for %.1fs.",
+                                len(pending),
+                                name,
+                                waited,
+                            )
+                            warned = True
+
+                    time.sleep(_QUEUE_POLL_INTERVAL)
+        finally:
+            queue.delete(task_ids)
+
+        if errors:
+            raise errors[0]
+
+        return results
+
+    def _execute_task(self, name: str, input: dict) -> tuple[Any, dict | None]:
+        """
+        Execute one element of a parallel stage for a worker of the task queue. Returns the
+        output as JSON and the token usage of the call.
+        """
+        data = self.chains[name]
+        link = data["link"]
+        if isinstance(link, ChainFactoryTool):
+            if link.is_async:
+                output = run_coroutine_sync(link.execute_async(input))
+            else:
+                output = link._execute(input)
+
+            return to_jsonable(output), None
+
+        usage = UsageTracker()
+        output = data["chain"].invoke(dict(input), config={"callbacks": [usage]})
+        return to_jsonable(output), usage.snapshot()
+
+    def _execute_chains(
+        self, initial_input: dict, context: RunContext
+    ) -> list[dict[str, Any]]:
+        """
+        Execute the chains, while piping the outputs to the chains that need them. Links whose
+        dependencies are satisfied at the same time run concurrently and are joined before
+        their dependents run. Without `needs` sections the links run strictly in order.
+        """
+        order = {name: i for i, name in enumerate(self.chains)}
+        run_start = len(self.execution_trace_list)
+        pending = list(self.chains)
+        done = {"input"}
+        running = {}
+
+        should_proceed = True
+        executor = ThreadPoolExecutor(self.config.max_parallel_chains)
+        try:
+            while (pending and should_proceed) or running:
+                if context.cancel is not None:
+                    context.cancel.raise_if_cancelled()
+
+                ready = [
+                    name
+                    for name in pending
+                    if all(dep in done for dep in self.dependencies[name])
+                ]
+
+                for name in ready if should_proceed else []:
+                    if self.debugger:
+                        should_proceed = self.debugger.before_link(
+                            name,
+                            is_tool=isinstance(
+                                self.chains[name]["link"], ChainFactoryTool
+                            ),
+                        )
+
+                    if not should_proceed:
+                        break
+
+                    pending.remove(name)
+
+                    if len(ready) == 1 and not running:
+                        self._execute_link(
+                            name, initial_input, context
+                        )  # nothing to overlap with
+                        done.add(name)
+                    else:
+                        future = executor.submit(
+                            self._execute_link, name, initial_input, context
+                        )
+                        running[future] = name
+
+                if running:
+                    finished, _ = wait(
+                        running,
+                        timeout=(
+                            None if context.cancel is None else _CANCEL_POLL_INTERVAL
+                        ),
+                        return_when=FIRST_COMPLETED,
+                    )
+                    for future in finished:
+                        future.result()
+                        done.add(running.pop(future))
+                elif pending and should_proceed and not ready:
+                    raise ValueError(
+                        f"Unresolvable dependencies for: {', '.join(pending)}."
+                    )
+        except BaseException:
+            # don't wait for the concurrent branches still running
+            executor.shutdown(wait=False, cancel_futures=True)
+            raise
+
+        executor.shutdown(wait=False)
+
+        # concurrent branches finish in any order, report this run in declaration order
+        context.trace_list.sort(key=lambda entry: order[entry["name"]])
+        self.execution_trace_list[run_start:] = sorted(
+            self.execution_trace_list[run_start:],
+            key=lambda entry: order[entry["name"]],
+        )
+
+        return context.trace_list
 
     def _create_chains(
         self,
@@ -509,70 +1746,277 @@ class ChainFactoryEngine:
         """
         runnables = {}
         for link in chainlinks:
-            try:
-                if isinstance(link, ChainFactoryTool):
-                    runnables[link._name] = {
-                        "chain": None,
-                        "link": link,
-                    }
-                    continue
-
-                match config.provider:
-                    case "openai":
-                        llm = ChatOpenAI(
-                            temperature=config.temperature,
-                            model=config.model,
-                            **config.model_kwargs,
-                        )
-                        model = (
-                            llm
-                            if link.output is None
-                            else llm.with_structured_output(link.output._type)
-                        )
-                    case "anthropic":
-                        llm = ChatAnthropic(
-                            temperature=config.temperature,
-                            model_name=config.model,
-                            **config.model_kwargs,
-                        )
-                        model = (
-                            llm
-                            if link.output is None
-                            else llm.with_structured_output(link.output._type)
-                        )
-                    case "ollama":
-                        llm = ChatOllama(
-                            temperature=config.temperature,
-                            model=config.model,
-                            **config.model_kwargs,
-                        )
+            if isinstance(link, ChainFactoryTool):
+                if link.target == "process" and link.is_async:
+                    raise ValueError(
+                        f"Tool {link._name} is a coroutine function and cannot target the process pool."
+                    )
 
-                        if link.output is None:
-                            model = llm
-                        else:
-                            json_schema = link.output._type.model_json_schema()
-                            model = llm.with_structured_output(schema=json_schema)
-                    case _:
+                if link.target == "process":
+                    try:
+                        pickle.dumps(link.fn)
+                    except Exception as e:
                         raise ValueError(
-                            f"Invalid provider: {config.provider}. Must be one of: openai, anthropic, ollama"
-                        )
-            except Exception as e:
-                raise ValueError(
-                    f"Failed to initialize {config.provider} provider: {str(e)}"
-                ) from e
+                            f"Tool {link._name} targets the process pool but cannot be pickled. Process tools must be module-level functions: {str(e)}"
+                        ) from e
+
+                if config.cassette is not None and link.fn is not None:
+                    link = self._cassette_tool(link, config.cassette)
+
+                runnables[link._name] = {
+                    "chain": None,
+                    "link": link,
+                }
+                continue
+
+            try:
+                model_profile = config.resolve_model(link.model)
+            except ValueError as e:
+                raise ValueError(f"Invalid model of chainlink {link._name}: {e}") from e
 
             assert link.prompt
             assert link.prompt.template
 
-            prompt = ChatPromptTemplate.from_template(link.prompt.template)
+            if link.dedup and link.dedup.fields:
+                for field in link.dedup.fields:
+                    if not any(
+                        link.dedup.matches(var, field)
+                        for var in link.prompt.input_variables or []
+                    ):
+                        raise ValueError(
+                            f"Invalid dedup field {field.replace('$', '.')} in chainlink {link._name}. It doesn't match any input variable of the prompt."
+                        )
 
+            usage = UsageTracker()
+            chain, prompt = self._create_runnable(link, config, model_profile, usage)
             runnables[link._name] = {
-                "chain": prompt | model,
+                "chain": chain,
+                "prompt": prompt,
+                "usage": usage,
+                "model": model_profile,
                 "link": link,
             }
 
+            if config.adaptive_concurrency:
+                runnables[link._name]["limiter"] = get_limiter(
+                    model_profile.describe(),
+                    config.max_parallel_chains,
+                    config.max_adaptive_concurrency,
+                )
+
+            if link.cascade:
+                try:
+                    cascade_profile = config.resolve_model(link.cascade.model)
+                except ValueError as e:
+                    raise ValueError(
+                        f"Invalid cascade model of chainlink {link._name}: {e}"
+                    ) from e
+
+                runnables[link._name]["cascade"] = {
+                    "chain": self._create_runnable(
+                        link, config, cascade_profile, usage
+                    )[0],
+                    "model": cascade_profile,
+                }
+
         return runnables
 
+    def _create_runnable(
+        self,
+        link: ChainFactoryLink,
+        config: ChainFactoryEngineConfig,
+        model_profile: ModelProfile,
+        usage: UsageTracker,
+    ) -> tuple[RunnableSerializable, ChatPromptTemplate]:
+        """
+        Create the runnable of a chainlink on a model: its prompt piped into the model, with
+        the usage of the calls recorded by the tracker.
+        """
+        prompt = self._create_prompt(link, config, model_profile.provider)  # type: ignore
+        cassette = config.cassette
+        if cassette is not None and not cassette.recording:
+            return (
+                self._cassette_runnable(link, model_profile, None, usage, cassette),
+                prompt,
+            )
+
+        try:
+            model = get_model(
+                provider=model_profile.provider,  # type: ignore
+                model=model_profile.model,  # type: ignore
+                temperature=model_profile.temperature,  # type: ignore
+                model_kwargs=model_profile.model_kwargs,  # type: ignore
+                output_type=None if link.output is None else link.output._type,
+                max_tokens=self._max_tokens(link, model_profile),
+            )
+        except Exception as e:
+            raise ValueError(
+                f"Failed to initialize {model_profile.provider} provider: {str(e)}"
+            ) from e
+
+        runnable = prompt | model
+        if config.adaptive_concurrency:
+            limiter = get_limiter(
+                model_profile.describe(),
+                config.max_parallel_chains,
+                config.max_adaptive_concurrency,
+            )
+            runnable = self._limit_runnable(runnable, limiter, link._name)
+
+        if cassette is not None:
+            return (
+                self._cassette_runnable(link, model_profile, runnable, usage, cassette),
+                prompt,
+            )
+
+        return runnable.with_config(callbacks=[usage]), prompt
+
+    @staticmethod
+    def _limit_runnable(
+        runnable: RunnableSerializable, limiter: AdaptiveLimiter, name: str
+    ) -> RunnableSerializable:
+        """
+        Wrap the runnable of a chainlink to wait for a slot of the model's adaptive limiter,
+        and report the latency or the error of every call to it. The wait is abandoned when the
+        stage of the calling thread fails or is cancelled.
+        """
+
+        def call(input: dict, config: RunnableConfig) -> Any:
+            return limiter.call(
+                lambda: runnable.invoke(input, config),
+                name,
+                getattr(_stage, "cancel", None),
+            )
+
+        return RunnableLambda(call)
+
+    def _cassette_runnable(
+        self,
+        link: ChainFactoryLink,
+        model_profile: ModelProfile,
+        runnable: RunnableSerializable | None,
+        usage: UsageTracker,
+        cassette: Cassette,
+    ) -> RunnableSerializable:
+        """
+        Wrap the runnable of a chainlink to record its calls into the cassette, with the usage
+        of every call. On replay there is no runnable: the recorded outputs and usage are served.
+        """
+
+        def call(input: dict) -> Any:
+            request = {"model": model_profile.describe(), "input": input}
+            call_usage = UsageTracker()
+            output, recorded_usage = cassette.call(
+                "chain",
+                link._name,
+                request,
+                lambda: runnable.invoke(  # type: ignore
+                    input, config={"callbacks": [call_usage, usage]}
+                ),
+                usage=call_usage.snapshot,
+            )
+            if cassette.recording:
+                return output
+
+            usage.add(recorded_usage or {})
+            if link.output is None:
+                return AIMessage.model_validate(output)
+
+            if model_profile.provider == "ollama":  # structured as a plain dictionary
+                return output
+
+            return self._restore_output(link, output)
+
+        return RunnableLambda(call)
+
+    @staticmethod
+    def _cassette_tool(link: ChainFactoryTool, cassette: Cassette) -> ChainFactoryTool:
+        """
+        Copy a tool with its function recorded into the cassette, or replayed from it. Process
+        tools run on threads instead, as the wrapped function cannot be pickled.
+        """
+        fn: Callable = link.fn  # type: ignore
+        tool = copy.copy(link)
+        if tool.target == "process":
+            tool.target = "thread"
+
+        if link.is_async:
+
+            async def call_async(*args, **kwargs) -> Any:
+                return await cassette.call_async(
+                    "tool",
+                    link._name,
+                    kwargs or list(args),
+                    lambda: fn(*args, **kwargs),
+                )
+
+            tool.fn = call_async
+            return tool
+
+        def execute(*args, **kwargs) -> Any:
+            res = fn(*args, **kwargs)
+            return run_coroutine_sync(res) if inspect.isawaitable(res) else res
+
+        def call(*args, **kwargs) -> Any:
+            return cassette.call(
+                "tool",
+                link._name,
+                kwargs or list(args),
+                lambda: execute(*args, **kwargs),
+            )[0]
+
+        tool.fn = call
+        return tool
+
+    @staticmethod
+    def _max_tokens(link: ChainFactoryLink, model_profile: ModelProfile) -> int | None:
+        """
+        The output token budget of a chainlink: its `max_tokens` section, else the budget
+        estimated from its output schema, capped by the max_tokens of its model. None when
+        neither is set and the output is unbounded, so the provider's default applies.
+        """
+        if link.max_tokens:
+            return link.max_tokens
+
+        estimate = link.output.estimate_max_tokens() if link.output else None
+        if estimate and model_profile.max_tokens:
+            return min(estimate, model_profile.max_tokens)
+
+        return estimate or model_profile.max_tokens
+
+    @staticmethod
+    def _create_prompt(
+        link: ChainFactoryLink,
+        config: ChainFactoryEngineConfig,
+        provider: str,
+    ) -> ChatPromptTemplate:
+        """
+        Create the prompt template of a chainlink. With prompt caching, the static prefix of the
+        template is sent as a separate content block ahead of the variable suffix, marked with
+        `cache_control` for Anthropic. OpenAI caches identical prompt prefixes automatically.
+        """
+        assert link.prompt
+        assert link.prompt.template
+
+        if not config.prompt_caching or provider not in ["anthropic", "openai"]:
+            return ChatPromptTemplate.from_template(link.prompt.template)
+
+        prefix, suffix = link.prompt.split_template()
+        if not prefix.strip() or not suffix:
+            return ChatPromptTemplate.from_template(link.prompt.template)
+
+        prefix_block: dict[str, Any] = {"type": "text", "text": prefix}
+        if provider == "anthropic":
+            prefix_block["cache_control"] = {"type": "ephemeral"}
+
+        return ChatPromptTemplate.from_messages(
+            [
+                HumanMessagePromptTemplate.from_template(
+                    [prefix_block, {"type": "text", "text": suffix}]
+                )
+            ]
+        )
+
     @classmethod
     def from_file(
         cls,
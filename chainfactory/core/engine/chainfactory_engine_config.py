@@ -1,7 +1,51 @@
 from dataclasses import dataclass, field
 from inspect import signature
 import inspect
-from typing import Any, Callable, Literal
+from typing import TYPE_CHECKING, Any, Callable, Literal, get_origin
+
+from chainfactory.core.types import ToolTargetTokens
+
+if TYPE_CHECKING:
+    from .cassette import Cassette
+    from .checkpoints import CheckpointStore
+    from .distributed import TaskQueue
+
+ProviderTokens = Literal["openai", "anthropic", "ollama"]
+
+DEFAULT_MODELS: dict[str, str] = {
+    "openai": "gpt-4o",
+    "anthropic": "claude-3-5-sonnet-latest",
+    "ollama": "llama3.2",
+}
+
+
+@dataclass
+class ModelProfile:
+    """
+    A named model setting that chainlinks can select with their `model` section. The fields
+    that are not set are inherited from the ChainFactoryEngineConfig.
+    """
+
+    provider: ProviderTokens | None = None
+    model: str | None = None
+    temperature: float | None = None
+    model_kwargs: dict | None = None
+    max_tokens: int | None = None
+
+    def __post_init__(self):
+        if self.provider is not None and self.provider not in DEFAULT_MODELS:
+            raise ValueError(
+                f"Invalid provider: {self.provider}. Must be one of: openai, anthropic, ollama"
+            )
+
+        if self.temperature is not None and not 0 <= self.temperature <= 1:
+            raise ValueError("Temperature must be between 0 and 1")
+
+        if self.max_tokens is not None and self.max_tokens < 1:
+            raise ValueError("max_tokens must be greater than 0")
+
+    def describe(self) -> str:
+        return f"{self.provider}:{self.model}"
 
 
 @dataclass
@@ -10,44 +54,129 @@ class ChainFactoryEngineConfig:
     Configuration for the ChainFactoryEngine.
     """
 
-    provider: Literal["openai", "anthropic", "ollama"] = "openai"
+    provider: ProviderTokens = "openai"
     model: str = field(default="gpt-4o")
     temperature: float = field(default=0.5)
     cache: bool = field(default=False)
-    max_tokens: int = field(default=1024)
+    max_tokens: int | None = field(default=None)
     model_kwargs: dict = field(default_factory=dict)
     max_parallel_chains: int = field(default=10)
+    adaptive_concurrency: bool = field(default=False)
+    max_adaptive_concurrency: int = field(default=64)
     print_trace: bool = field(default=False)
+    console_logging: bool = field(default=False)
     print_trace_for_single_chain: bool = field(default=False)
-    pause_between_executions: bool = field(default=True)
+    pause_between_executions: bool = field(default=False)
     tools: dict[str, Callable[..., dict]] = field(default_factory=dict)
+    tool_targets: dict[str, ToolTargetTokens] = field(default_factory=dict)
+    batch_tools: set[str] = field(default_factory=set)
+    max_process_workers: int | None = field(default=None)
+    cache_factories: bool = field(default=True)
+    prompt_caching: bool = field(default=False)
+    profile: Literal["development", "production"] = field(default="development")
+    model_profiles: dict[str, ModelProfile] = field(default_factory=dict)
+    fail_fast: bool = field(default=True)
+    timeout: float | None = field(default=None)
+    checkpoint_store: "CheckpointStore | None" = field(default=None)
+    cassette: "Cassette | None" = field(default=None)
+    task_queue: "TaskQueue | None" = field(default=None)
+    task_pickup_timeout: float | None = field(default=60.0)
 
     def __post_init__(self):
         """Validate and set provider-specific defaults"""
         # Set provider-specific model defaults if not specified
         if self.model == "gpt-4o":  # Only change if it's the default
-            match self.provider:
-                case "openai":
-                    self.model = "gpt-4o"
-                case "anthropic":
-                    self.model = "claude-3-5-sonnet-latest"
-                case "ollama":
-                    self.model = "llama3.2"
+            self.model = DEFAULT_MODELS.get(self.provider, self.model)
 
         # Validate temperature
         if not 0 <= self.temperature <= 1:
             raise ValueError("Temperature must be between 0 and 1")
 
         # Validate max_tokens
-        if self.max_tokens < 1:
+        if self.max_tokens is not None and self.max_tokens < 1:
             raise ValueError("max_tokens must be greater than 0")
 
         # Validate max_parallel_chains
         if self.max_parallel_chains < 1:
             raise ValueError("max_parallel_chains must be greater than 0")
 
-    def _validate_tool_function(self, fn: Any) -> None:
-        """Validate that the function is callable and returns a dict or None"""
+        # Validate max_adaptive_concurrency
+        if self.max_adaptive_concurrency < 1:
+            raise ValueError("max_adaptive_concurrency must be greater than 0")
+
+        # Validate profile
+        if self.profile not in ["development", "production"]:
+            raise ValueError("profile must be one of 'development' or 'production'")
+
+        if self.profile == "production" and self.pause_between_executions:
+            raise ValueError(
+                "pause_between_executions cannot be used with the production profile"
+            )
+
+        if self.profile == "production" and self.console_logging:
+            raise ValueError(
+                "console_logging cannot be used with the production profile"
+            )
+
+        # Validate timeout
+        if self.timeout is not None and self.timeout <= 0:
+            raise ValueError("timeout must be greater than 0")
+
+        # Validate task_pickup_timeout
+        if self.task_pickup_timeout is not None and self.task_pickup_timeout <= 0:
+            raise ValueError("task_pickup_timeout must be greater than 0")
+
+        # Validate max_process_workers
+        if self.max_process_workers is not None and self.max_process_workers < 1:
+            raise ValueError("max_process_workers must be greater than 0")
+
+        # Accept plain mappings as model profiles
+        for name, model_profile in self.model_profiles.items():
+            if isinstance(model_profile, dict):
+                self.model_profiles[name] = ModelProfile(**model_profile)
+
+    def resolve_model(self, model: "str | ModelProfile | None" = None) -> ModelProfile:
+        """
+        Resolve the model of a chainlink (a profile name, an inline profile or None for the
+        default) into a profile with all the fields set.
+        """
+        if model is None:
+            model_profile = ModelProfile()
+        elif isinstance(model, ModelProfile):
+            model_profile = model
+        elif model in self.model_profiles:
+            model_profile = self.model_profiles[model]
+        else:
+            raise ValueError(
+                f"Unknown model profile: {model}. Must be one of: {', '.join(self.model_profiles) or 'no profiles registered'}."
+            )
+
+        provider = model_profile.provider or self.provider
+        if model_profile.model:
+            model_name = model_profile.model
+        elif provider == self.provider:
+            model_name = self.model
+        else:
+            model_name = DEFAULT_MODELS[provider]
+
+        return ModelProfile(
+            provider=provider,
+            model=model_name,
+            temperature=(
+                self.temperature
+                if model_profile.temperature is None
+                else model_profile.temperature
+            ),
+            model_kwargs=(
+                self.model_kwargs
+                if model_profile.model_kwargs is None
+                else model_profile.model_kwargs
+            ),
+            max_tokens=model_profile.max_tokens or self.max_tokens,
+        )
+
+    def _validate_tool_function(self, fn: Any, batch: bool = False) -> None:
+        """Validate that the function is callable and returns a dict or None (a list for batch tools)"""
         if not callable(fn):
             raise TypeError(f"Tool must be callable, got {type(fn)}")
 
@@ -55,17 +184,61 @@ class ChainFactoryEngineConfig:
         return_type = signature(fn).return_annotation
         if return_type is inspect.Signature.empty:
             return_type = None
-        if return_type != Any and return_type != dict and return_type is not None:
+        if batch:
+            if (
+                return_type != Any
+                and return_type != list
+                and get_origin(return_type) is not list
+                and return_type is not None
+            ):
+                raise TypeError(
+                    f"Batch tool function {fn.__name__} must return a list, got {return_type}"
+                )
+        elif return_type != Any and return_type != dict and return_type is not None:
             raise TypeError(
                 f"Tool function {fn.__name__} must return dict or None, got {return_type}"
             )
 
-    def register_tool(self, fn: Callable) -> Callable:
+    def register_tool(
+        self,
+        fn: Callable | None = None,
+        *,
+        target: ToolTargetTokens | None = None,
+        batch: bool = False,
+    ) -> Callable:
         """
         Register a function to be used as a tool. The function can have arbitrary arguments
-        but should necessarily return a dictionary or None.
+        but should necessarily return a dictionary or None. Coroutine functions are awaited.
+
+        The optional `target` selects where the tool runs: `thread` (default) or `process`, which
+        dispatches it to a shared process pool. Process tools must be picklable module-level functions.
+        A `batch` tool receives the list of inputs of a whole parallel stage as its only argument
+        and returns a list of outputs (dicts or None) of the same length.
+        Can be used as a plain decorator or as `@config.register_tool(target="process")`.
         """
-        self._validate_tool_function(fn)
+        if fn is None:
+            return lambda fn: self.register_tool(fn, target=target, batch=batch)
+
+        self._validate_tool_function(fn, batch=batch)
+
+        if target is not None:
+            if target not in ["thread", "process"]:
+                raise ValueError(
+                    f"Invalid tool target: {target}. Must be one of 'thread' or 'process'."
+                )
+
+            if target == "process" and inspect.iscoroutinefunction(fn):
+                raise ValueError(
+                    f"Tool {fn.__name__} is a coroutine function and cannot target the process pool."
+                )
+
+            self.tool_targets[fn.__name__] = target
+
+        if batch:
+            self.batch_tools.add(fn.__name__)
+        else:
+            self.batch_tools.discard(fn.__name__)
+
         self.tools[fn.__name__] = fn
         return fn
 
@@ -0,0 +1,195 @@
+"""
+This module persists the progress of runs, so a run that failed can be resumed with
+`ChainFactoryEngine.resume(run_id)` instead of starting over. The output of every completed
+stage, and of every completed element of a parallel stage, is checkpointed under the run ID.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from typing import Any
+
+from chainfactory.core.utils import to_jsonable
+
+
+def _dumps(value: Any) -> str:
+    try:
+        return json.dumps(to_jsonable(value))
+    except TypeError as e:
+        raise TypeError(
+            f"Cannot checkpoint an output that is not JSON compatible. {str(e)}"
+        ) from e
+
+
+class CheckpointStore(ABC):
+    """
+    The interface of the checkpoint stores. Stores must be safe to use from multiple threads,
+    as the elements of a parallel stage are checkpointed as they complete.
+    """
+
+    @abstractmethod
+    def start_run(self, run_id: str, fingerprint: str, input: Any) -> None:
+        """
+        Record a new run, or check that an existing run was started by the same chain.
+        """
+
+    @abstractmethod
+    def load_input(self, run_id: str) -> Any:
+        """
+        Get the input of a run. Raises KeyError for unknown runs.
+        """
+
+    @abstractmethod
+    def save_stage(self, run_id: str, name: str, checkpoint: dict) -> None:
+        pass
+
+    @abstractmethod
+    def load_stages(self, run_id: str) -> dict[str, dict]:
+        pass
+
+    @abstractmethod
+    def save_element(self, run_id: str, name: str, index: int, output: Any) -> None:
+        pass
+
+    @abstractmethod
+    def load_elements(self, run_id: str, name: str) -> dict[int, Any]:
+        pass
+
+    @abstractmethod
+    def finish_run(self, run_id: str) -> None:
+        pass
+
+    @abstractmethod
+    def delete_run(self, run_id: str) -> None:
+        pass
+
+
+class SQLiteCheckpointStore(CheckpointStore):
+    """
+    A checkpoint store in a local SQLite database.
+
+    Usage:
+        config = EngineConfig(checkpoint_store=SQLiteCheckpointStore())
+        engine = Engine.from_file("examples/haiku.fctr", config=config)
+        try:
+            engine.run({"topic": "python"})
+        except Exception as e:
+            engine.resume(e.run_id)  # only the unfinished work is repeated
+    """
+
+    def __init__(self, path: str = ".chainfactory/checkpoints.db"):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self.path = path
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._connection:
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.executescript("""
+                CREATE TABLE IF NOT EXISTS runs (
+                    run_id TEXT PRIMARY KEY,
+                    fingerprint TEXT NOT NULL,
+                    input TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    updated REAL NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS stages (
+                    run_id TEXT NOT NULL,
+                    name TEXT NOT NULL,
+                    checkpoint TEXT NOT NULL,
+                    PRIMARY KEY (run_id, name)
+                );
+                CREATE TABLE IF NOT EXISTS elements (
+                    run_id TEXT NOT NULL,
+                    name TEXT NOT NULL,
+                    idx INTEGER NOT NULL,
+                    output TEXT NOT NULL,
+                    PRIMARY KEY (run_id, name, idx)
+                );
+                """)
+
+    def _execute(self, query: str, *params: Any) -> list[tuple]:
+        with self._lock, self._connection:
+            return self._connection.execute(query, params).fetchall()
+
+    def start_run(self, run_id: str, fingerprint: str, input: Any) -> None:
+        rows = self._execute("SELECT fingerprint FROM runs WHERE run_id = ?", run_id)
+        if rows and rows[0][0] != fingerprint:
+            raise ValueError(
+                f"Run {run_id} was checkpointed by a different chain and cannot be resumed."
+            )
+
+        if rows:
+            self._execute(
+                "UPDATE runs SET status = 'running', updated = ? WHERE run_id = ?",
+                time.time(),
+                run_id,
+            )
+            return
+
+        self._execute(
+            "INSERT INTO runs VALUES (?, ?, ?, 'running', ?)",
+            run_id,
+            fingerprint,
+            _dumps(input),
+            time.time(),
+        )
+
+    def load_input(self, run_id: str) -> Any:
+        rows = self._execute("SELECT input FROM runs WHERE run_id = ?", run_id)
+        if not rows:
+            raise KeyError(f"Run {run_id} not found in {self.path}.")
+
+        return json.loads(rows[0][0])
+
+    def save_stage(self, run_id: str, name: str, checkpoint: dict) -> None:
+        with self._lock, self._connection:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO stages VALUES (?, ?, ?)",
+                (run_id, name, _dumps(checkpoint)),
+            )
+            self._connection.execute(
+                "DELETE FROM elements WHERE run_id = ? AND name = ?", (run_id, name)
+            )
+
+    def load_stages(self, run_id: str) -> dict[str, dict]:
+        rows = self._execute(
+            "SELECT name, checkpoint FROM stages WHERE run_id = ?", run_id
+        )
+        return {name: json.loads(checkpoint) for name, checkpoint in rows}
+
+    def save_element(self, run_id: str, name: str, index: int, output: Any) -> None:
+        self._execute(
+            "INSERT OR REPLACE INTO elements VALUES (?, ?, ?, ?)",
+            run_id,
+            name,
+            index,
+            _dumps(output),
+        )
+
+    def load_elements(self, run_id: str, name: str) -> dict[int, Any]:
+        rows = self._execute(
+            "SELECT idx, output FROM elements WHERE run_id = ? AND name = ?",
+            run_id,
+            name,
+        )
+        return {index: json.loads(output) for index, output in rows}
+
+    def finish_run(self, run_id: str) -> None:
+        self._execute(
+            "UPDATE runs SET status = 'completed', updated = ? WHERE run_id = ?",
+            time.time(),
+            run_id,
+        )
+
+    def delete_run(self, run_id: str) -> None:
+        with self._lock, self._connection:
+            for table in ["elements", "stages", "runs"]:
+                self._connection.execute(
+                    f"DELETE FROM {table} WHERE run_id = ?", (run_id,)
+                )
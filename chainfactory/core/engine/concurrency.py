@@ -0,0 +1,265 @@
+"""
+This module adapts the number of concurrent calls to a model at run time, instead of the fixed
+`max_parallel_chains`. Every provider and model gets a limiter that grows the limit additively
+while the calls succeed at a steady latency, and cuts it multiplicatively on throttling (429s,
+overloaded responses, timeouts) or when the latency inflates (AIMD). The learned limits are
+saved under `.chainfactory` when they change, at most every `SAVE_INTERVAL` seconds and when
+the interpreter exits, so the next runs start from them.
+"""
+
+import atexit
+import json
+import os
+import threading
+import time
+from collections import deque
+from typing import Any, Callable
+
+from chainfactory.core.log import get_logger
+
+from .cancellation import CancelToken
+
+logger = get_logger("concurrency")
+
+LIMITS_PATH = ".chainfactory/concurrency.json"
+SAVE_INTERVAL = 30.0  # seconds between two saves of the learned limits
+
+_OVERLOAD_STATUS_CODES = {408, 429, 503, 529}
+_OVERLOAD_NAMES = ("ratelimit", "overload", "timeout")
+_CANCEL_POLL_INTERVAL = 0.05  # seconds between checks of the cancel token while waiting
+
+
+def is_overload(error: BaseException) -> bool:
+    """
+    True for the errors that signal the provider is throttling or overloaded.
+    """
+    if isinstance(error, TimeoutError):
+        return True
+
+    status_code = getattr(error, "status_code", None) or getattr(
+        getattr(error, "response", None), "status_code", None
+    )
+    if status_code in _OVERLOAD_STATUS_CODES:
+        return True
+
+    name = type(error).__name__.lower()
+    return any(word in name for word in _OVERLOAD_NAMES)
+
+
+class AdaptiveLimiter:
+    """
+    An AIMD limit on the concurrent calls to a model.
+
+    - A call that succeeds adds `1 / limit`, so the limit grows by one per round of calls.
+    - A throttling error halves the limit.
+    - A smoothed latency above `latency_tolerance` times the baseline (the fastest of the
+      last `window` latencies) cuts the limit by 10%.
+
+    The latencies are tracked per key, the name of the calling link, since the links sharing a
+    model ask for outputs of very different lengths. The calls that started before a decrease
+    saw the same congestion, so they don't decrease the limit again.
+    """
+
+    def __init__(
+        self,
+        limit: float,
+        minimum: int = 1,
+        maximum: int = 64,
+        latency_tolerance: float = 2.0,
+        window: int = 50,
+    ):
+        if minimum < 1 or maximum < minimum:
+            raise ValueError("The limits must satisfy 1 <= minimum <= maximum")
+
+        if window < 1:
+            raise ValueError("window must be greater than 0")
+
+        self.minimum = minimum
+        self.maximum = maximum
+        self.latency_tolerance = latency_tolerance
+        self.window = window
+        self.limit = float(min(max(limit, minimum), maximum))
+        self.initial_limit = self.limit
+        self.throttled = 0
+        self.latency: dict[str, float] = {}  # smoothed latency of the successful calls
+        self._latencies: dict[str, deque[float]] = (
+            {}
+        )  # the last latencies, for the baseline
+        self._in_flight = 0
+        self._last_decrease = 0.0
+        self._condition = threading.Condition()
+
+    def acquire(self, cancel: CancelToken | None = None) -> float:
+        """
+        Wait for a free slot under the current limit. Returns the start time of the call.
+        Raises `ChainCancelledError` if `cancel` is cancelled or expires while waiting.
+        """
+        with self._condition:
+            while self._in_flight >= int(self.limit):
+                if cancel is None:
+                    self._condition.wait()
+                    continue
+
+                cancel.raise_if_cancelled()
+                self._condition.wait(_CANCEL_POLL_INTERVAL)
+
+            self._in_flight += 1
+            return time.monotonic()
+
+    def release(
+        self, started: float, error: BaseException | None = None, key: str = ""
+    ) -> None:
+        """
+        Free the slot of a call and adapt the limit to its outcome.
+        """
+        now = time.monotonic()
+        latency = now - started
+
+        with self._condition:
+            self._in_flight -= 1
+
+            if error is not None:
+                if is_overload(error):
+                    self.throttled += 1
+                    self._decrease(started, now, 0.5)
+            else:
+                smoothed = self.latency.get(key, latency)
+                smoothed = self.latency[key] = 0.8 * smoothed + 0.2 * latency
+                latencies = self._latencies.setdefault(key, deque(maxlen=self.window))
+                latencies.append(latency)
+
+                if smoothed > self.latency_tolerance * min(latencies):
+                    self._decrease(started, now, 0.9)
+                else:
+                    self.limit = min(self.maximum, self.limit + 1 / self.limit)
+
+            self._condition.notify_all()
+
+    def _decrease(self, started: float, now: float, factor: float) -> None:
+        if started < self._last_decrease:
+            return
+
+        self.limit = max(self.minimum, self.limit * factor)
+        self._last_decrease = now
+
+    def call(
+        self,
+        fn: Callable[[], Any],
+        key: str = "",
+        cancel: CancelToken | None = None,
+    ) -> Any:
+        """
+        Call `fn` within the limit. See `acquire` for `cancel`.
+        """
+        started = self.acquire(cancel)
+        try:
+            result = fn()
+        except BaseException as e:
+            self.release(started, e, key)
+            raise
+
+        self.release(started, key=key)
+        return result
+
+    def snapshot(self, key: str = "") -> dict[str, Any]:
+        with self._condition:
+            latency = self.latency.get(key)
+            return {
+                "limit": int(self.limit),
+                "throttled": self.throttled,
+                "latency": None if latency is None else round(latency, 4),
+            }
+
+
+_limiters: dict[str, AdaptiveLimiter] = {}
+_limiters_lock = threading.Lock()
+_saved_limits: dict[str, float] | None = None
+_last_save: float | None = None
+
+
+def _load_limits() -> dict[str, float]:
+    try:
+        with open(LIMITS_PATH) as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return {}
+
+
+def get_limiter(key: str, limit: int, maximum: int) -> AdaptiveLimiter:
+    """
+    Get the limiter of a model (e.g. `openai:gpt-4o`), shared by all the engines of the
+    process. A new limiter starts from the limit learned by previous runs, else from `limit`.
+    """
+    global _saved_limits
+
+    with _limiters_lock:
+        limiter = _limiters.get(key)
+        if limiter is None:
+            if _saved_limits is None:
+                _saved_limits = _load_limits()
+
+            limiter = _limiters[key] = AdaptiveLimiter(
+                _saved_limits.get(key, limit), maximum=maximum
+            )
+        elif limiter.maximum != maximum:
+            with limiter._condition:
+                limiter.maximum = maximum
+                limiter.limit = min(max(limiter.limit, limiter.minimum), maximum)
+
+        return limiter
+
+
+def save_limits() -> bool:
+    """
+    Save the limits learned in this process, for the next runs. A limit that only fell
+    because of the latency, without any throttling, is not saved: slow calls are not a reason
+    for the next runs to start lower. Nothing is read or written unless a limit changed.
+    Returns True if the limits were written.
+    """
+    global _saved_limits
+
+    with _limiters_lock:
+        learned = {
+            key: round(limiter.limit, 2)
+            for key, limiter in _limiters.items()
+            if limiter.throttled or limiter.limit > limiter.initial_limit
+        }
+        saved = _saved_limits or {}
+        if all(saved.get(key) == limit for key, limit in learned.items()):
+            return False
+
+        limits = {**_load_limits(), **learned}
+        _saved_limits = limits
+
+    try:
+        os.makedirs(os.path.dirname(LIMITS_PATH), exist_ok=True)
+        path = f"{LIMITS_PATH}.{os.getpid()}.tmp"
+        with open(path, "w") as file:
+            json.dump(limits, file, indent=2, sort_keys=True)
+
+        os.replace(path, LIMITS_PATH)
+    except OSError as e:
+        logger.warning("Could not save the concurrency limits: %s", e)
+        return False
+
+    return True
+
+
+atexit.register(save_limits)
+
+
+def schedule_save_limits() -> None:
+    """
+    Save the learned limits unless they were saved less than `SAVE_INTERVAL` seconds ago. The
+    changes in between are saved by a later call, or when the interpreter exits.
+    """
+    global _last_save
+
+    now = time.monotonic()
+    with _limiters_lock:
+        if _last_save is not None and now - _last_save < SAVE_INTERVAL:
+            return
+
+    if save_limits():
+        with _limiters_lock:
+            _last_save = now
@@ -0,0 +1,79 @@
+from pprint import pprint
+from typing import TYPE_CHECKING, Any
+
+from colorama import Fore, Style
+
+from chainfactory.core.log import init_colors
+
+if TYPE_CHECKING:
+    from .chainfactory_engine import ChainFactoryEngine
+
+
+class ChainFactoryDebugger:
+    """
+    Interactive stepping through the chainlinks of an engine: prints the output of every link and
+    asks for confirmation before executing the next one.
+
+    Usage:
+        engine = Engine.from_file("examples/haiku.fctr", config=config)
+        ChainFactoryDebugger(engine)
+        engine(topic="python")
+    """
+
+    def __init__(self, engine: "ChainFactoryEngine | None" = None):
+        init_colors()
+
+        if engine is not None:
+            self.attach(engine)
+
+    def attach(self, engine: "ChainFactoryEngine") -> "ChainFactoryEngine":
+        """
+        Step through the executions of the engine.
+        """
+        engine.debugger = self
+        return engine
+
+    @staticmethod
+    def detach(engine: "ChainFactoryEngine") -> "ChainFactoryEngine":
+        """
+        Stop stepping through the executions of the engine.
+        """
+        engine.debugger = None
+        return engine
+
+    def before_link(self, name: str, is_tool: bool | None = False) -> bool:
+        """
+        Ask whether to execute the next link. Returns False to stop the execution.
+        """
+        if name:
+            print(
+                Fore.GREEN
+                + f"\nNext to be executed: {name}"
+                + (" (tool) " if is_tool else " (chainlink) ")
+                + Style.RESET_ALL
+            )
+
+        while True:
+            response = (
+                input(Fore.WHITE + "Proceed? (Yes/No): " + Style.RESET_ALL)
+                .strip()
+                .lower()
+            )
+
+            if response in ["yes", "y", ""]:
+                print(Fore.GREEN + f"Executing chainlink: {name}" + Style.RESET_ALL)
+                return True
+            elif response in ["no", "n"]:
+                print(Fore.RED + f"Terminating execution." + Style.RESET_ALL)
+                return False
+            else:
+                continue  # ask again
+
+    def after_link(self, name: str, output: Any) -> None:
+        """
+        Print the output of a link.
+        """
+        print(Fore.CYAN + f"\nOutput from '{name}':" + Style.RESET_ALL)
+        print("=" * 100)
+        pprint(output)
+        print("=" * 100)
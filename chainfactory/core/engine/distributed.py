@@ -0,0 +1,349 @@
+"""
+This module distributes the elements of parallel stages over worker processes, possibly on
+other hosts. With a task queue in the engine config, the driver enqueues one task per element
+(the chain, the link and the resolved input) and waits for the results, while workers that
+loaded the same chain claim the tasks and execute them.
+"""
+
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from typing import Any
+
+from chainfactory.core.log import get_logger
+from chainfactory.core.utils import to_jsonable
+
+from .chainfactory_engine import ChainFactoryEngine
+
+logger = get_logger("worker")
+
+
+@dataclass
+class Task:
+    """
+    One element of a parallel stage. `chain` is the fingerprint of the chain it belongs to, so
+    it's only executed by workers that loaded the same chain.
+    """
+
+    id: str
+    chain: str
+    link: str
+    input: Any
+    status: str = "pending"  # pending, running, done or failed
+    output: Any = None
+    usage: dict | None = None
+    error: str | None = None
+    worker: str | None = None
+
+
+class TaskQueue(ABC):
+    """
+    The interface of the task queues. Queues must be safe to use from multiple threads, and
+    from the driver and the workers at the same time.
+    """
+
+    @abstractmethod
+    def put(self, chain: str, link: str, inputs: list[Any]) -> list[str]:
+        """
+        Enqueue one task per input and return their IDs, in order.
+        """
+
+    @abstractmethod
+    def claim(self, chains: list[str], worker: str) -> Task | None:
+        """
+        Take the oldest pending task of one of the chains, or None if there is none.
+        """
+
+    @abstractmethod
+    def complete(self, task_id: str, output: Any, usage: dict | None = None) -> None:
+        pass
+
+    @abstractmethod
+    def fail(self, task_id: str, error: str) -> None:
+        pass
+
+    @abstractmethod
+    def results(self, task_ids: list[str]) -> list[Task]:
+        """
+        Get the tasks among `task_ids` that are done or failed.
+        """
+
+    @abstractmethod
+    def unclaimed(self, task_ids: list[str]) -> int:
+        """
+        Count the tasks among `task_ids` that no worker claimed yet.
+        """
+
+    @abstractmethod
+    def delete(self, task_ids: list[str]) -> None:
+        """
+        Remove the tasks, e.g. once their results are collected. Pending tasks are dropped.
+        """
+
+
+class SQLiteTaskQueue(TaskQueue):
+    """
+    A task queue in a SQLite database, shared by the processes of one machine or of hosts
+    with a shared filesystem that supports locking. A running task whose worker didn't finish
+    it within `lease` seconds, e.g. because the worker died, is handed to another worker.
+
+    Usage:
+        config = EngineConfig(task_queue=SQLiteTaskQueue(".chainfactory/tasks.db"))
+        Engine.from_file("examples/haiku.fctr", config=config)(topic="python")
+
+        # in other processes, or with `chainfactory worker examples/haiku.fctr`
+        ChainFactoryWorker(Engine.from_file("examples/haiku.fctr"), SQLiteTaskQueue(".chainfactory/tasks.db")).run()
+    """
+
+    _BATCH_SIZE = 500  # task IDs per query, below the SQLite variable limit
+
+    def __init__(self, path: str = ".chainfactory/tasks.db", lease: float = 600.0):
+        if lease <= 0:
+            raise ValueError("lease must be greater than 0")
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self.path = path
+        self.lease = lease
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        with self._lock, self._connection:
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.executescript("""
+                CREATE TABLE IF NOT EXISTS tasks (
+                    id TEXT PRIMARY KEY,
+                    chain TEXT NOT NULL,
+                    link TEXT NOT NULL,
+                    input TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    output TEXT,
+                    usage TEXT,
+                    error TEXT,
+                    worker TEXT,
+                    updated REAL NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS tasks_chain_status ON tasks (chain, status);
+                """)
+
+    def _execute(self, query: str, *params: Any) -> list[tuple]:
+        with self._lock, self._connection:
+            return self._connection.execute(query, params).fetchall()
+
+    def put(self, chain: str, link: str, inputs: list[Any]) -> list[str]:
+        task_ids = [uuid.uuid4().hex for _ in inputs]
+        now = time.time()
+        with self._lock, self._connection:
+            self._connection.executemany(
+                "INSERT INTO tasks (id, chain, link, input, status, updated) VALUES (?, ?, ?, ?, 'pending', ?)",
+                [
+                    (task_id, chain, link, json.dumps(to_jsonable(input)), now)
+                    for task_id, input in zip(task_ids, inputs)
+                ],
+            )
+
+        return task_ids
+
+    def claim(self, chains: list[str], worker: str) -> Task | None:
+        now = time.time()
+        placeholders = ", ".join("?" for _ in chains)
+        rows = self._execute(
+            f"""
+            UPDATE tasks SET status = 'running', worker = ?, updated = ?
+            WHERE id = (
+                SELECT id FROM tasks
+                WHERE chain IN ({placeholders})
+                AND (status = 'pending' OR (status = 'running' AND updated < ?))
+                ORDER BY rowid LIMIT 1
+            )
+            RETURNING id, chain, link, input
+            """,
+            worker,
+            now,
+            *chains,
+            now - self.lease,
+        )
+        if not rows:
+            return None
+
+        task_id, chain, link, input = rows[0]
+        return Task(
+            id=task_id,
+            chain=chain,
+            link=link,
+            input=json.loads(input),
+            status="running",
+            worker=worker,
+        )
+
+    def complete(self, task_id: str, output: Any, usage: dict | None = None) -> None:
+        self._execute(
+            "UPDATE tasks SET status = 'done', output = ?, usage = ?, updated = ? WHERE id = ?",
+            json.dumps(to_jsonable(output)),
+            json.dumps(usage),
+            time.time(),
+            task_id,
+        )
+
+    def fail(self, task_id: str, error: str) -> None:
+        self._execute(
+            "UPDATE tasks SET status = 'failed', error = ?, updated = ? WHERE id = ?",
+            error,
+            time.time(),
+            task_id,
+        )
+
+    def results(self, task_ids: list[str]) -> list[Task]:
+        tasks = []
+        for i in range(0, len(task_ids), self._BATCH_SIZE):
+            batch = task_ids[i : i + self._BATCH_SIZE]
+            rows = self._execute(
+                f"""
+                SELECT id, chain, link, status, output, usage, error, worker FROM tasks
+                WHERE id IN ({", ".join("?" for _ in batch)}) AND status IN ('done', 'failed')
+                """,
+                *batch,
+            )
+            tasks.extend(
+                Task(
+                    id=task_id,
+                    chain=chain,
+                    link=link,
+                    input=None,
+                    status=status,
+                    output=None if output is None else json.loads(output),
+                    usage=None if usage is None else json.loads(usage),
+                    error=error,
+                    worker=worker,
+                )
+                for task_id, chain, link, status, output, usage, error, worker in rows
+            )
+
+        return tasks
+
+    def unclaimed(self, task_ids: list[str]) -> int:
+        count = 0
+        for i in range(0, len(task_ids), self._BATCH_SIZE):
+            batch = task_ids[i : i + self._BATCH_SIZE]
+            rows = self._execute(
+                f"""
+                SELECT COUNT(*) FROM tasks
+                WHERE id IN ({", ".join("?" for _ in batch)}) AND status = 'pending'
+                """,
+                *batch,
+            )
+            count += rows[0][0]
+
+        return count
+
+    def delete(self, task_ids: list[str]) -> None:
+        with self._lock, self._connection:
+            for i in range(0, len(task_ids), self._BATCH_SIZE):
+                batch = task_ids[i : i + self._BATCH_SIZE]
+                self._connection.execute(
+                    f"DELETE FROM tasks WHERE id IN ({', '.join('?' for _ in batch)})",
+                    batch,
+                )
+
+
+class ChainFactoryWorker:
+    """
+    Executes the tasks of a queue for one or more chains. The engines must be loaded from the
+    same chain files as the driver's, with the tools registered in their configs.
+    """
+
+    def __init__(
+        self,
+        engines: ChainFactoryEngine | list[ChainFactoryEngine],
+        queue: TaskQueue,
+        concurrency: int = 1,
+        poll_interval: float = 0.2,
+        worker_id: str | None = None,
+    ):
+        if concurrency < 1:
+            raise ValueError("concurrency must be greater than 0")
+
+        if poll_interval <= 0:
+            raise ValueError("poll_interval must be greater than 0")
+
+        if isinstance(engines, ChainFactoryEngine):
+            engines = [engines]
+
+        self.engines = {engine._fingerprint(): engine for engine in engines}
+        self.queue = queue
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        self.worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}"
+        self.executed = 0
+        self.failed = 0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+
+    def run(self, idle_timeout: float | None = None) -> int:
+        """
+        Execute tasks until `stop` is called, or until no task was found for `idle_timeout`
+        seconds. Returns the number of tasks executed.
+        """
+        threads = [
+            threading.Thread(target=self._work, args=(idle_timeout,), daemon=True)
+            for _ in range(self.concurrency)
+        ]
+        for thread in threads:
+            thread.start()
+
+        try:
+            for thread in threads:
+                while thread.is_alive():
+                    thread.join(self.poll_interval)
+        except KeyboardInterrupt:
+            self.stop()
+
+        return self.executed
+
+    def stop(self) -> None:
+        """
+        Stop claiming tasks. The tasks being executed are completed.
+        """
+        self._stop.set()
+
+    def _work(self, idle_timeout: float | None) -> None:
+        chains = list(self.engines)
+        idle_since = time.monotonic()
+
+        while not self._stop.is_set():
+            task = self.queue.claim(chains, self.worker_id)
+            if task is None:
+                if (
+                    idle_timeout is not None
+                    and time.monotonic() - idle_since >= idle_timeout
+                ):
+                    return
+
+                self._stop.wait(self.poll_interval)
+                continue
+
+            self._execute(task)
+            idle_since = time.monotonic()
+
+    def _execute(self, task: Task) -> None:
+        try:
+            output, usage = self.engines[task.chain]._execute_task(
+                task.link, task.input
+            )
+        except Exception as e:
+            logger.warning("Task %s of '%s' failed: %s", task.id, task.link, e)
+            self.queue.fail(task.id, f"{type(e).__name__}: {e}")
+            with self._lock:
+                self.failed += 1
+        else:
+            self.queue.complete(task.id, output, usage)
+
+        with self._lock:
+            self.executed += 1
@@ -0,0 +1,113 @@
+"""
+This module holds the process pool shared by all engines for tools that target `process`,
+and the helpers to run tool functions outside of the engine's thread pool.
+"""
+
+import os
+import atexit
+import asyncio
+import pickle
+import threading
+from typing import Any, Callable, Coroutine, TypeVar
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+T = TypeVar("T")
+
+_process_pool: ProcessPoolExecutor | None = None
+_process_pool_size: int = 0
+_process_pool_lock = threading.Lock()
+
+
+def get_process_pool(max_workers: int | None = None) -> tuple[ProcessPoolExecutor, int]:
+    """
+    Return the shared process pool and its size, creating it on first use. The pool is reused
+    across engines and runs, so `max_workers` only takes effect when the pool is created.
+    """
+    global _process_pool, _process_pool_size
+
+    with _process_pool_lock:
+        if _process_pool is None:
+            _process_pool_size = max_workers or os.cpu_count() or 1
+            _process_pool = ProcessPoolExecutor(max_workers=_process_pool_size)
+
+        return _process_pool, _process_pool_size
+
+
+def shutdown_process_pool(wait: bool = True) -> None:
+    """
+    Shut down the shared process pool. The next `get_process_pool` call creates a new one.
+    """
+    global _process_pool
+
+    with _process_pool_lock:
+        if _process_pool is not None:
+            _process_pool.shutdown(wait=wait, cancel_futures=True)
+            _process_pool = None
+
+
+class PicklingCheckError(Exception):
+    """
+    Raised when the inputs or the outputs of a process tool cannot be pickled, as opposed to the
+    errors raised by the tool itself.
+    """
+
+
+def ensure_picklable(value: Any, what: str) -> None:
+    """
+    Check that a value can cross the process boundary by pickling it.
+    """
+    try:
+        pickle.dumps(value)
+    except Exception as e:
+        raise PicklingCheckError(f"The {what} cannot be pickled: {str(e)}") from e
+
+
+def call_tool_chunk(fn: Callable[..., Any], inputs: list[dict]) -> list[Any]:
+    """
+    Call a tool function once for every input in the chunk. Runs inside the worker processes.
+    """
+    results = [fn(**input) for input in inputs]
+    ensure_picklable(results, "outputs")
+    return results
+
+
+def call_tool_batch(fn: Callable[..., Any], inputs: list[dict]) -> Any:
+    """
+    Call a batch tool function on a chunk of inputs. Runs inside the worker processes.
+    """
+    results = fn(inputs)
+    ensure_picklable(results, "outputs")
+    return results
+
+
+def _noop() -> None:
+    return None
+
+
+def warmup_process_pool(max_workers: int | None = None) -> int:
+    """
+    Start the workers of the shared process pool ahead of the first process tool call, by
+    submitting one no-op task per worker. Returns the size of the pool.
+    """
+    pool, size = get_process_pool(max_workers)
+    for future in [pool.submit(_noop) for _ in range(size)]:
+        future.result()
+
+    return size
+
+
+atexit.register(shutdown_process_pool)
+
+
+def run_coroutine_sync(coro: Coroutine[Any, Any, T]) -> T:
+    """
+    Run a coroutine to completion from synchronous code. If the calling thread already runs an
+    event loop (e.g. inside a notebook), the coroutine is run on a fresh loop in a helper thread.
+    """
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(coro)
+
+    with ThreadPoolExecutor(1) as executor:
+        return executor.submit(asyncio.run, coro).result()
@@ -0,0 +1,213 @@
+"""
+This module creates the provider models used by the engine. Provider clients, JSON schemas and
+structured output runnables are cached per process, so engines with the same model settings
+and output classes share them instead of rebuilding them for every chain.
+"""
+
+import copy
+import importlib
+import threading
+from functools import lru_cache
+from typing import Any
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.outputs import LLMResult
+
+from chainfactory.core.utils import LRUCache
+
+MODEL_CACHE_SIZE = 256  # provider clients and structured runnables kept for reuse
+
+_model_cache = LRUCache(MODEL_CACHE_SIZE)
+_model_cache_lock = threading.Lock()
+
+# the provider SDKs are slow to import, so they are only imported when a model is created
+_CHAT_MODELS: dict[str, tuple[str, str]] = {
+    "openai": ("langchain_openai", "ChatOpenAI"),
+    "anthropic": ("langchain_anthropic", "ChatAnthropic"),
+    "ollama": ("langchain_ollama", "ChatOllama"),
+}
+
+
+def _chat_model(provider: str) -> type:
+    """
+    Import the chat model class of a provider on first use, e.g. `ChatOpenAI` for openai.
+    """
+    module_name, class_name = _CHAT_MODELS[provider]
+    chat_model = globals().get(class_name)
+    if chat_model is None:
+        chat_model = getattr(importlib.import_module(module_name), class_name)
+        globals()[class_name] = chat_model
+
+    return chat_model
+
+
+def __getattr__(name: str) -> Any:
+    for provider, (_, class_name) in _CHAT_MODELS.items():
+        if name == class_name:
+            return _chat_model(provider)
+
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+@lru_cache(maxsize=1024)
+def _json_schema(output_type: type) -> dict:
+    """
+    Compute the JSON schema of an output class once.
+    """
+    return output_type.model_json_schema()  # type: ignore
+
+
+def json_schema(output_type: type) -> dict:
+    """
+    Return a copy of the cached JSON schema of an output class.
+    """
+    return copy.deepcopy(_json_schema(output_type))
+
+
+def _with_limit(model_kwargs: dict, key: str, max_tokens: int | None) -> dict:
+    """
+    Add the output token limit to the model kwargs, under the provider's name for it.
+    """
+    if not max_tokens or key in model_kwargs:
+        return model_kwargs
+
+    return {key: max_tokens, **model_kwargs}
+
+
+def _create_llm(
+    provider: str,
+    model: str,
+    temperature: float,
+    model_kwargs: dict,
+    max_tokens: int | None = None,
+) -> Any:
+    """
+    Create the chat model client for a provider.
+    """
+    match provider:
+        case "openai":
+            return _chat_model("openai")(
+                temperature=temperature,
+                model=model,
+                **_with_limit(model_kwargs, "max_tokens", max_tokens),
+            )
+        case "anthropic":
+            return _chat_model("anthropic")(
+                temperature=temperature,
+                model_name=model,
+                **_with_limit(model_kwargs, "max_tokens", max_tokens),
+            )
+        case "ollama":
+            return _chat_model("ollama")(
+                temperature=temperature,
+                model=model,
+                **_with_limit(model_kwargs, "num_predict", max_tokens),
+            )
+        case _:
+            raise ValueError(
+                f"Invalid provider: {provider}. Must be one of: openai, anthropic, ollama"
+            )
+
+
+def clear_model_cache() -> None:
+    """
+    Drop the cached provider clients, structured runnables and JSON schemas.
+    """
+    _model_cache.clear()
+    _json_schema.cache_clear()
+
+
+def get_model(
+    provider: str,
+    model: str,
+    temperature: float,
+    model_kwargs: dict,
+    output_type: type | None = None,
+    max_tokens: int | None = None,
+) -> Any:
+    """
+    Get the chat model for the given settings, bound to the structured output of `output_type` if given.
+    """
+    llm_key = (
+        provider,
+        model,
+        temperature,
+        repr(sorted(model_kwargs.items(), key=lambda item: item[0])),
+        max_tokens,
+    )
+
+    with _model_cache_lock:
+        llm = _model_cache.get(llm_key)
+        if llm is None:
+            llm = _create_llm(provider, model, temperature, model_kwargs, max_tokens)
+            _model_cache.put(llm_key, llm)
+
+        if output_type is None:
+            return llm
+
+        structured_key = llm_key + (output_type,)
+        structured = _model_cache.get(structured_key)
+        if structured is None:
+            if provider == "ollama":
+                structured = llm.with_structured_output(schema=json_schema(output_type))
+            else:
+                structured = llm.with_structured_output(output_type)
+
+            _model_cache.put(structured_key, structured)
+
+        return structured
+
+
+class UsageTracker(BaseCallbackHandler):
+    """
+    Accumulates the token usage reported by the provider for the calls of a chainlink,
+    including the prompt tokens read from and written to the provider's prompt cache.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        with self._lock:
+            self.usage = {
+                "calls": 0,
+                "input_tokens": 0,
+                "output_tokens": 0,
+                "cache_read_tokens": 0,
+                "cache_creation_tokens": 0,
+            }
+
+    def snapshot(self) -> dict[str, int]:
+        with self._lock:
+            return dict(self.usage)
+
+    def add(self, usage: dict[str, int]) -> None:
+        """
+        Add usage counted elsewhere, e.g. the recorded usage of a replayed call.
+        """
+        with self._lock:
+            for key, value in usage.items():
+                if key in self.usage:
+                    self.usage[key] += value
+
+    def on_llm_end(self, response: LLMResult, **kwargs: Any) -> None:
+        for generations in response.generations:
+            for generation in generations:
+                usage_metadata = getattr(
+                    getattr(generation, "message", None), "usage_metadata", None
+                )
+                if not usage_metadata:
+                    continue
+
+                details = usage_metadata.get("input_token_details") or {}
+                with self._lock:
+                    self.usage["calls"] += 1
+                    self.usage["input_tokens"] += usage_metadata.get("input_tokens", 0)
+                    self.usage["output_tokens"] += usage_metadata.get(
+                        "output_tokens", 0
+                    )
+                    self.usage["cache_read_tokens"] += details.get("cache_read") or 0
+                    self.usage["cache_creation_tokens"] += (
+                        details.get("cache_creation") or 0
+                    )
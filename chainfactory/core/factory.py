@@ -3,17 +3,34 @@ This module defines the core `Factory` type representation.
 """
 
 from datetime import datetime
+import inspect
+import os
 import uuid
-import yaml
 import farmhash
-from typing import Any, Callable, Optional
+from typing import Any, Callable, Mapping, Optional
 from dataclasses import dataclass, field
 from typing import Any, Optional, Literal
 import importlib.resources as pkg_resources
 from abc import abstractmethod
 
-from chainfactory.core.engine.chainfactory_engine_config import ChainFactoryEngineConfig
+from chainfactory.core.engine.chainfactory_engine_config import (
+    ChainFactoryEngineConfig,
+    ModelProfile,
+)
+from chainfactory.core.engine.executors import run_coroutine_sync
+from chainfactory.core.factory_cache import (
+    cache_factory,
+    config_callables,
+    config_fingerprint,
+    content_hash,
+    get_cached_factory,
+)
+from chainfactory.core.types import OverlayDict, ToolTargetTokens
+from chainfactory.core.log import get_logger
 from chainfactory.core.utils import load_cache_file, save_cache_file
+from chainfactory.core.parsing.fctr import FctrSection, load_yaml, parse_fctr
+from chainfactory.core.parsing.predicate import Predicate
+from chainfactory.core.parsing.type_expression import TypeExpressionError
 
 from .components import (
     FactoryDefinitions,
@@ -21,13 +38,21 @@ from .components import (
     FactoryOutput,
     FactoryInput,
     FactoryMask,
+    FactoryReduce,
+    FactoryDedup,
+    FactoryCascade,
 )
 
+logger = get_logger("factory")
+
 
 class BaseChainFactoryLink:
     _name: str
     _link_type: Literal["sequential", "parallel"] = "sequential"
     _is_tool: bool = False
+    _needs: list[str] | None = None  # section `needs`, None means the preceding link
+    _when: Predicate | None = None  # section `when`, the link is skipped if it's false
+    _filter: Predicate | None = None  # section `filter` (only for parallel links)
 
     def __init__(
         self,
@@ -62,6 +87,8 @@ class ChainFactoryTool(BaseChainFactoryLink):
         source: dict,
         link_type: Literal["sequential", "parallel"] = "sequential",
         fn: Callable[..., dict] | None = None,
+        target: ToolTargetTokens = "thread",
+        batch: bool = False,
     ):
         super().__init__(
             name=name,
@@ -69,29 +96,96 @@ class ChainFactoryTool(BaseChainFactoryLink):
             is_tool=True,
         )
         self.fn = fn
+        self.target: ToolTargetTokens = target
+        self.batch = batch  # fn takes the list of inputs and returns a list of outputs
+        self.is_async = inspect.iscoroutinefunction(fn)
         input = source.get("in", {})
         self.input = FactoryInput(attributes=input)
 
-    def execute(self, **kwargs) -> dict:
+    def execute(self, **kwargs) -> Mapping:
+        return self._execute(kwargs)
+
+    def _execute(self, input: Mapping) -> Mapping:
+        """
+        Execute the tool for a single input mapping.
+        """
+        if self.batch:
+            return self.execute_batch([input])[0]
+
         if not self.fn:
             raise ValueError("ChainFactoryTool.fn is None. Cannot execute.")
 
+        res = self.fn(**self._prepare_input(input))
+        if inspect.isawaitable(res):
+            res = run_coroutine_sync(res)
+
+        return self._merge_result(input, res)
+
+    async def execute_async(self, input: Mapping) -> Mapping:
+        """
+        Execute the tool on the running event loop. Synchronous tool functions are called inline.
+        """
+        if not self.fn:
+            raise ValueError("ChainFactoryTool.fn is None. Cannot execute.")
+
+        res = self.fn(**self._prepare_input(input))
+        if inspect.isawaitable(res):
+            res = await res
+
+        return self._merge_result(input, res)
+
+    def execute_batch(self, inputs: list[Mapping]) -> list[Mapping]:
+        """
+        Execute the tool for a list of inputs. Batch tools are called once with the whole list,
+        other tools once per input.
+        """
+        if not self.batch:
+            return [self._execute(input) for input in inputs]
+
+        if not self.fn:
+            raise ValueError("ChainFactoryTool.fn is None. Cannot execute.")
+
+        res = self.fn([self._prepare_input(input) for input in inputs])
+        if inspect.isawaitable(res):
+            res = run_coroutine_sync(res)
+
+        return self._merge_batch_result(inputs, res)
+
+    def _prepare_input(self, input: Mapping) -> Mapping:
+        """
+        Map the resolved input variables to the keyword arguments of the tool function.
+        """
         if self.input.input_variables:
-            input = {k.rsplit(".")[-1]: v for k, v in kwargs.items()}
-        else:
-            input = kwargs
+            return {k.rsplit(".")[-1]: v for k, v in input.items()}
+
+        return input
 
-        res = self.fn(**input)
+    def _merge_result(self, input: Mapping, res: Any) -> OverlayDict:
+        """
+        Overlay the result of the tool function on its input. Nothing is copied, the returned
+        mapping only records the keys produced by the tool.
+        """
         if not res:
-            return {**kwargs}
+            return OverlayDict.overlay({}, input)
 
         if isinstance(res, dict):
-            return {**kwargs, **res}
+            return OverlayDict.overlay(res, input)
 
         raise ValueError(
             f"ChainFactoryTool.fn must return a dict or None. Got {type(res)}."
         )
 
+    def _merge_batch_result(self, inputs: list[Mapping], res: Any) -> list[Mapping]:
+        """
+        Merge the results of a batch tool function into their respective inputs.
+        """
+        if not isinstance(res, list) or len(res) != len(inputs):
+            raise ValueError(
+                f"Batch tool {self._name} must return a list with one result per input ({len(inputs)} expected)."
+            )
+
+        return [self._merge_result(input, r) for input, r in zip(inputs, res)]
+
     @classmethod
     def from_file(cls):
         """
@@ -114,6 +208,11 @@ class ChainFactoryLink(BaseChainFactoryLink):
         output: Optional[FactoryOutput] = None,
         prompt: Optional[FactoryPrompt] = None,
         mask: Optional[FactoryMask] = None,
+        reduce: Optional[FactoryReduce] = None,
+        dedup: Optional[FactoryDedup] = None,
+        model: str | ModelProfile | None = None,
+        cascade: Optional[FactoryCascade] = None,
+        max_tokens: Optional[int] = None,
         link_type: Literal["sequential", "parallel"] = "sequential",
     ):
         self._name = name
@@ -125,6 +224,21 @@ class ChainFactoryLink(BaseChainFactoryLink):
         self.mask: Optional[FactoryMask] = (
             mask  # section `mask` (only for convex chainlinks)
         )
+        self.reduce: Optional[FactoryReduce] = (
+            reduce  # section `reduce` (only for convex chainlinks)
+        )
+        self.dedup: Optional[FactoryDedup] = (
+            dedup  # section `dedup` (only for parallel chainlinks)
+        )
+        self.model: str | ModelProfile | None = (
+            model  # section `model`, a model profile name or an inline profile
+        )
+        self.cascade: Optional[FactoryCascade] = (
+            cascade  # section `cascade`, a stronger model for the outputs matching a predicate
+        )
+        self.max_tokens: Optional[int] = (
+            max_tokens  # section `max_tokens`, the output token budget of the link
+        )
         self.output: Optional[FactoryOutput] = output  # section `out`
         self._link_type = link_type
 
@@ -155,6 +269,11 @@ class ChainFactoryLink(BaseChainFactoryLink):
         defs = source.get("def")
         output = source.get("out")
         mask = source.get("mask")
+        reduce = source.get("reduce")
+        dedup = source.get("dedup")
+        model = source.get("model")
+        cascade = source.get("cascade")
+        max_tokens = source.get("max_tokens")
 
         if isinstance(prompt, str):
             prompt = {
@@ -188,8 +307,10 @@ class ChainFactoryLink(BaseChainFactoryLink):
             )
             cached: dict[str, str] | None = load_cache_file(cachekey)
             if cached:
-                print(
-                    f"[{name}] Loading prompt template from cache for given purpose (hash: {cachekey}).",
+                logger.debug(
+                    "[%s] Loading prompt template from cache for given purpose (hash: %s).",
+                    name,
+                    cachekey,
                 )
 
                 factory_prompt = FactoryPrompt(
@@ -205,11 +326,11 @@ class ChainFactoryLink(BaseChainFactoryLink):
                     "chainfactory.chains", "generate_prompt_template.fctr"
                 ) as file:
                     file_content = file.read()
-                    print(
-                        f"[{name}]",
-                        "Generating Prompt Template: ",
+                    logger.info(
+                        "[%s] Generating Prompt Template: %s (%s)",
+                        name,
                         purpose,
-                        f"({cachekey})",
+                        cachekey,
                     )
                     engine = internal_engine_cls.from_str(
                         file_content,
@@ -304,8 +425,10 @@ class ChainFactoryLink(BaseChainFactoryLink):
                     ) as file:
                         file_content = file.read()
 
-                        print(
-                            f"[{name}]", "Generating new mask template for:", variables
+                        logger.info(
+                            "[%s] Generating new mask template for: %s",
+                            name,
+                            variables,
                         )
 
                         engine = internal_engine_cls.from_str(
@@ -345,6 +468,74 @@ class ChainFactoryLink(BaseChainFactoryLink):
 
             factory_mask = None
 
+        if reduce is None:
+            factory_reduce = None
+        elif not convex:
+            raise ValueError(
+                f"The reduce section is only supported for convex (parallel to sequential) chainlinks. Chainlink {name} is not convex."
+            )
+        elif isinstance(reduce, str):
+            factory_reduce = FactoryReduce(type=reduce)  # type: ignore
+        elif isinstance(reduce, dict):
+            factory_reduce = FactoryReduce(
+                type=reduce.get("type", "tree"),
+                chunk_tokens=reduce.get("chunk_tokens"),
+            )
+        else:
+            raise ValueError(
+                f"Invalid reduce section in chainlink {name}. Must be a reduce type or a mapping."
+            )
+
+        if dedup is None or dedup is False:
+            factory_dedup = None
+        elif link_type != "parallel":
+            raise ValueError(
+                f"The dedup section is only supported for parallel chainlinks. Chainlink {name} is not parallel."
+            )
+        elif dedup is True:
+            factory_dedup = FactoryDedup()
+        elif isinstance(dedup, dict):
+            factory_dedup = FactoryDedup(
+                fields=dedup.get("fields"),
+                normalize=dedup.get("normalize"),
+                cache_size=dedup.get("cache_size"),
+            )
+        else:
+            raise ValueError(
+                f"Invalid dedup section in chainlink {name}. Must be true or a mapping."
+            )
+
+        link_model = None if model is None else cls._parse_model(name, model)
+
+        if max_tokens is not None and (
+            not isinstance(max_tokens, int)
+            or isinstance(max_tokens, bool)
+            or max_tokens < 1
+        ):
+            raise ValueError(
+                f"Invalid max_tokens section in chainlink {name}. Must be a number greater than 0."
+            )
+
+        if cascade is None:
+            factory_cascade = None
+        elif not isinstance(cascade, dict) or not cascade.get("model"):
+            raise ValueError(
+                f"Invalid cascade section in chainlink {name}. Must be a mapping with a model and a when predicate."
+            )
+        else:
+            factory_cascade = FactoryCascade(
+                when=cascade.get("when"),  # type: ignore
+                model=cls._parse_model(name, cascade["model"], section="cascade.model"),
+            )
+
+            unknown = factory_cascade.when.names - set(
+                factory_output._type.model_fields
+            )
+            if unknown:
+                raise ValueError(
+                    f"Invalid cascade predicate in chainlink {name}. {', '.join(sorted(unknown))} not found in the output."
+                )
+
         return cls(
             name=name,
             source=source,
@@ -353,9 +544,36 @@ class ChainFactoryLink(BaseChainFactoryLink):
             output=factory_output,
             definitions=factory_defs,
             mask=factory_mask,
+            reduce=factory_reduce,
+            dedup=factory_dedup,
+            model=link_model,
+            cascade=factory_cascade,
+            max_tokens=max_tokens,
             link_type=link_type,
         )
 
+    @staticmethod
+    def _parse_model(
+        name: str, model: Any, section: str = "model"
+    ) -> str | ModelProfile:
+        """
+        Parse a model section: the name of a model profile or an inline profile.
+        """
+        if isinstance(model, str):
+            return model
+
+        if isinstance(model, dict):
+            try:
+                return ModelProfile(**model)
+            except TypeError as e:
+                raise ValueError(
+                    f"Invalid {section} section in chainlink {name}. Allowed keys are provider, model, temperature, model_kwargs and max_tokens."
+                ) from e
+
+        raise ValueError(
+            f"Invalid {section} section in chainlink {name}. Must be a model profile name or a mapping."
+        )
+
     def execute(self, data: dict) -> dict:
         return super().execute(data)
 
@@ -371,6 +589,10 @@ def chainfactorylink_or_tool(
     internal_engine_config: Any | None = None,
     is_tool: bool = False,
     tools: dict[str, Callable[..., dict]] | None = None,
+    tool_target: ToolTargetTokens | None = None,
+    tool_targets: dict[str, ToolTargetTokens] | None = None,
+    batch_tools: set[str] | None = None,
+    source: dict | None = None,
     **kwargs,
 ) -> ChainFactoryLink | ChainFactoryTool:
     """
@@ -382,13 +604,15 @@ def chainfactorylink_or_tool(
     Returns:
         ChainFactoryLink: The parsed `ChainFactoryLink` object.
     """
-    source = {}
-    if file_content:
-        source = yaml.safe_load(file_content)
+    if source is not None:
+        pass
+    elif file_content:
+        source = load_yaml(file_content)
     elif file_path:
-        source = yaml.safe_load(open(file_path, "r"))
+        with open(file_path, "r") as file:
+            source = load_yaml(file.read())
     else:
-        pass
+        source = {}
 
     if not source and not is_tool:
         raise ValueError("Either file_path or file_object must be provided.")
@@ -406,6 +630,8 @@ def chainfactorylink_or_tool(
             link_type=link_type,
             fn=fn,
             source=source,
+            target=tool_target or (tool_targets or {}).get(name, "thread"),
+            batch=name in (batch_tools or set()),
         )
 
     return ChainFactoryLink.from_file(
@@ -432,6 +658,7 @@ class ChainFactory:
     internal_engine_cls: Any = None
     internal_engine_config: Any = None
     source: dict | None = None
+    path: str | None = None
 
     @classmethod
     def from_file(
@@ -450,16 +677,48 @@ class ChainFactory:
 
         Returns:
             Factory: The parsed `ChainFactory` object.
+
+        Parsed factories are cached per process (see `factory_cache.py`) unless
+        `config.cache_factories` is disabled. A cached factory is reused as long as
+        neither the file nor any of the files it extends changed.
         """
-        with open(file_path, "r") as file:
+        path = os.path.realpath(file_path)
+        use_cache = config is None or config.cache_factories
+        fingerprint = config_fingerprint(
+            config, internal_engine_cls, internal_engine_config
+        )
+        callables = config_callables(
+            config, internal_engine_cls, internal_engine_config
+        )
+
+        if use_cache:
+            cached = get_cached_factory(path, fingerprint, callables)
+            if cached is not None:
+                return cached
+
+        mtime_ns = os.stat(path).st_mtime_ns
+        with open(path, "r") as file:
             content = file.read()
 
-        return cls.from_str(
+        factory = cls.from_str(
             content,
             config=config,
             internal_engine_cls=internal_engine_cls,
             internal_engine_config=internal_engine_config,
         )
+        factory.path = path
+
+        if use_cache:
+            cache_factory(
+                path,
+                fingerprint,
+                factory,
+                mtime_ns,
+                content_hash(content),
+                callables,
+            )
+
+        return factory
 
     @classmethod
     def from_str(
@@ -483,11 +742,6 @@ class ChainFactory:
         Returns:
             Factory: The parsed `ChainFactory` object.
         """
-        lines = content.splitlines()
-        parts = {}
-        current_part = None
-        base_chain_path = None
-
         if "@chainlink" not in content:
             return cls(
                 links=[
@@ -502,120 +756,83 @@ class ChainFactory:
                 ]
             )
 
-        for i, line in enumerate(lines):
-            if not line:
-                continue
-
-            if line.startswith("#"):
-                continue
-
-            chainlink_directive = line.strip().startswith("@chainlink")
-            extends_directive = line.strip().startswith("@extends")
-            tool_directive = line.strip().startswith("@tool")
-
-            if extends_directive:
-                if base_chain_path:
-                    raise ValueError(
-                        f"Error on line {i}. @extends directive can only be used once."
-                    )
-
-                extends_parts = [part.strip() for part in line.strip().split(" ")]
-                if len(extends_parts) != 2:
-                    raise ValueError(
-                        f"Error on line {i}. Invalid @extends directive. Must be of the form `@extends [path]`."
-                    )
-
-                base_chain_path = extends_parts[1]
-                continue
-
-            is_directive = tool_directive or chainlink_directive or extends_directive
-            type_str = None
-            if is_directive:
-                if tool_directive:
-                    type_str = "@tool"
-                elif chainlink_directive:
-                    type_str = "@chainlink"
-                elif extends_directive:
-                    type_str = "@extends"
-
-            if not is_directive and current_part:
-                parts[current_part]["lines"].append(line)
-                continue
-
-            if line.startswith("  "):
-                line = line.replace("  ", "\t")
-
-            tokens = [token for token in line.strip().split(" ")]
+        document = parse_fctr(content)
+        base_chain_path = document.extends
 
-            if len(tokens) > 3:
-                raise ValueError(
-                    f"Error on line {i}. Invalid {type_str} definition. Must be of the form `{type_str} <name> <link_type>`."
-                )
-            elif len(tokens) == 3:
-                name = tokens[1]
-                link_type = tokens[2]
-
-                if link_type not in ["sequential", "parallel", "--", "||"]:
-                    raise ValueError(
-                        f"Error on line {i}. Invalid {type_str} definition. Must be of the form `{type_str} [name] [link_type: 'sequential' | '--' | 'parallel' | '||']."
-                    )
-
-                if name in parts and not parts[name].get("is_tool"):
-                    raise ValueError(
-                        f"Error on line {i}. Invalid {type_str} definition. Another chainlink with the same name exists."
-                    )
-            elif len(tokens) == 2:
-                unknown_token = tokens[1]
-                if unknown_token in ["sequential", "parallel", "--", "||"]:
-                    # assign random name
-                    name = "chainlink-" + str(uuid.uuid4().hex)
-                    link_type = unknown_token
-                else:
-                    name = tokens[1]
-                    link_type = "sequential"
-            else:
-                name = "chainlink-" + str(uuid.uuid4().hex)
-                link_type = "sequential"
-
-            if link_type == "--":
-                link_type = "sequential"
-            elif link_type == "||":
-                link_type = "parallel"
-
-            current_part = name
-            parts[name] = {
-                "beginning_line": i,
-                "link_type": link_type,
-                "is_tool": tool_directive,
-                "lines": [],
-            }
+        base_chain = None
+        if base_chain_path:
+            base_chain = cls.from_file(
+                base_chain_path,
+                config=config,
+                internal_engine_cls=internal_engine_cls,
+                internal_engine_config=internal_engine_config,
+            )
 
         chainlinks = []
         previous_link = None
+        # the links of the base chain run first, so they can be needed too
+        links_by_name = (
+            {link._name: link for link in base_chain.links} if base_chain else {}
+        )
         global_defs = FactoryDefinitions()
-        for name, part in parts.items():
-            if not part["lines"] and not part.get("is_tool"):
+        for name, section in document.sections.items():
+            if not section.lines and not section.is_tool:
                 raise ValueError(
-                    f"Error on line {part['beginning_line']}. Chainlink definition cannot be empty. Empty direcives are only allowed for tools."
+                    f"Error on line {section.line}. Chainlink definition cannot be empty. Empty direcives are only allowed for tools."
                 )
 
+            needs = cls._parse_needs(
+                section.source.get("needs"), section.line, links_by_name
+            )
+
+            # the upstream link feeds this link, by default it's the preceding link
+            upstream_link = previous_link
+            if needs is not None:
+                upstream_link = links_by_name.get(needs[-1])
+
             convex = (
-                previous_link
-                and previous_link._link_type == "parallel"
-                and part["link_type"] == "sequential"
+                upstream_link
+                and upstream_link._link_type == "parallel"
+                and section.link_type == "sequential"
             )
 
-            link = chainfactorylink_or_tool(
-                name=name,
-                file_content="\n".join(part["lines"]).replace("\t", "  "),
-                link_type=part["link_type"],
-                convex=bool(convex),
-                global_defs=global_defs,
-                internal_engine_cls=internal_engine_cls,
-                internal_engine_config=internal_engine_config,
-                is_tool=part.get("is_tool", False),
-                tools={} if not config else config.tools,
+            try:
+                link = chainfactorylink_or_tool(
+                    name=name,
+                    source=section.source,
+                    link_type=section.link_type,
+                    convex=bool(convex),
+                    global_defs=global_defs,
+                    internal_engine_cls=internal_engine_cls,
+                    internal_engine_config=internal_engine_config,
+                    is_tool=section.is_tool,
+                    tools={} if not config else config.tools,
+                    tool_target=section.target,
+                    tool_targets={} if not config else config.tool_targets,
+                    batch_tools=set() if not config else config.batch_tools,
+                )
+            except ValueError as e:
+                if str(e).startswith("Error on line"):
+                    raise
+
+                line = cls._error_line(e, section)
+                raise ValueError(
+                    f"Error on line {line}. Invalid @{section.kind} {name}: {str(e)}"
+                ) from e
+
+            link._needs = needs
+            link._when = cls._parse_predicate(
+                section.source.get("when"), section.line, "when"
             )
+            link._filter = cls._parse_predicate(
+                section.source.get("filter"), section.line, "filter"
+            )
+            links_by_name[name] = link
+
+            if link._filter and link._link_type != "parallel":
+                raise ValueError(
+                    f"Error on line {section.line}. The filter section is only supported for parallel links. {name} is not parallel."
+                )
 
             if isinstance(link, ChainFactoryTool):
                 previous_link = link
@@ -623,9 +840,9 @@ class ChainFactory:
                 continue
 
             if (
-                previous_link
-                and previous_link._link_type == "parallel"
-                and not previous_link._is_tool
+                upstream_link
+                and upstream_link._link_type == "parallel"
+                and not upstream_link._is_tool
             ):
                 assert link.prompt
                 assert link.prompt.input_variables
@@ -635,13 +852,13 @@ class ChainFactory:
                     case "parallel":
                         updated_input_variables = []
                         for var in link.prompt.input_variables:
-                            if var.startswith(previous_link._name):
+                            if var.startswith(upstream_link._name):
                                 continue
 
                             if var.startswith("element"):
-                                full_var = f"{previous_link._name}${var}"
+                                full_var = f"{upstream_link._name}${var}"
                             else:
-                                full_var = f"{previous_link._name}$element${var}"
+                                full_var = f"{upstream_link._name}$element${var}"
 
                             updated_input_variables.append(full_var)
                             link.prompt.template = link.prompt.template.replace(
@@ -664,13 +881,7 @@ class ChainFactory:
             if link.definitions:
                 global_defs.extend(link.definitions)
 
-        base_chain = None
-        if base_chain_path:
-            base_chain = cls.from_file(
-                base_chain_path,
-                internal_engine_cls=internal_engine_cls,
-                internal_engine_config=internal_engine_config,
-            )
+        if base_chain:
             chainlinks = base_chain.links + chainlinks
             global_defs.extend(base_chain.definitions)
 
@@ -683,3 +894,83 @@ class ChainFactory:
             internal_engine_cls=internal_engine_cls,
             internal_engine_config=internal_engine_config,
         )
+
+    @staticmethod
+    def _error_line(error: BaseException, section: FctrSection) -> int:
+        """
+        The line of the section an error points at. Type expression errors are mapped to the
+        line of their expression, else it's the line of the section header.
+        """
+        while error is not None and not isinstance(error, TypeExpressionError):
+            error = error.__cause__ or error.__context__
+
+        if error is None:
+            return section.line
+
+        if error.line is None:
+            error.line = next(
+                (
+                    lineno
+                    for lineno, text in section.lines
+                    if error.expression.strip() in text
+                ),
+                section.line,
+            )
+
+        return error.line
+
+    @staticmethod
+    def _parse_predicate(predicate: Any, line: int, section: str) -> Predicate | None:
+        """
+        Parse the `when` or `filter` section of a chainlink or tool. Booleans are accepted as
+        constant predicates.
+        """
+        if predicate is None:
+            return None
+
+        if isinstance(predicate, bool):
+            predicate = str(predicate)
+
+        try:
+            return Predicate(predicate)
+        except ValueError as e:
+            raise ValueError(
+                f"Error on line {line}. Invalid {section} section. {str(e)}"
+            ) from e
+
+    @staticmethod
+    def _parse_needs(
+        needs: Any,
+        line: int,
+        links: dict[str, ChainFactoryTool | ChainFactoryLink],
+    ) -> list[str] | None:
+        """
+        Validate the `needs` section of a chainlink or tool. A link can only depend on the chain
+        input (`input`) or on links defined above it, the links of the chain it extends included,
+        so the resulting graph is always acyclic.
+        """
+        if needs is None:
+            return None
+
+        if isinstance(needs, str):
+            needs = [needs]
+
+        if not isinstance(needs, list) or not needs:
+            raise ValueError(
+                f"Error on line {line}. Invalid needs section. Must be a link name or a list of link names."
+            )
+
+        for need in needs:
+            if need != "input" and need not in links:
+                raise ValueError(
+                    f"Error on line {line}. Invalid needs section. {need} must be 'input' or a chainlink / tool defined above."
+                )
+
+        if len(needs) > 1 and any(
+            need != "input" and links[need]._link_type == "parallel" for need in needs
+        ):
+            raise ValueError(
+                f"Error on line {line}. Invalid needs section. Outputs of parallel links cannot be joined with other outputs."
+            )
+
+        return needs
@@ -0,0 +1,195 @@
+"""
+This module holds the process-level cache of parsed `ChainFactory` objects. Entries are keyed by the
+resolved path of the `.fctr` file and a fingerprint of the config it was parsed with, and record
+the modification time and content hash of the file and of every file it `@extends`.
+"""
+
+import os
+import threading
+import weakref
+from dataclasses import dataclass, field
+from typing import Any, Callable
+
+import farmhash
+
+
+@dataclass
+class FactoryCacheEntry:
+    factory: Any
+    files: list[list[Any]]  # [path, mtime_ns, content hash] of the file and its bases
+    callables: list[Callable[[], Any]] = field(
+        default_factory=list
+    )  # (weak) references
+
+
+_factory_cache: dict[tuple[str, str], FactoryCacheEntry] = {}
+_factory_cache_lock = threading.Lock()
+
+
+def content_hash(content: str) -> str:
+    """
+    Hash the content of a .fctr file.
+    """
+    return str(farmhash.FarmHash64(content))
+
+
+def _qualified_name(obj: Any) -> str:
+    name = getattr(obj, "__qualname__", None) or type(obj).__qualname__
+    return f"{getattr(obj, '__module__', None)}.{name}"
+
+
+def _reference(obj: Any) -> Callable[[], Any]:
+    try:
+        return weakref.ref(obj)
+    except TypeError:  # e.g. bound methods or callable instances without __weakref__
+        return lambda: obj
+
+
+def config_callables(
+    config: Any | None,
+    internal_engine_cls: Any | None,
+    internal_engine_config: Any | None,
+) -> list[Any]:
+    """
+    The tool functions and the engine class the factory is parsed with, in fingerprint order.
+    """
+    callables = []
+    for cfg in [config, internal_engine_config]:
+        if cfg is not None:
+            callables.extend(fn for _, fn in sorted(cfg.tools.items()))
+
+    if internal_engine_cls:
+        callables.append(internal_engine_cls)
+
+    return callables
+
+
+def config_fingerprint(
+    config: Any | None,
+    internal_engine_cls: Any | None,
+    internal_engine_config: Any | None,
+) -> str:
+    """
+    Fingerprint the parts of the configs that affect parsing: the registered tools, how they
+    are dispatched, and the engine used to generate the prompt and mask templates.
+    """
+    parts = []
+    for cfg in [config, internal_engine_config]:
+        if cfg is None:
+            parts.append(None)
+            continue
+
+        parts.append(
+            (
+                cfg.provider,
+                cfg.model,
+                cfg.temperature,
+                sorted((name, _qualified_name(fn)) for name, fn in cfg.tools.items()),
+                sorted(cfg.tool_targets.items()),
+                sorted(cfg.batch_tools),
+            )
+        )
+
+    parts.append(_qualified_name(internal_engine_cls) if internal_engine_cls else None)
+    return str(farmhash.FarmHash64(repr(parts)))
+
+
+def _is_fresh(entry: FactoryCacheEntry) -> bool:
+    """
+    Check that none of the files of an entry changed. A file whose mtime changed but whose
+    content did not (e.g. after a `touch`) is still fresh.
+    """
+    for file in entry.files:
+        path, mtime_ns, digest = file
+
+        try:
+            current_mtime_ns = os.stat(path).st_mtime_ns
+        except OSError:
+            return False
+
+        if current_mtime_ns == mtime_ns:
+            continue
+
+        with open(path, "r") as f:
+            if content_hash(f.read()) != digest:
+                return False
+
+        file[1] = current_mtime_ns
+
+    return True
+
+
+def get_cached_factory(
+    path: str, fingerprint: str, callables: list[Any] | None = None
+) -> Any | None:
+    """
+    Return the cached factory for a resolved path and config fingerprint, if it's still fresh.
+    The fingerprint only names the tool functions and the engine class, so the factory is only
+    reused if it was parsed with the very same `callables`.
+    """
+    callables = callables or []
+
+    with _factory_cache_lock:
+        entry = _factory_cache.get((path, fingerprint))
+
+        if entry is None:
+            return None
+
+        if len(entry.callables) != len(callables) or any(
+            ref() is not obj for ref, obj in zip(entry.callables, callables)
+        ):
+            return None
+
+        if not _is_fresh(entry):
+            del _factory_cache[(path, fingerprint)]
+            return None
+
+        return entry.factory
+
+
+def cache_factory(
+    path: str,
+    fingerprint: str,
+    factory: Any,
+    mtime_ns: int,
+    digest: str,
+    callables: list[Any] | None = None,
+) -> None:
+    """
+    Cache a parsed factory along with the state of its file and the files of its base chains.
+    """
+    files = [[path, mtime_ns, digest]]
+
+    with _factory_cache_lock:
+        base_chain = factory.base_chain
+        while base_chain is not None and base_chain.path:
+            base_entry = _factory_cache.get((base_chain.path, fingerprint))
+            if base_entry is not None and base_entry.factory is base_chain:
+                files.extend([list(file) for file in base_entry.files])
+                break
+
+            # the base is not cached (anymore), record the current state of its file
+            try:
+                base_mtime_ns = os.stat(base_chain.path).st_mtime_ns
+                with open(base_chain.path, "r") as f:
+                    files.append(
+                        [base_chain.path, base_mtime_ns, content_hash(f.read())]
+                    )
+            except OSError:
+                return
+
+            base_chain = base_chain.base_chain
+
+        _factory_cache[(path, fingerprint)] = FactoryCacheEntry(
+            factory=factory,
+            files=files,
+            callables=[_reference(obj) for obj in callables or []],
+        )
+
+
+def clear_factory_cache() -> None:
+    """
+    Drop all the cached factories.
+    """
+    with _factory_cache_lock:
+        _factory_cache.clear()
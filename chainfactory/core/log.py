@@ -0,0 +1,90 @@
+"""
+This module sets up the `chainfactory` loggers. Nothing is printed unless a handler is configured,
+either by the application or with `enable_console_logging`, which the engine calls when the
+`console_logging` config is set, or `print_trace` with the development profile. Expensive log arguments are wrapped in `lazy` so they are only computed
+when a record is actually emitted.
+"""
+
+import logging
+import threading
+from typing import Any, Callable
+
+logger = logging.getLogger("chainfactory")
+logger.addHandler(logging.NullHandler())
+
+_console_handler: logging.Handler | None = None
+_console_lock = threading.Lock()
+
+
+def get_logger(name: str) -> logging.Logger:
+    """
+    Get the logger of a chainfactory module, e.g. `chainfactory.engine`.
+    """
+    return logger.getChild(name)
+
+
+class lazy:
+    """
+    Defers computing a log argument until the record is formatted, e.g.
+    `logger.info("Output: %s", lazy(lambda: pformat(output)))`.
+    """
+
+    __slots__ = ("fn",)
+
+    def __init__(self, fn: Callable[[], Any]):
+        self.fn = fn
+
+    def __str__(self) -> str:
+        return str(self.fn())
+
+
+def init_colors() -> None:
+    """
+    Initialize colorama, only when colored console output is actually used.
+    """
+    from colorama import init
+
+    init(autoreset=True)
+
+
+class ColorFormatter(logging.Formatter):
+    """
+    Colors the console records by level.
+    """
+
+    def format(self, record: logging.LogRecord) -> str:
+        from colorama import Fore, Style
+
+        color = {
+            logging.DEBUG: Fore.WHITE,
+            logging.INFO: Fore.CYAN,
+            logging.WARNING: Fore.YELLOW,
+        }.get(record.levelno, Fore.RED)
+
+        return color + super().format(record) + Style.RESET_ALL
+
+
+def enable_console_logging(level: int = logging.INFO) -> None:
+    """
+    Print the chainfactory logs to stderr with colors, unless the application already
+    configured logging (a handler on the root or the chainfactory logger).
+    """
+    global _console_handler
+
+    with _console_lock:
+        if _console_handler is not None:
+            return
+
+        configured = logging.getLogger().handlers or any(
+            not isinstance(handler, logging.NullHandler) for handler in logger.handlers
+        )
+        if configured:
+            return
+
+        init_colors()
+        _console_handler = logging.StreamHandler()
+        _console_handler.setFormatter(ColorFormatter("%(message)s"))
+        logger.addHandler(_console_handler)
+
+        if logger.level == logging.NOTSET or logger.level > level:
+            logger.setLevel(level)
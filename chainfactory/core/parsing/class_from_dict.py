@@ -1,4 +1,24 @@
-from typing import Any, Literal, Optional
+import re
+import json
+import threading
+
+from chainfactory.core.utils import LRUCache
+
+from .type_expression import TypeResolver, parse_attribute
+
+CLASS_CACHE_SIZE = (
+    1024  # generated classes kept for reuse, least recently used first out
+)
+
+_class_cache = LRUCache(CLASS_CACHE_SIZE)
+_class_cache_lock = threading.Lock()
+
+
+def clear_class_cache() -> None:
+    """
+    Drop the memoised classes, e.g. after unloading chains in a long-lived process.
+    """
+    _class_cache.clear()
 
 
 def create_class_from_dict(
@@ -7,75 +27,95 @@ def create_class_from_dict(
     base_class=object,
     defined_types: dict[str, type] | None = None,
     default_value_class: type | None = None,
+    forward_refs: set[str] | None = None,
 ):
     """
-    Dynamically create a class from a dictionary of attributes and their types.
+    Dynamically create a class from a dictionary of attributes and their types. Classes are memoised,
+    identical attributes referencing the same defined types resolve to the same class.
 
     Args:
         class_name (str): The name of the class to be created.
         attributes (dict): A dictionary of attributes and their strings for their types.
         base_class (type): The base class for the dynamically created class. Defaults to object.
         defined_types (dict): A dictionary of attribute types that are predefined. Defaults to {}.
+        forward_refs (set): Names of types that are defined later and may be referenced before. Defaults to None.
 
     Returns:
         type: The dynamically created class.
     """
-    local_types = {
-        "Any": Any,
-        "Literal": Literal,
-        "Optional": Optional,
-        "list": list,
-        "dict": dict,
-    }
-    class_dict = {"__annotations__": {}}
+    key = _class_cache_key(
+        class_name, attributes, base_class, defined_types, default_value_class
+    )
 
-    if not defined_types:
-        defined_types = {}
+    with _class_cache_lock:
+        cached = _class_cache.get(key)
+        if cached is not None:
+            return cached
 
-    description = None
-    default_value = None
+        resolver = TypeResolver(defined_types, forward_refs)
+        created = _create_class_from_dict(
+            class_name=class_name,
+            attributes=attributes,
+            base_class=base_class,
+            defined_types=defined_types,
+            default_value_class=default_value_class,
+            resolver=resolver,
+        )
 
-    for attr, attr_type in attributes.items():
-        if "%" in attr_type:
-            parts = [part.strip() for part in attr_type.split("%")]
-            if len(parts) > 2:
-                raise ValueError(
-                    "Invalid attribute definition % can only be used once."
-                )
-            attr_type = parts[0]
-            description = parts[1]
+        # forward references are resolved later against the defining file, so not shareable
+        if not resolver.uses_forward_refs:
+            _class_cache.put(key, created)
 
-            if "=" in description:
-                parts = [part.strip() for part in description.split("=")]
-                description = parts[0]
-                default_value = parts[1]
+        return created
 
-        if "=" in attr_type:
-            parts = [part.strip() for part in attr_type.split("=")]
 
-            if len(parts) > 2:
-                raise ValueError(
-                    "Invalid attribute definition = can only be used once."
-                )
+def _class_cache_key(
+    class_name: str,
+    attributes: dict,
+    base_class: type,
+    defined_types: dict[str, type] | None,
+    default_value_class: type | None,
+) -> tuple:
+    """
+    Build the canonical cache key of a class: its name, its attributes in declaration order,
+    and the defined types its attributes reference.
+    """
+    canonical = json.dumps(attributes, default=str)
+    referenced = tuple(
+        sorted(
+            (name, defined_types[name])
+            for name in set(re.findall(r"\w+", canonical))
+            if defined_types and name in defined_types
+        )
+    )
+
+    return (class_name, canonical, base_class, default_value_class, referenced)
+
+
+def _create_class_from_dict(
+    class_name: str,
+    attributes: dict,
+    base_class=object,
+    defined_types: dict[str, type] | None = None,
+    default_value_class: type | None = None,
+    resolver: TypeResolver | None = None,
+):
+    """
+    Create the class without consulting the cache. See `create_class_from_dict`.
+    """
+    class_dict = {"__annotations__": {}}
+
+    if not resolver:
+        resolver = TypeResolver(defined_types)
 
-            attr_type = parts[0]
-            default_value = parts[1]
-
-        if attr_type.endswith("?"):
-            actual_type_str = attr_type[:-1]
-            actual_type = defined_types.get(actual_type_str)
-            if actual_type is None:
-                actual_type = Optional[eval(actual_type_str, local_types)]
-        elif attr_type.startswith("list[") and attr_type.endswith("]"):
-            element_type_str = attr_type[5:-1]
-            element_type = defined_types.get(element_type_str)
-            if element_type is None:
-                element_type = eval(element_type_str, local_types)
-            actual_type = list[element_type]
-        else:
-            actual_type = defined_types.get(attr_type)
-            if actual_type is None:
-                actual_type = eval(attr_type, local_types)
+    for attr, attr_spec in attributes.items():
+        try:
+            attr_type, default_value, description = parse_attribute(str(attr_spec))
+            actual_type = resolver.resolve(attr_type)
+        except ValueError as e:
+            raise ValueError(
+                f"Invalid definition of {class_name}.{attr}: {str(e)}"
+            ) from e
 
         class_dict["__annotations__"][attr] = actual_type
 
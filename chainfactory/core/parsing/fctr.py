@@ -0,0 +1,192 @@
+"""
+This module parses the `.fctr` format in a single pass. The directives (`@extends`, `@chainlink`,
+`@tool`) are tokenised line by line and the bodies of all the sections are loaded with a single
+YAML load, using the libyaml based loader when it is available.
+"""
+
+import uuid
+from dataclasses import dataclass, field
+from typing import Any, Literal
+
+import yaml
+
+from chainfactory.core.types import ToolTargetTokens
+
+YamlLoader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+
+LINK_TYPE_TOKENS = {
+    "sequential": "sequential",
+    "--": "sequential",
+    "parallel": "parallel",
+    "||": "parallel",
+}
+
+
+@dataclass
+class FctrSection:
+    """
+    A `@chainlink` or `@tool` section. Line numbers are 1-based.
+    """
+
+    kind: Literal["chainlink", "tool"]
+    name: str
+    link_type: Literal["sequential", "parallel"]
+    line: int
+    target: ToolTargetTokens | None = None
+    lines: list[tuple[int, str]] = field(default_factory=list)
+    source: dict = field(default_factory=dict)
+
+    @property
+    def is_tool(self) -> bool:
+        return self.kind == "tool"
+
+
+@dataclass
+class FctrDocument:
+    """
+    The syntax tree of a `.fctr` file.
+    """
+
+    sections: dict[str, FctrSection]
+    extends: str | None = None
+    extends_line: int | None = None
+
+
+def load_yaml(content: str) -> Any:
+    """
+    Load a YAML document with the fastest available safe loader.
+    """
+    return yaml.load(content, Loader=YamlLoader)
+
+
+def _parse_directive(line: str, i: int, sections: dict[str, FctrSection]) -> FctrSection:
+    """
+    Parse a `@chainlink` or `@tool` directive line of the form `@chainlink [name] [link_type]`
+    or `@tool [name] [link_type] [target]`.
+    """
+    tokens = [token for token in line.strip().split(" ") if token]
+    kind = "tool" if tokens[0] == "@tool" else "chainlink"
+    type_str = tokens[0]
+    target = None
+
+    if kind == "tool" and len(tokens) == 4:
+        target = tokens.pop()
+
+        if target not in ["thread", "process"]:
+            raise ValueError(
+                f"Error on line {i}. Invalid @tool definition. Must be of the form `@tool [name] [link_type] [target: 'thread' | 'process']`."
+            )
+
+    if len(tokens) > 3:
+        raise ValueError(
+            f"Error on line {i}. Invalid {type_str} definition. Must be of the form `{type_str} <name> <link_type>`."
+        )
+    elif len(tokens) == 3:
+        name = tokens[1]
+        link_type = tokens[2]
+
+        if link_type not in LINK_TYPE_TOKENS:
+            raise ValueError(
+                f"Error on line {i}. Invalid {type_str} definition. Must be of the form `{type_str} [name] [link_type: 'sequential' | '--' | 'parallel' | '||']."
+            )
+
+        if name in sections and not sections[name].is_tool:
+            raise ValueError(
+                f"Error on line {i}. Invalid {type_str} definition. Another chainlink with the same name exists."
+            )
+    elif len(tokens) == 2:
+        if tokens[1] in LINK_TYPE_TOKENS:
+            name = "chainlink-" + str(uuid.uuid4().hex)  # assign random name
+            link_type = tokens[1]
+        else:
+            name = tokens[1]
+            link_type = "sequential"
+    else:
+        name = "chainlink-" + str(uuid.uuid4().hex)
+        link_type = "sequential"
+
+    return FctrSection(
+        kind=kind,
+        name=name,
+        link_type=LINK_TYPE_TOKENS[link_type],  # type: ignore
+        line=i,
+        target=target,  # type: ignore
+    )
+
+
+def parse_fctr(content: str) -> FctrDocument:
+    """
+    Parse the content of a `.fctr` file into an `FctrDocument`.
+    """
+    document = FctrDocument(sections={})
+    current = None
+
+    for i, line in enumerate(content.splitlines(), start=1):
+        if line.startswith("#"):
+            continue
+
+        stripped = line.strip()
+        if stripped.startswith("@extends"):
+            if document.extends:
+                raise ValueError(
+                    f"Error on line {i}. @extends directive can only be used once."
+                )
+
+            extends_parts = [part.strip() for part in stripped.split(" ")]
+            if len(extends_parts) != 2:
+                raise ValueError(
+                    f"Error on line {i}. Invalid @extends directive. Must be of the form `@extends [path]`."
+                )
+
+            document.extends = extends_parts[1]
+            document.extends_line = i
+            continue
+
+        if stripped.startswith("@chainlink") or stripped.startswith("@tool"):
+            current = _parse_directive(line, i, document.sections)
+            document.sections[current.name] = current
+            continue
+
+        if current and line.strip():
+            current.lines.append((i, line.replace("\t", "  ")))
+        elif current and current.lines:
+            current.lines.append((i, ""))  # keep blank lines inside block scalars
+
+    _load_sections(document)
+    return document
+
+
+def _load_sections(document: FctrDocument) -> None:
+    """
+    Load the bodies of all the sections with a single YAML load. Every body is nested under
+    a synthetic key, and errors are mapped back to the lines of the original file.
+    """
+    combined = []
+    line_numbers = []
+    keys = {}
+
+    for index, section in enumerate(document.sections.values()):
+        key = f"__section_{index}__"
+        keys[key] = section
+        combined.append(f"{key}:")
+        line_numbers.append(section.line)
+
+        for i, line in section.lines:
+            combined.append("  " + line if line else "")
+            line_numbers.append(i)
+
+    try:
+        loaded = load_yaml("\n".join(combined)) or {}
+    except yaml.MarkedYAMLError as e:
+        mark = e.problem_mark or e.context_mark
+        line = line_numbers[min(mark.line, len(line_numbers) - 1)] if mark else None
+        raise ValueError(f"Error on line {line}. Invalid YAML: {e.problem}.") from e
+
+    for key, section in keys.items():
+        source = loaded.get(key) or {}
+        if not isinstance(source, dict):
+            raise ValueError(
+                f"Error on line {section.line}. The body of {section.name} must be a mapping."
+            )
+
+        section.source = source
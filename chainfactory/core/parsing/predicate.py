@@ -0,0 +1,198 @@
+"""
+This module evaluates the predicates of a chain factory file, e.g. the `when` condition of a
+`cascade` section: `classification.confidence in ["low", "none"]`, without `eval`.
+
+A predicate is a Python expression restricted to comparisons, boolean operators, literals and
+field lookups. The expression is parsed and checked once, then evaluated against the fields of
+a mapping or an object (e.g. the structured output of a chainlink).
+"""
+
+import ast
+import operator
+from functools import lru_cache
+from typing import Any, Callable, Mapping
+
+_COMPARISONS: dict[type, Callable[[Any, Any], bool]] = {
+    ast.Eq: operator.eq,
+    ast.NotEq: operator.ne,
+    ast.Lt: operator.lt,
+    ast.LtE: operator.le,
+    ast.Gt: operator.gt,
+    ast.GtE: operator.ge,
+    ast.In: lambda a, b: a in b,
+    ast.NotIn: lambda a, b: a not in b,
+    ast.Is: operator.is_,
+    ast.IsNot: operator.is_not,
+}
+
+_FUNCTIONS: dict[str, Callable[..., Any]] = {
+    "len": len,
+    "lower": lambda value: str(value).lower(),
+}
+
+
+class PredicateError(ValueError):
+    """
+    Raised when a predicate cannot be parsed or evaluated.
+    """
+
+    def __init__(self, message: str, expression: str):
+        self.expression = expression
+        super().__init__(f"{message} in `{expression}`")
+
+
+def _check(node: ast.AST, expression: str) -> None:
+    """
+    Reject everything but comparisons, boolean operators, literals and field lookups.
+    """
+    match node:
+        case ast.Expression(body=body):
+            _check(body, expression)
+        case ast.BoolOp(values=values):
+            for value in values:
+                _check(value, expression)
+        case ast.UnaryOp(op=ast.Not() | ast.USub(), operand=operand):
+            _check(operand, expression)
+        case ast.Compare(left=left, ops=ops, comparators=comparators):
+            for op in ops:
+                if type(op) not in _COMPARISONS:
+                    raise PredicateError(
+                        f"Unsupported comparison {type(op).__name__}", expression
+                    )
+
+            for child in [left, *comparators]:
+                _check(child, expression)
+        case ast.Attribute(value=value, attr=attr):
+            if attr.startswith("_"):
+                raise PredicateError(f"Invalid field {attr}", expression)
+
+            _check(value, expression)
+        case ast.Subscript(value=value, slice=ast.Constant()):
+            _check(value, expression)
+        case ast.Call(func=ast.Name(id=name), args=args, keywords=[]):
+            if name not in _FUNCTIONS:
+                raise PredicateError(f"Unsupported function {name}", expression)
+
+            for arg in args:
+                _check(arg, expression)
+        case (
+            ast.List(elts=elements) | ast.Tuple(elts=elements) | ast.Set(elts=elements)
+        ):
+            for element in elements:
+                _check(element, expression)
+        case ast.Name(id=name):
+            if name.startswith("_"):
+                raise PredicateError(f"Invalid field {name}", expression)
+        case ast.Constant():
+            pass
+        case _:
+            raise PredicateError(
+                f"Unsupported expression {type(node).__name__}", expression
+            )
+
+
+@lru_cache(maxsize=256)
+def _parse(expression: str) -> ast.Expression:
+    try:
+        tree = ast.parse(expression.strip(), mode="eval")
+    except SyntaxError as e:
+        raise PredicateError(f"Invalid syntax ({e.msg})", expression) from e
+
+    _check(tree, expression)
+    return tree
+
+
+def _lookup(value: Any, key: Any) -> Any:
+    """
+    Get a field of a mapping, an object or a sequence. Missing fields are None.
+    """
+    if value is None:
+        return None
+
+    if isinstance(value, Mapping):
+        return value.get(key)
+
+    if isinstance(value, (list, tuple, str)) and isinstance(key, int):
+        return value[key] if -len(value) <= key < len(value) else None
+
+    if isinstance(key, str):
+        return getattr(value, key, None)
+
+    return None
+
+
+class Predicate:
+    """
+    A parsed predicate. The names of the expression are looked up in the variables it is
+    evaluated with, e.g. `Predicate('label == "spam"')({"label": "spam"})` is True.
+    """
+
+    expression: str
+    names: set[str]
+
+    def __init__(self, expression: str):
+        if not isinstance(expression, str) or not expression.strip():
+            raise PredicateError("Empty predicate", str(expression))
+
+        self.expression = expression
+        self._tree = _parse(expression)
+        functions = {
+            id(node.func) for node in ast.walk(self._tree) if isinstance(node, ast.Call)
+        }
+        self.names = {
+            node.id
+            for node in ast.walk(self._tree)
+            if isinstance(node, ast.Name) and id(node) not in functions
+        }
+
+    def __call__(self, variables: Any) -> bool:
+        try:
+            return bool(self._evaluate(self._tree.body, variables))
+        except PredicateError:
+            raise
+        except Exception as e:
+            raise PredicateError(f"Evaluation failed ({e})", self.expression) from e
+
+    def __repr__(self) -> str:
+        return f"Predicate({self.expression!r})"
+
+    def _evaluate(self, node: ast.AST, variables: Any) -> Any:
+        match node:
+            case ast.BoolOp(op=ast.And(), values=values):
+                return all(self._evaluate(value, variables) for value in values)
+            case ast.BoolOp(op=ast.Or(), values=values):
+                return any(self._evaluate(value, variables) for value in values)
+            case ast.UnaryOp(op=ast.Not(), operand=operand):
+                return not self._evaluate(operand, variables)
+            case ast.UnaryOp(op=ast.USub(), operand=operand):
+                return -self._evaluate(operand, variables)
+            case ast.Compare(left=left, ops=ops, comparators=comparators):
+                a = self._evaluate(left, variables)
+                for op, comparator in zip(ops, comparators):
+                    b = self._evaluate(comparator, variables)
+                    if not _COMPARISONS[type(op)](a, b):
+                        return False
+
+                    a = b
+
+                return True
+            case ast.Attribute(value=value, attr=attr):
+                return _lookup(self._evaluate(value, variables), attr)
+            case ast.Subscript(value=value, slice=ast.Constant(value=key)):
+                return _lookup(self._evaluate(value, variables), key)
+            case ast.Call(func=ast.Name(id=name), args=args):
+                return _FUNCTIONS[name](
+                    *[self._evaluate(arg, variables) for arg in args]
+                )
+            case ast.List(elts=elements) | ast.Tuple(elts=elements):
+                return [self._evaluate(element, variables) for element in elements]
+            case ast.Set(elts=elements):
+                return {self._evaluate(element, variables) for element in elements}
+            case ast.Name(id=name):
+                return _lookup(variables, name)
+            case ast.Constant(value=value):
+                return value
+            case _:
+                raise PredicateError(
+                    f"Unsupported expression {type(node).__name__}", self.expression
+                )
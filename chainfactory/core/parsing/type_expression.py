@@ -0,0 +1,329 @@
+"""
+This module parses the type expressions used in the `def`, `in` and `out` sections of a chain
+factory file, e.g. `dict[str, list[Foo]]`, `Literal["a", "b"]`, `int | None` or `Foo?`, without `eval`.
+
+Parsing and resolution are separate steps: the syntax tree of an expression only depends on
+its text and is memoised, while the resolution depends on the types defined in the file.
+"""
+
+import re
+from functools import lru_cache
+from typing import Any, ForwardRef, Literal, Optional, Union
+
+_TOKEN_PATTERN = re.compile(
+    r"""
+    (?P<space>\s+)
+    | (?P<string>"(?:[^"\\]|\\.)*"|'(?:[^'\\]|\\.)*')
+    | (?P<number>-?\d+(?:\.\d+)?)
+    | (?P<name>[A-Za-z_][A-Za-z0-9_]*)
+    | (?P<punct>[\[\],|?])
+    """,
+    re.VERBOSE,
+)
+
+_BUILTIN_TYPES: dict[str, Any] = {
+    "str": str,
+    "int": int,
+    "float": float,
+    "bool": bool,
+    "bytes": bytes,
+    "Any": Any,
+    "None": None,
+}
+
+_GENERIC_TYPES: dict[str, Any] = {
+    "list": list,
+    "dict": dict,
+    "set": set,
+    "tuple": tuple,
+}
+
+_LITERAL_NAMES: dict[str, Any] = {
+    "True": True,
+    "False": False,
+    "None": None,
+}
+
+
+class TypeExpressionError(ValueError):
+    """
+    Raised when a type expression cannot be parsed or resolved. `line` is the line of the
+    `.fctr` file the expression is on, when the parser knows it.
+    """
+
+    def __init__(self, message: str, expression: str, column: int | None = None):
+        self.expression = expression
+        self.column = column
+        self.line: int | None = None
+
+        if column is not None:
+            message = f"{message} at column {column + 1} of `{expression}`"
+        else:
+            message = f"{message} in `{expression}`"
+
+        super().__init__(message)
+
+
+def _tokenize(expression: str) -> list[tuple[str, str, int]]:
+    """
+    Split a type expression into (kind, text, column) tokens.
+    """
+    tokens = []
+    position = 0
+
+    while position < len(expression):
+        match = _TOKEN_PATTERN.match(expression, position)
+        if not match:
+            raise TypeExpressionError(
+                f"Unexpected character {expression[position]!r}", expression, position
+            )
+
+        kind = match.lastgroup
+        assert kind
+        if kind != "space":
+            tokens.append((kind, match.group(), position))
+
+        position = match.end()
+
+    return tokens
+
+
+class _Parser:
+    """
+    Recursive descent parser producing a syntax tree of nested tuples:
+    `("name", name, args | None)`, `("literal", value)`, `("union", members)` and `("optional", node)`.
+    """
+
+    def __init__(self, expression: str):
+        self.expression = expression
+        self.tokens = _tokenize(expression)
+        self.index = 0
+
+    def _peek(self) -> tuple[str, str, int] | None:
+        return self.tokens[self.index] if self.index < len(self.tokens) else None
+
+    def _error(self, message: str) -> TypeExpressionError:
+        token = self._peek()
+        column = token[2] if token else len(self.expression)
+        return TypeExpressionError(message, self.expression, column)
+
+    def _expect(self, text: str) -> None:
+        token = self._peek()
+        if not token or token[1] != text:
+            raise self._error(f"Expected {text!r}")
+
+        self.index += 1
+
+    def parse(self) -> tuple:
+        if not self.tokens:
+            raise TypeExpressionError("Empty type expression", self.expression)
+
+        node = self._union()
+        if self._peek():
+            raise self._error("Unexpected token")
+
+        return node
+
+    def _union(self) -> tuple:
+        members = [self._postfix()]
+        while (token := self._peek()) and token[1] == "|":
+            self.index += 1
+            members.append(self._postfix())
+
+        return members[0] if len(members) == 1 else ("union", tuple(members))
+
+    def _postfix(self) -> tuple:
+        node = self._primary()
+        if (token := self._peek()) and token[1] == "?":
+            self.index += 1
+            node = ("optional", node)
+
+        return node
+
+    def _primary(self) -> tuple:
+        token = self._peek()
+        if not token:
+            raise self._error("Unexpected end of expression")
+
+        kind, text, _ = token
+        self.index += 1
+
+        if kind == "string":
+            return ("literal", _unquote(text))
+
+        if kind == "number":
+            return ("literal", float(text) if "." in text else int(text))
+
+        if kind != "name":
+            self.index -= 1
+            raise self._error("Expected a type")
+
+        args = None
+        if (next_token := self._peek()) and next_token[1] == "[":
+            self.index += 1
+            args = [self._union()]
+            while (next_token := self._peek()) and next_token[1] == ",":
+                self.index += 1
+                if (next_token := self._peek()) and next_token[1] == "]":
+                    break  # trailing comma
+
+                args.append(self._union())
+
+            self._expect("]")
+            args = tuple(args)
+
+        return ("name", text, args)
+
+
+def _unquote(text: str) -> str:
+    """
+    Strip the quotes of a string token and resolve its escapes.
+    """
+    return re.sub(r"\\(.)", r"\1", text[1:-1])
+
+
+@lru_cache(maxsize=4096)
+def parse_type_expression(expression: str) -> tuple:
+    """
+    Parse a type expression into its syntax tree. The result is memoised by the expression text.
+    """
+    return _Parser(expression.strip()).parse()
+
+
+class TypeResolver:
+    """
+    Resolves the syntax trees of type expressions against the defined types of a file.
+    Names listed in `forward_refs` that are not defined yet resolve to forward references.
+    """
+
+    def __init__(
+        self,
+        defined_types: dict[str, type] | None = None,
+        forward_refs: set[str] | None = None,
+    ):
+        self.defined_types = defined_types or {}
+        self.forward_refs = forward_refs or set()
+        self.uses_forward_refs = False
+
+    def resolve(self, expression: str) -> Any:
+        """
+        Parse and resolve a type expression.
+        """
+        return self._resolve(parse_type_expression(expression), expression)
+
+    def _resolve(self, node: tuple, expression: str) -> Any:
+        match node[0]:
+            case "optional":
+                return Optional[self._resolve(node[1], expression)]
+            case "union":
+                members = tuple(self._resolve(member, expression) for member in node[1])
+                return Union[members]  # type: ignore
+            case "literal":
+                raise TypeExpressionError(
+                    f"Unexpected literal {node[1]!r} outside of Literal[...]", expression
+                )
+            case _:
+                return self._resolve_name(node[1], node[2], expression)
+
+    def _resolve_name(self, name: str, args: tuple | None, expression: str) -> Any:
+        if name == "Literal":
+            if not args:
+                raise TypeExpressionError("Literal requires values", expression)
+
+            return Literal[tuple(self._literal_value(arg, expression) for arg in args)]  # type: ignore
+
+        if name in ["Optional", "Union"]:
+            if not args or (name == "Optional" and len(args) != 1):
+                raise TypeExpressionError(f"Invalid {name}[...] arguments", expression)
+
+            resolved = tuple(self._resolve(arg, expression) for arg in args)
+            return Optional[resolved[0]] if name == "Optional" else Union[resolved]  # type: ignore
+
+        if name in _GENERIC_TYPES:
+            origin = _GENERIC_TYPES[name]
+            if args is None:
+                return origin
+
+            resolved = tuple(self._resolve(arg, expression) for arg in args)
+            return origin[resolved if len(resolved) > 1 else resolved[0]]
+
+        if args is not None:
+            raise TypeExpressionError(f"Type {name} is not generic", expression)
+
+        if name in self.defined_types:
+            return self.defined_types[name]
+
+        if name in _BUILTIN_TYPES:
+            return _BUILTIN_TYPES[name]
+
+        if name in self.forward_refs:
+            self.uses_forward_refs = True
+            return ForwardRef(name)
+
+        raise TypeExpressionError(f"Unknown type {name!r}", expression)
+
+    @staticmethod
+    def _literal_value(node: tuple, expression: str) -> Any:
+        if node[0] == "literal":
+            return node[1]
+
+        if node[0] == "name" and node[1] in _LITERAL_NAMES and node[2] is None:
+            return _LITERAL_NAMES[node[1]]
+
+        raise TypeExpressionError("Literal values must be strings, numbers, booleans or None", expression)
+
+
+def _split_top_level(text: str, separator: str) -> list[str]:
+    """
+    Split a string on a separator that is not inside quotes or brackets.
+    """
+    parts = []
+    depth = 0
+    quote = None
+    start = 0
+
+    for i, char in enumerate(text):
+        if quote:
+            if char == quote and text[i - 1] != "\\":
+                quote = None
+        elif char in "\"'":
+            quote = char
+        elif char == "[":
+            depth += 1
+        elif char == "]":
+            depth -= 1
+        elif char == separator and depth == 0:
+            parts.append(text[start:i])
+            start = i + 1
+
+    parts.append(text[start:])
+    return parts
+
+
+@lru_cache(maxsize=4096)
+def parse_attribute(spec: str) -> tuple[str, str | None, str | None]:
+    """
+    Split an attribute definition of the form `type = default % description` (or
+    `type % description = default`) into its type expression, default value and description.
+    """
+    parts = [part.strip() for part in _split_top_level(spec, "%")]
+    if len(parts) > 2:
+        raise ValueError("Invalid attribute definition % can only be used once.")
+
+    attr_type = parts[0]
+    description = parts[1] if len(parts) == 2 else None
+    default_value = None
+
+    if description and "=" in description:
+        description, default_value = [
+            part.strip() for part in description.split("=", 1)
+        ]
+
+    type_parts = [part.strip() for part in _split_top_level(attr_type, "=")]
+    if len(type_parts) > 2:
+        raise ValueError("Invalid attribute definition = can only be used once.")
+
+    if len(type_parts) == 2:
+        attr_type, default_value = type_parts
+
+    return attr_type, default_value, description
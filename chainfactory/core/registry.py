@@ -0,0 +1,270 @@
+"""
+This module defines the `ChainRegistry`, which loads a directory of `.fctr` files into engines and
+reloads them when the files change, without restarting the process.
+"""
+
+import os
+import threading
+from pathlib import Path
+from typing import Any, Callable
+
+from chainfactory.core.engine import ChainFactoryEngine, ChainFactoryEngineConfig
+from chainfactory.core.log import get_logger
+
+logger = get_logger("registry")
+
+
+class ChainRegistry:
+    """
+    A registry of the engines of all the `.fctr` files in a directory, keyed by their path
+    relative to the directory without the extension (e.g. `support/classify`).
+
+    The files are watched by polling their modification times, either explicitly with `check()`
+    or from a background thread started with `start()`. When a file changes, only that file and
+    the chains that `@extends` it (directly or indirectly) are parsed again. The new engine
+    replaces the old one atomically: `get()` returns the new version from then on, while runs
+    that already hold the old engine finish on it.
+
+    An engine can serve concurrent runs from several threads, every run reading the outputs of
+    its own links. The `execution_trace` of the engine, and the token usage recorded in it, are
+    shared by its runs though: use an engine per thread when the trace is needed.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        config: ChainFactoryEngineConfig = ChainFactoryEngineConfig(),
+        engine_cls: type[ChainFactoryEngine] = ChainFactoryEngine,
+        pattern: str = "**/*.fctr",
+        poll_interval: float = 1.0,
+        on_reload: Callable[[str, ChainFactoryEngine], Any] | None = None,
+    ):
+        if poll_interval <= 0:
+            raise ValueError("poll_interval must be greater than 0")
+
+        self.directory = Path(directory).resolve()
+        self.config = config
+        self.engine_cls = engine_cls
+        self.pattern = pattern
+        self.poll_interval = poll_interval
+        self.on_reload = on_reload
+
+        self.engines: dict[str, ChainFactoryEngine] = {}
+        self.errors: dict[str, Exception] = {}
+        self._paths: dict[str, str] = {}  # name -> path of the .fctr file
+        self._dependencies: dict[str, list[str]] = {}  # name -> the file and its bases
+        self._mtimes: dict[str, int | None] = {}
+
+        # the engines are guarded by `_lock`, held briefly, and the files are parsed under
+        # `_reload_lock` only, so requests are not blocked by reloads
+        self._lock = threading.RLock()
+        self._reload_lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def load(self) -> "ChainRegistry":
+        """
+        Load all the chains of the directory. Errors are raised here, unlike on reloads.
+        """
+        with self._reload_lock:
+            paths = self._scan()
+            mtimes = self._stat(paths.values())
+            for name, path in paths.items():
+                self._swap(name, path, *self._build(path))
+
+            self._record(mtimes)
+
+        return self
+
+    def get(self, name: str) -> ChainFactoryEngine:
+        """
+        Get the current engine of a chain.
+        """
+        with self._lock:
+            if name not in self.engines:
+                raise KeyError(f"Chain {name} not found in {self.directory}.")
+
+            return self.engines[name]
+
+    def __getitem__(self, name: str) -> ChainFactoryEngine:
+        return self.get(name)
+
+    def __contains__(self, name: str) -> bool:
+        with self._lock:
+            return name in self.engines
+
+    def names(self) -> list[str]:
+        """
+        The names of the loaded chains.
+        """
+        with self._lock:
+            return sorted(self.engines.keys())
+
+    def warmup(self, ping: bool = False) -> dict[str, dict[str, float]]:
+        """
+        Warm up the engines of all the loaded chains. See `ChainFactoryEngine.warmup`.
+        """
+        with self._lock:
+            engines = dict(self.engines)
+
+        return {name: engine.warmup(ping=ping) for name, engine in engines.items()}
+
+    def check(self) -> list[str]:
+        """
+        Reload the chains whose files, or the files they extend, changed since the last check,
+        load the new files and drop the deleted ones. Returns the names of the reloaded chains.
+        """
+        with self._reload_lock:
+            paths = self._scan()
+            mtimes = self._stat([*self._mtimes, *paths.values()])
+            changed = {
+                path
+                for path, mtime_ns in self._mtimes.items()
+                if mtimes[path] != mtime_ns
+            }
+
+            with self._lock:
+                for name in list(self._paths.keys()):
+                    if name not in paths:
+                        self.engines.pop(name, None)
+                        self.errors.pop(name, None)
+                        del self._paths[name]
+                        del self._dependencies[name]
+
+                affected = [
+                    name
+                    for name, path in paths.items()
+                    if name not in self._paths
+                    or changed.intersection(self._dependencies.get(name, []))
+                ]
+
+            reloaded = []
+            for name in affected:
+                try:
+                    engine, dependencies = self._build(paths[name])
+                except Exception as e:
+                    with self._lock:
+                        self.errors[name] = e
+                        self._paths[name] = paths[name]
+                        self._dependencies.setdefault(name, [paths[name]])
+
+                    logger.exception(
+                        "Failed to reload %s, keeping the previous version.", name
+                    )
+                    continue
+
+                self._swap(name, paths[name], engine, dependencies)
+                reloaded.append(name)
+                if self.on_reload:
+                    self.on_reload(name, engine)
+
+            self._record(mtimes)
+            return reloaded
+
+    def start(self) -> "ChainRegistry":
+        """
+        Start watching the directory from a background thread.
+        """
+        if self._thread and self._thread.is_alive():
+            return self
+
+        self._stop_event.clear()
+        self._thread = threading.Thread(
+            target=self._watch, name="chainfactory-registry", daemon=True
+        )
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        """
+        Stop watching the directory.
+        """
+        self._stop_event.set()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+
+    def __enter__(self) -> "ChainRegistry":
+        if not self.engines:
+            self.load()
+
+        return self.start()
+
+    def __exit__(self, *_) -> None:
+        self.stop()
+
+    def _watch(self) -> None:
+        while not self._stop_event.wait(self.poll_interval):
+            try:
+                self.check()
+            except Exception:
+                logger.exception("Failed to check %s for changes.", self.directory)
+
+    def _scan(self) -> dict[str, str]:
+        """
+        Find the .fctr files of the directory.
+        """
+        paths = {}
+        for path in sorted(self.directory.glob(self.pattern)):
+            if path.is_file():
+                name = path.relative_to(self.directory).with_suffix("").as_posix()
+                paths[name] = str(path)
+
+        return paths
+
+    def _stat(self, paths) -> dict[str, int | None]:
+        return {path: self._mtime(path) for path in paths}
+
+    def _record(self, mtimes: dict[str, int | None]) -> None:
+        """
+        Record the modification times of the files the chains depend on, as they were stated
+        before the files were parsed, so a file saved during a reload is reloaded again by the
+        next check. A base file outside the directory that was never stated before is recorded
+        as unknown, which reloads its chains once more on the next check.
+        """
+        with self._lock:
+            all_dependencies = list(self._dependencies.values())
+
+        self._mtimes = {
+            path: mtimes.get(path)
+            for dependencies in all_dependencies
+            for path in dependencies
+        }
+
+    def _build(self, path: str) -> tuple[ChainFactoryEngine, list[str]]:
+        """
+        Create the engine of a chain, without holding the lock of the engines. Returns the
+        engine and the files it depends on: its own and the ones it extends.
+        """
+        engine = self.engine_cls.from_file(path, config=self.config)
+
+        dependencies = []
+        factory = engine.factory
+        while factory is not None:
+            dependencies.append(factory.path or path)
+            factory = factory.base_chain
+
+        return engine, dependencies
+
+    def _swap(
+        self,
+        name: str,
+        path: str,
+        engine: ChainFactoryEngine,
+        dependencies: list[str],
+    ) -> None:
+        """
+        Swap in the new engine of a chain.
+        """
+        with self._lock:
+            self.engines[name] = engine
+            self._paths[name] = path
+            self._dependencies[name] = dependencies
+            self.errors.pop(name, None)
+
+    @staticmethod
+    def _mtime(path: str) -> int | None:
+        try:
+            return os.stat(path).st_mtime_ns
+        except OSError:
+            return None
@@ -1,5 +1,6 @@
-from typing import Literal
+from typing import Literal, Mapping
 from enum import Enum
+from collections import ChainMap
 
 ChainlinkTypeTokens = Literal["sequential", "parallel", "--", "||"]
 
@@ -7,3 +8,36 @@ ChainlinkTypeTokens = Literal["sequential", "parallel", "--", "||"]
 class ChainlinkTypesEnum(str, Enum):
     PARALLEL = "parallel"
     SEQUENTIAL = "sequential"
+
+
+ToolTargetTokens = Literal["thread", "process"]
+
+
+class OverlayDict(ChainMap):
+    """
+    A copy-free mapping that overlays the result of a step (its delta) on top of the step's input.
+    Lookups fall through to the input, so downstream steps see the merged view.
+    """
+
+    @classmethod
+    def overlay(cls, delta: dict, base: Mapping) -> "OverlayDict":
+        """
+        Overlay `delta` on `base` without copying either. Nested overlays are flattened.
+        """
+        if isinstance(base, ChainMap):
+            return cls(delta, *base.maps)
+
+        return cls(delta, base)  # type: ignore
+
+    @property
+    def delta(self) -> dict:
+        """
+        The keys written by the step that produced this mapping.
+        """
+        return self.maps[0]
+
+    def dict(self) -> dict:
+        """
+        Materialize the merged view into a plain dictionary.
+        """
+        return dict(self)
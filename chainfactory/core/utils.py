@@ -1,5 +1,11 @@
 import os
 import json
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Any, Callable, Hashable, Mapping
+
+from chainfactory.core.types import OverlayDict
 
 BASE_CACHE_PATH = ".chainfactory/cache"
 
@@ -28,3 +34,110 @@ def load_cache_file(key: str) -> dict | None:
 
     with open(path, "r") as file:
         return json.load(file)
+
+
+@lru_cache(maxsize=None)
+def _get_encoding(model: str | None):
+    """
+    This function returns the tiktoken encoding for a model, falling back to `cl100k_base`.
+    Returns None if no encoding can be loaded (e.g. the encoding files cannot be downloaded).
+    """
+    import tiktoken
+
+    try:
+        if model:
+            try:
+                return tiktoken.encoding_for_model(model)
+            except KeyError:
+                pass
+
+        return tiktoken.get_encoding("cl100k_base")
+    except Exception:
+        return None
+
+
+def count_tokens(text: str, model: str | None = None) -> int:
+    """
+    This function counts the tokens in a text. Models unknown to tiktoken are approximated with `cl100k_base`,
+    and if no encoding is available at all, with 4 characters per token.
+    """
+    encoding = _get_encoding(model)
+    if encoding is None:
+        return len(text) // 4 + 1
+
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+class LRUCache:
+    """
+    A thread-safe mapping that keeps the `max_size` most recently used entries.
+    """
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._entries: OrderedDict[Hashable, Any] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            if key not in self._entries:
+                return default
+
+            self._entries.move_to_end(key)
+            return self._entries[key]
+
+    def put(self, key: Hashable, value: Any) -> None:
+        if self.max_size < 1:
+            return
+
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+def to_jsonable(
+    value: Any,
+    path: str = "$",
+    default: Callable[[Any], Any] | None = None,
+) -> Any:
+    """
+    Convert an output into JSON compatible values: models and overlays become dictionaries.
+    Raises a TypeError for any other type (e.g. datetimes or sets), which would not be read
+    back as the same value, unless a `default` converts it, like `str` for display.
+    """
+    if isinstance(value, OverlayDict):
+        value = value.dict()
+
+    if hasattr(value, "model_dump"):
+        return value.model_dump(mode="json")
+
+    if isinstance(value, Mapping):
+        return {
+            str(key): to_jsonable(item, f"{path}.{key}", default)
+            for key, item in value.items()
+        }
+
+    if isinstance(value, (list, tuple)):
+        return [
+            to_jsonable(item, f"{path}[{i}]", default) for i, item in enumerate(value)
+        ]
+
+    if value is None or isinstance(value, (str, int, float, bool)):
+        return value
+
+    if default is not None:
+        return default(value)
+
+    raise TypeError(
+        f"Object of type {type(value).__name__} at {path} is not JSON serializable."
+    )
@@ -0,0 +1,116 @@
+"""
+Fixtures of the test suite. The tests run offline: the `model` fixture replaces the OpenAI chat
+model with a fake one answering with filler values of the requested output type.
+"""
+
+import threading
+import time
+import typing
+
+import pytest
+from langchain_core.messages import BaseMessage
+from langchain_core.prompt_values import PromptValue
+from langchain_core.runnables import RunnableLambda
+from pydantic import BaseModel
+
+import chainfactory.core.engine.concurrency as concurrency
+import chainfactory.core.engine.models as models
+from chainfactory.core.factory_cache import clear_factory_cache
+
+
+class FakeModel:
+    """
+    Stands in for the chat model of every chainlink. The list fields of the outputs are
+    answered with `items`, a call whose prompt contains `fail_on` raises a RuntimeError and
+    every call takes `delay` seconds. The prompts of the calls are recorded in `calls`, their
+    messages in `messages` and the arguments of the chat models created in `models`.
+    """
+
+    def __init__(self):
+        self.items: list[str] = ["a", "b", "c"]
+        self.fail_on: str | None = None
+        self.delay = 0.0
+        self.calls: list[str] = []
+        self.messages: list[list[BaseMessage]] = []
+        self.models: list[dict] = []
+        self._lock = threading.Lock()
+
+    def calls_with(self, text: str) -> list[str]:
+        with self._lock:
+            return [call for call in self.calls if text in call]
+
+    def chat(self, **kwargs) -> "FakeChat":
+        with self._lock:
+            self.models.append(kwargs)
+
+        return FakeChat(self)
+
+    def respond(self, schema: type[BaseModel], prompt: PromptValue) -> BaseModel:
+        text = prompt.to_string()
+        with self._lock:
+            self.calls.append(text)
+            self.messages.append(prompt.to_messages())
+
+        if self.delay:
+            time.sleep(self.delay)
+
+        if self.fail_on is not None and self.fail_on in text:
+            raise RuntimeError(f"The model failed on `{text}`")
+
+        return self._fill(schema, text)
+
+    def _fill(self, schema: type[BaseModel], prompt: str) -> BaseModel:
+        values = {}
+        for name, field in schema.model_fields.items():
+            annotation = field.annotation
+            origin = typing.get_origin(annotation)
+            if annotation is bool:
+                values[name] = True
+            elif annotation in (int, float):
+                values[name] = 1
+            elif origin is list:
+                (item_type,) = typing.get_args(annotation)
+                if isinstance(item_type, type) and issubclass(item_type, BaseModel):
+                    values[name] = [self._fill(item_type, prompt) for _ in self.items]
+                else:
+                    values[name] = list(self.items)
+            elif origin is typing.Literal:
+                values[name] = typing.get_args(annotation)[0]
+            elif isinstance(annotation, type) and issubclass(annotation, BaseModel):
+                values[name] = self._fill(annotation, prompt)
+            else:
+                values[name] = f"{name}: {prompt}"
+
+        return schema(**values)
+
+
+class FakeChat:
+    def __init__(self, model: FakeModel):
+        self.model = model
+
+    def with_structured_output(
+        self, schema: type[BaseModel], **kwargs
+    ) -> RunnableLambda:
+        return RunnableLambda(lambda prompt: self.model.respond(schema, prompt))
+
+
+@pytest.fixture(autouse=True)
+def isolated(tmp_path, monkeypatch):
+    """
+    Run every test in a temporary directory, with empty process-wide caches.
+    """
+    monkeypatch.chdir(tmp_path)
+    models.clear_model_cache()
+    clear_factory_cache()
+    monkeypatch.setattr(concurrency, "_limiters", {})
+    monkeypatch.setattr(concurrency, "_saved_limits", None)
+    monkeypatch.setattr(concurrency, "_last_save", None)
+    yield
+    models.clear_model_cache()
+
+
+@pytest.fixture
+def model(monkeypatch) -> FakeModel:
+    fake = FakeModel()
+    monkeypatch.setattr(models, "ChatOpenAI", fake.chat, raising=False)
+    return fake
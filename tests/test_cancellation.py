@@ -0,0 +1,90 @@
+import threading
+import time
+
+import pytest
+
+from chainfactory import Engine, EngineConfig
+from chainfactory.core.engine.cancellation import (
+    CancelToken,
+    ChainCancelledError,
+    ChainTimeoutError,
+)
+
+SRC = """
+@chainlink gen --
+prompt: list items about {topic}
+out:
+  items: list[str]
+
+@chainlink each ||
+prompt: expand {items.element}
+out:
+  text: str
+"""
+
+ITEMS = [f"item{i}" for i in range(20)]
+
+
+@pytest.fixture
+def slow_model(model):
+    model.items = ITEMS
+    model.delay = 0.05
+    return model
+
+
+def test_fail_fast_drops_the_queued_calls(slow_model):
+    slow_model.fail_on = "item1"
+    engine = Engine.from_str(SRC, config=EngineConfig(max_parallel_chains=2))
+
+    with pytest.raises(RuntimeError, match="item1"):
+        engine(topic="x")
+
+    time.sleep(0.2)  # let the calls in flight complete
+    assert len(slow_model.calls_with("expand")) < len(ITEMS)
+
+
+def test_without_fail_fast_every_element_runs(slow_model):
+    slow_model.fail_on = "item1"
+    config = EngineConfig(max_parallel_chains=2, fail_fast=False)
+    engine = Engine.from_str(SRC, config=config)
+
+    with pytest.raises(RuntimeError, match="item1"):
+        engine(topic="x")
+
+    assert len(slow_model.calls_with("expand")) == len(ITEMS)
+
+
+def test_cancelled_run_stops_waiting(slow_model):
+    engine = Engine.from_str(SRC, config=EngineConfig(max_parallel_chains=2))
+    token = CancelToken()
+    threading.Timer(0.1, token.cancel).start()
+
+    started = time.monotonic()
+    with pytest.raises(ChainCancelledError):
+        engine.run({"topic": "x"}, cancel=token)
+
+    assert time.monotonic() - started < 0.4
+    time.sleep(0.2)
+    assert len(slow_model.calls_with("expand")) < len(ITEMS)
+
+
+def test_run_exceeding_its_timeout_raises(slow_model):
+    engine = Engine.from_str(SRC, config=EngineConfig(max_parallel_chains=2))
+
+    with pytest.raises(ChainTimeoutError):
+        engine.run({"topic": "x"}, timeout=0.2)
+
+
+def test_cancelling_a_run_leaves_the_other_runs_of_the_engine(slow_model):
+    engine = Engine.from_str(SRC, config=EngineConfig(max_parallel_chains=2))
+    token = CancelToken()
+    outputs = []
+    other = threading.Thread(target=lambda: outputs.append(engine(topic="y")))
+    other.start()
+    threading.Timer(0.1, token.cancel).start()
+
+    with pytest.raises(ChainCancelledError):
+        engine.run({"topic": "x"}, cancel=token)
+
+    other.join()
+    assert len(outputs[0]) == len(ITEMS)
@@ -0,0 +1,75 @@
+import pytest
+
+from chainfactory import Engine, EngineConfig
+from chainfactory.core.engine.chainfactory_engine_config import ModelProfile
+
+WHEN = """'text == "text: Human: expand b"'"""  # quoted for the colons
+
+SRC = """
+@chainlink gen --
+prompt: list items about {topic}
+out:
+  items: list[str]
+
+@chainlink each ||
+prompt: expand {items.element}
+cascade:
+  model: large
+  when: WHEN
+out:
+  text: str
+"""
+
+CONFIG = EngineConfig(
+    model="gpt-4o-mini", model_profiles={"large": ModelProfile(model="gpt-4o")}
+)
+
+
+def test_only_the_matching_elements_are_escalated(model):
+    engine = Engine.from_str(SRC.replace("WHEN", WHEN), config=CONFIG)
+    engine(topic="x")
+
+    assert len(model.calls_with("expand a")) == 1
+    assert len(model.calls_with("expand b")) == 2
+    assert {kwargs["model"] for kwargs in model.models} == {"gpt-4o-mini", "gpt-4o"}
+    assert engine.execution_trace["each"]["cascade"] == {
+        "model": "openai:gpt-4o",
+        "elements": 3,
+        "escalated": 1,
+    }
+
+
+def test_sequential_links_are_escalated(model):
+    src = SRC.replace("@chainlink each ||", "@chainlink each --").replace(
+        "{items.element}", "{items}"
+    )
+    src = src.replace("WHEN", "len(text) > 0")
+    engine = Engine.from_str(src, config=CONFIG)
+    engine(topic="x")
+
+    assert len(model.calls_with("expand")) == 2
+    assert engine.execution_trace["each"]["cascade"]["escalated"] == 1
+
+
+def test_predicates_failing_on_an_output_do_not_escalate(model, caplog):
+    src = SRC.replace("WHEN", "text > 1")
+    engine = Engine.from_str(src, config=CONFIG)
+    engine(topic="x")
+
+    assert len(model.calls_with("expand")) == 3
+    assert "The cascade predicate of each failed" in caplog.text
+
+
+@pytest.mark.parametrize(
+    "section, message",
+    [
+        ("cascade:\n  model: large", "cannot be initialized without a predicate"),
+        ("cascade:\n  model: huge\n  when: text", "Unknown model profile: huge"),
+        ("cascade:\n  model: large\n  when: text.__class__", "Invalid field __class__"),
+    ],
+)
+def test_invalid_cascades_are_rejected(model, section, message):
+    src = SRC.split("cascade:")[0] + section + "\nout:\n  text: str\n"
+
+    with pytest.raises(ValueError, match=message):
+        Engine.from_str(src, config=CONFIG)
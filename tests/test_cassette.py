@@ -0,0 +1,83 @@
+import time
+
+import pytest
+
+from chainfactory import Cassette, CassetteMissError, Engine, EngineConfig
+
+SRC = """
+@chainlink gen --
+prompt: list items about {topic}
+out:
+  items: list[str]
+
+@tool shout ||
+in:
+  - items.element as item
+
+@chainlink summary --
+prompt: summarise {summary}
+mask:
+  template: "{shout}"
+out:
+  final: str
+"""
+
+
+@pytest.fixture
+def tool_calls() -> list:
+    return []
+
+
+@pytest.fixture
+def shout(tool_calls):
+    def shout(element):
+        tool_calls.append(element)
+        return {"shout": element.upper()}
+
+    return shout
+
+
+def run(cassette: Cassette, shout, topic: str = "x") -> dict:
+    config = EngineConfig(cassette=cassette, tools={"shout": shout})
+    return Engine.from_str(SRC, config=config)(topic=topic)
+
+
+@pytest.fixture
+def recorded(model, shout) -> tuple[str, dict]:
+    """
+    A recorded run of the chain: the path of the cassette and the output of the run.
+    """
+    model.delay = 0.05
+    with Cassette("run.jsonl.gz", mode="record") as cassette:
+        output = run(cassette, shout)
+
+    return "run.jsonl.gz", output
+
+
+def test_replay_serves_the_recorded_calls(model, shout, tool_calls, recorded):
+    path, output = recorded
+    model.calls.clear()
+    tool_calls.clear()
+
+    started = time.perf_counter()
+    assert run(Cassette(path), shout) == output
+
+    assert time.perf_counter() - started < 0.1  # zero latency by default
+    assert not model.calls
+    assert not tool_calls
+
+
+def test_replay_with_the_original_latency(shout, recorded):
+    path, _ = recorded
+
+    started = time.perf_counter()
+    run(Cassette(path, latency="original"), shout)
+
+    assert time.perf_counter() - started >= 0.1  # the two model calls
+
+
+def test_unrecorded_calls_raise(shout, recorded):
+    path, _ = recorded
+
+    with pytest.raises(CassetteMissError):
+        run(Cassette(path), shout, topic="other")
@@ -0,0 +1,124 @@
+import dataclasses
+import datetime
+import threading
+
+import pytest
+
+from chainfactory import Engine, EngineConfig, SQLiteCheckpointStore
+from chainfactory.core.engine import CheckpointStore
+
+SRC = """
+@chainlink gen --
+prompt: list items about {topic}
+out:
+  items: list[str]
+
+@chainlink each ||
+prompt: expand {items.element}
+out:
+  text: str
+
+@chainlink summary --
+prompt: summarise {summary}
+mask:
+  template: "{text}"
+out:
+  final: str
+"""
+
+ITEMS = [f"item{i}" for i in range(10)]
+
+
+@pytest.fixture
+def engine(model, tmp_path):
+    model.items = ITEMS
+    store = SQLiteCheckpointStore(str(tmp_path / "checkpoints.db"))
+    config = EngineConfig(checkpoint_store=store, max_parallel_chains=1)
+    return Engine.from_str(SRC, config=config)
+
+
+def test_resume_only_repeats_the_unfinished_work(model, engine):
+    model.fail_on = "item6"
+    with pytest.raises(RuntimeError) as error:
+        engine(topic="x")
+
+    run_id = error.value.run_id
+    model.fail_on = None
+    model.calls.clear()
+    output = engine.resume(run_id)
+
+    assert not model.calls_with("list items")
+    assert len(model.calls_with("expand")) <= len(ITEMS) - 6
+    assert len(model.calls_with("summarise")) == 1
+    assert [entry["restored"] for entry in engine.execution_trace_list[-3:]] == [
+        True,
+        False,
+        False,
+    ]
+
+    # a finished run is restored entirely
+    model.calls.clear()
+    assert engine.resume(run_id) == output
+    assert not model.calls
+
+
+def test_value_errors_fail_checkpointed_runs(model, engine):
+    valid = []
+
+    def validate(final: str) -> dict:
+        if not valid:
+            raise ValueError("The summary is invalid.")
+
+        return {"valid": True}
+
+    src = SRC + "\n@tool validate\n"
+    config = dataclasses.replace(engine.config, tools={"validate": validate})
+    engine = Engine.from_str(src, config=config)
+
+    with pytest.raises(ValueError, match="invalid") as error:
+        engine.run({"topic": "x"}, run_id="run")
+
+    assert error.value.run_id == "run"
+    valid.append(True)
+    model.calls.clear()
+    assert engine.resume("run")["valid"] is True
+    assert not model.calls
+
+
+def test_resume_requires_the_same_chain(model, engine):
+    engine.run({"topic": "x"}, run_id="run")
+
+    other = Engine.from_str(SRC.replace("summarise", "sum up"), config=engine.config)
+    with pytest.raises(ValueError):
+        other.resume("run")
+
+
+def test_concurrent_runs_are_checkpointed_separately(model, engine):
+    model.delay = 0.01
+    threads = [
+        threading.Thread(
+            target=engine.run, args=({"topic": topic},), kwargs={"run_id": topic}
+        )
+        for topic in ("x", "y")
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    store = engine.config.checkpoint_store
+    for run_id in ("x", "y"):
+        assert set(store.load_stages(run_id)) == {"gen", "each", "summary"}
+
+
+def test_values_that_are_not_json_compatible_are_not_checkpointed(tmp_path):
+    store = SQLiteCheckpointStore(str(tmp_path / "checkpoints.db"))
+    store.start_run("run", "chain", {"topic": "x"})
+
+    with pytest.raises(TypeError, match="date"):
+        store.save_element("run", "each", 0, {"day": datetime.date(2024, 1, 1)})
+
+
+def test_checkpoint_store_is_abstract():
+    with pytest.raises(TypeError):
+        CheckpointStore()  # type: ignore
@@ -0,0 +1,46 @@
+import datetime
+import json
+
+from chainfactory import EngineConfig
+from chainfactory.cli import main
+
+SRC = """
+@chainlink gen --
+prompt: list items about {topic}
+out:
+  items: list[str]
+
+@tool stamp
+"""
+
+
+def stamp(items: list[str]) -> dict:
+    return {"items": items, "day": datetime.date(2024, 1, 1)}
+
+
+CONFIG = EngineConfig(tools={"stamp": stamp})  # loaded with --config
+
+
+def test_outputs_that_are_not_json_compatible_are_written_as_strings(
+    model, tmp_path, capsys
+):
+    (tmp_path / "chain.fctr").write_text(SRC)
+    (tmp_path / "inputs.json").write_text(json.dumps({"topic": "x"}))
+
+    args = ["run", "chain.fctr", "--input", "inputs.json"]
+    assert main(args + ["--config", f"{__name__}:CONFIG"]) == 0
+
+    assert json.loads(capsys.readouterr().out) == {
+        "items": ["a", "b", "c"],
+        "day": "2024-01-01",
+    }
+
+
+def test_dry_runs_fill_the_variables_of_the_chain_input(model, tmp_path, capsys):
+    (tmp_path / "chain.fctr").write_text(SRC.replace("@tool stamp", ""))
+    (tmp_path / "inputs.json").write_text(json.dumps({"topic": "x"}))
+
+    assert main(["run", "chain.fctr", "--input", "inputs.json", "--dry-run"]) == 0
+
+    assert "list items about x" in capsys.readouterr().out
+    assert not model.calls
@@ -0,0 +1,147 @@
+import json
+import os
+import threading
+import time
+
+import pytest
+
+import chainfactory.core.engine.concurrency as concurrency
+from chainfactory import Engine, EngineConfig
+from chainfactory.core.engine.cancellation import CancelToken, ChainCancelledError
+from chainfactory.core.engine.concurrency import (
+    LIMITS_PATH,
+    SAVE_INTERVAL,
+    AdaptiveLimiter,
+    get_limiter,
+    is_overload,
+    save_limits,
+    schedule_save_limits,
+)
+
+
+class RateLimitError(Exception):
+    status_code = 429
+
+
+def complete(limiter: AdaptiveLimiter, latency: float, key: str = "link") -> None:
+    """
+    Report a successful call of `latency` seconds to the limiter.
+    """
+    limiter.acquire()
+    limiter.release(time.monotonic() - latency, key=key)
+
+
+def test_successful_calls_raise_the_limit():
+    limiter = AdaptiveLimiter(2, maximum=8)
+    for _ in range(10):
+        complete(limiter, 0.1)
+
+    assert 4 <= limiter.limit <= 8
+
+
+def test_throttling_halves_the_limit():
+    limiter = AdaptiveLimiter(8)
+    started = limiter.acquire()
+    limiter.release(started, RateLimitError())
+
+    assert limiter.limit == 4
+    assert limiter.snapshot()["throttled"] == 1
+    assert is_overload(TimeoutError())
+    assert not is_overload(ValueError())
+
+
+def test_inflated_latency_cuts_the_limit():
+    limiter = AdaptiveLimiter(8)
+    for _ in range(5):
+        complete(limiter, 0.1)
+
+    limit = limiter.limit
+    for _ in range(5):
+        complete(limiter, 1.0)
+
+    assert limiter.limit < limit
+
+
+def test_links_of_different_latencies_do_not_cut_the_limit():
+    limiter = AdaptiveLimiter(4)
+    for i in range(100):
+        complete(limiter, 0.3 if i % 2 else 3.0, key="short" if i % 2 else "long")
+
+    assert limiter.limit > 4
+    assert limiter.snapshot("long")["latency"] == pytest.approx(3.0, rel=0.05)
+
+
+def test_waiting_calls_raise_when_cancelled():
+    limiter = AdaptiveLimiter(1)
+    limiter.acquire()
+
+    token = CancelToken()
+    threading.Timer(0.1, token.cancel).start()
+    with pytest.raises(ChainCancelledError):
+        limiter.acquire(token)
+
+
+def test_only_throttled_limits_are_saved():
+    slow = get_limiter("fake:slow", 8, 64)
+    for _ in range(5):
+        complete(slow, 0.1)
+    for _ in range(5):
+        complete(slow, 1.0)
+
+    assert slow.limit < 8
+
+    throttled = get_limiter("fake:throttled", 8, 64)
+    throttled.release(throttled.acquire(), RateLimitError())
+
+    save_limits()
+    with open(LIMITS_PATH) as file:
+        assert json.load(file) == {"fake:throttled": 4}
+
+
+def test_limits_are_only_saved_when_they_change(monkeypatch):
+    limiter = get_limiter("fake:throttled", 8, 64)
+    schedule_save_limits()  # nothing learned yet
+    assert not os.path.exists(LIMITS_PATH)
+
+    limiter.release(limiter.acquire(), RateLimitError())
+    schedule_save_limits()
+    os.remove(LIMITS_PATH)
+
+    save_limits()
+    assert not os.path.exists(LIMITS_PATH)
+
+    # changes are saved at most every SAVE_INTERVAL
+    limiter.release(limiter.acquire(), RateLimitError())
+    schedule_save_limits()
+    assert not os.path.exists(LIMITS_PATH)
+
+    monkeypatch.setattr(concurrency, "_last_save", time.monotonic() - SAVE_INTERVAL)
+    schedule_save_limits()
+    with open(LIMITS_PATH) as file:
+        assert json.load(file) == {"fake:throttled": 2}
+
+
+SRC = """
+@chainlink gen --
+prompt: list items about {topic}
+out:
+  items: list[str]
+
+@chainlink each ||
+prompt: expand {items.element}
+out:
+  text: str
+"""
+
+
+def test_fail_fast_drops_the_calls_waiting_for_the_limiter(model):
+    model.items = [f"item{i}" for i in range(40)]
+    model.delay = 0.05
+    model.fail_on = "item1"
+    config = EngineConfig(adaptive_concurrency=True, max_parallel_chains=4)
+
+    with pytest.raises(RuntimeError, match="item1"):
+        Engine.from_str(SRC, config=config)(topic="x")
+
+    time.sleep(0.2)  # let the calls in flight complete
+    assert len(model.calls_with("expand")) < 20
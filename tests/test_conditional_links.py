@@ -0,0 +1,79 @@
+from chainfactory import Engine
+
+SRC = """
+@chainlink gen --
+prompt: list items about {topic}
+out:
+  items: list[str]
+
+@chainlink each ||
+prompt: expand {items.element}
+out:
+  text: str
+"""
+
+
+def test_filters_drop_elements_before_they_are_dispatched(model):
+    engine = Engine.from_str(
+        SRC.replace("out:\n  text", "filter: element != 'b'\nout:\n  text")
+    )
+    output = engine(topic="x")
+
+    assert len(output) == 2
+    assert not model.calls_with("expand b")
+    assert engine.execution_trace["each"]["filter"] == {
+        "elements": 3,
+        "kept": 2,
+        "dropped": 1,
+    }
+
+
+def test_filters_can_name_the_iterable_field(model):
+    Engine.from_str(SRC.replace("out:\n  text", "filter: items == 'a'\nout:\n  text"))(
+        topic="x"
+    )
+
+    assert len(model.calls_with("expand")) == 1
+
+
+def test_false_conditions_skip_sequential_links(model):
+    src = SRC.replace("@chainlink each ||", "@chainlink each --").replace(
+        "{items.element}", "{items}"
+    )
+    engine = Engine.from_str(
+        src.replace("out:\n  text", "when: len(items) > 5\nout:\n  text")
+    )
+    output = engine(topic="x")
+
+    assert not model.calls_with("expand")
+    assert output["items"] == model.items  # the input passes through
+    assert engine.execution_trace["each"]["skipped"] is True
+    assert engine.execution_trace["each"]["execution_time"] == 0
+
+
+def test_false_conditions_skip_parallel_links(model):
+    engine = Engine.from_str(
+        SRC.replace("out:\n  text", "when: len(items) > 5\nout:\n  text")
+    )
+
+    assert engine(topic="x") == []
+    assert not model.calls_with("expand")
+
+
+def test_true_conditions_run_the_link(model):
+    engine = Engine.from_str(
+        SRC.replace("out:\n  text", "when: len(items) == 3\nout:\n  text")
+    )
+
+    assert len(engine(topic="x")) == 3
+    assert engine.execution_trace["each"]["skipped"] is False
+
+
+def test_conditions_failing_to_evaluate_are_false(model, caplog):
+    engine = Engine.from_str(
+        SRC.replace("out:\n  text", "when: len(missing) > 0\nout:\n  text")
+    )
+    engine(topic="x")
+
+    assert not model.calls_with("expand")
+    assert "The when predicate of each failed" in caplog.text
@@ -0,0 +1,76 @@
+import time
+
+import pytest
+
+from chainfactory import ChainFactory, Engine
+
+SRC = """
+@chainlink classify
+needs: input
+prompt: classify {question}
+out:
+  topic: str
+
+@chainlink keywords
+needs: input
+prompt: list the keywords of {question}
+out:
+  words: str
+
+@chainlink answer
+needs: [classify, keywords]
+prompt: answer about {topic} with {words}
+out:
+  answer: str
+"""
+
+
+def test_branches_run_concurrently_and_join(model):
+    model.delay = 0.2
+    engine = Engine.from_str(SRC)
+
+    started = time.perf_counter()
+    output = engine(question="why?")
+
+    assert time.perf_counter() - started < 0.55  # the branches overlap
+    assert "about topic: Human: classify why?" in output.answer
+    assert "with words: Human: list the keywords of why?" in output.answer
+    assert [entry["name"] for entry in engine.execution_trace_list] == [
+        "classify",
+        "keywords",
+        "answer",
+    ]
+    assert engine.execution_trace["answer"]["needs"] == ["classify", "keywords"]
+
+
+@pytest.mark.parametrize(
+    "needs, message",
+    [
+        ("answer", "answer must be 'input' or a chainlink / tool defined above"),
+        ("later", "later must be 'input'"),
+        ("[]", "Must be a link name or a list of link names"),
+    ],
+)
+def test_needs_must_be_defined_above(needs, message):
+    src = SRC.replace("needs: [classify, keywords]", f"needs: {needs}")
+    src += "\n@chainlink later\nprompt: {answer}\n"
+
+    with pytest.raises(ValueError, match=message):
+        ChainFactory.from_str(src)
+
+
+def test_parallel_outputs_cannot_be_joined():
+    src = SRC.replace("@chainlink keywords", "@chainlink keywords ||")
+
+    with pytest.raises(ValueError, match="Outputs of parallel links cannot be joined"):
+        ChainFactory.from_str(src)
+
+
+def test_links_can_need_the_links_of_the_base_chain(model, tmp_path):
+    base, rest = SRC.split("@chainlink answer")
+    (tmp_path / "base.fctr").write_text(base)
+    child = f"@extends {tmp_path / 'base.fctr'}\n\n@chainlink answer{rest}"
+
+    output = Engine.from_str(child)(question="why?")
+
+    assert "about topic: Human: classify why?" in output.answer
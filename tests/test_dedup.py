@@ -0,0 +1,85 @@
+import pytest
+
+from chainfactory import Engine
+from chainfactory.core.components import FactoryDedup
+
+SRC = """
+@chainlink gen --
+prompt: list emails about {topic}
+out:
+  items: list[str]
+
+@chainlink classify ||
+prompt: classify {items.element}
+dedup: true
+out:
+  label: str
+"""
+
+
+def test_duplicates_share_a_single_call(model):
+    model.items = ["Hello  world", "hello world", "other", "HELLO WORLD"]
+    engine = Engine.from_str(SRC)
+
+    output = engine(topic="x")
+
+    assert len(model.calls_with("classify")) == 2
+    assert output[0] == output[1] == output[3] != output[2]
+    assert engine.execution_trace["classify"]["dedup"] == {
+        "elements": 4,
+        "unique": 2,
+        "cache_hits": 0,
+        "calls": 2,
+    }
+
+
+def test_results_are_reused_across_runs(model):
+    engine = Engine.from_str(SRC)
+    engine(topic="x")
+    model.calls.clear()
+
+    engine(topic="x")
+
+    assert not model.calls_with("classify")
+    assert engine.execution_trace["classify"]["dedup"]["cache_hits"] == 3
+
+
+def test_results_are_not_kept_without_a_cache(model):
+    engine = Engine.from_str(SRC.replace("dedup: true", "dedup:\n  cache_size: 0"))
+    engine(topic="x")
+    model.calls.clear()
+
+    engine(topic="x")
+
+    assert len(model.calls_with("classify")) == 3
+
+
+def test_keys_only_compare_the_dedup_fields():
+    dedup = FactoryDedup(fields=["items.element.body"], normalize=["whitespace"])
+
+    a = {"items$element$body": "Hi  there", "items$element$id": 1}
+    b = {"items$element$body": "Hi there", "items$element$id": 2}
+    c = {"items$element$body": "hi there", "items$element$id": 1}
+
+    assert dedup.key(a) == dedup.key(b) != dedup.key(c)
+    assert FactoryDedup(fields=["body"]).matches("items$element$body", "body")
+
+
+@pytest.mark.parametrize(
+    "section, message",
+    [
+        ("dedup:\n  fields: [subject]", "Invalid dedup field subject"),
+        ("dedup:\n  normalize: [accents]", "Invalid dedup normalization"),
+        ("dedup:\n  cache_size: -1", "cache_size must be 0 or greater"),
+    ],
+)
+def test_invalid_sections_are_rejected(model, section, message):
+    with pytest.raises(ValueError, match=message):
+        Engine.from_str(SRC.replace("dedup: true", section))
+
+
+def test_sequential_links_cannot_dedup(model):
+    src = SRC.replace("@chainlink classify ||", "@chainlink classify --")
+
+    with pytest.raises(ValueError, match="only supported for parallel chainlinks"):
+        Engine.from_str(src)
@@ -0,0 +1,79 @@
+import threading
+import time
+
+import pytest
+
+from chainfactory import ChainFactoryWorker, Engine, EngineConfig, SQLiteTaskQueue
+from chainfactory.core.engine import TaskQueue
+
+SRC = """
+@chainlink gen --
+prompt: list items about {topic}
+out:
+  items: list[str]
+
+@chainlink each ||
+prompt: expand {items.element}
+out:
+  text: str
+"""
+
+
+@pytest.fixture
+def queue(tmp_path) -> SQLiteTaskQueue:
+    return SQLiteTaskQueue(str(tmp_path / "tasks.db"))
+
+
+@pytest.fixture
+def worker(model, queue):
+    worker = ChainFactoryWorker(Engine.from_str(SRC), queue, concurrency=2)
+    thread = threading.Thread(target=worker.run, daemon=True)
+    thread.start()
+    yield worker
+    worker.stop()
+    thread.join()
+
+
+def test_parallel_stage_runs_on_the_workers(model, queue, worker):
+    local = Engine.from_str(SRC)(topic="x")
+
+    engine = Engine.from_str(SRC, config=EngineConfig(task_queue=queue))
+    assert engine(topic="x") == local
+
+    deadline = time.monotonic() + 1  # the worker counts a task after sending its result
+    while worker.executed < len(model.items) and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+    assert worker.executed == len(model.items)
+
+
+def test_failed_tasks_fail_the_stage(model, queue, worker):
+    model.fail_on = "expand b"
+
+    with pytest.raises(RuntimeError, match="failed on worker"):
+        Engine.from_str(SRC, config=EngineConfig(task_queue=queue))(topic="x")
+
+
+def test_stage_fails_when_no_worker_picks_up_its_tasks(model, queue):
+    config = EngineConfig(task_queue=queue, task_pickup_timeout=0.2)
+    engine = Engine.from_str(SRC, config=config)
+
+    with pytest.raises(TimeoutError, match="No worker picked up"):
+        engine(topic="x")
+
+    assert queue.claim([engine._fingerprint()], "late worker") is None
+
+
+def test_workers_only_take_tasks_of_their_chains(model, queue):
+    other = Engine.from_str(SRC.replace("expand", "describe"))
+    worker = ChainFactoryWorker(other, queue)
+    engine = Engine.from_str(SRC, config=EngineConfig(task_queue=queue))
+
+    task_ids = queue.put(engine._fingerprint(), "each", [{"items.element": "a"}])
+    assert worker.run(idle_timeout=0.1) == 0
+    assert queue.unclaimed(task_ids) == 1
+
+
+def test_task_queue_is_abstract():
+    with pytest.raises(TypeError):
+        TaskQueue()  # type: ignore
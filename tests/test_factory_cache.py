@@ -0,0 +1,93 @@
+import os
+
+from chainfactory import ChainFactory, EngineConfig
+
+BASE = """
+@chainlink gen
+prompt: list items about {topic}
+out:
+  items: list[str]
+"""
+
+CHILD = """
+@extends base.fctr
+
+@chainlink summary
+prompt: summarise {items}
+out:
+  final: str
+"""
+
+
+def write(path: str, content: str, mtime_ns: int | None = None) -> None:
+    with open(path, "w") as file:
+        file.write(content)
+
+    if mtime_ns is not None:
+        os.utime(path, ns=(mtime_ns, mtime_ns))
+
+
+def touch(path: str) -> None:
+    mtime_ns = os.stat(path).st_mtime_ns + 10**9
+    os.utime(path, ns=(mtime_ns, mtime_ns))
+
+
+def test_unchanged_files_are_parsed_once():
+    write("base.fctr", BASE)
+    write("child.fctr", CHILD)
+
+    factory = ChainFactory.from_file("child.fctr")
+
+    assert ChainFactory.from_file("child.fctr") is factory
+    assert ChainFactory.from_file("base.fctr") is factory.base_chain
+
+
+def test_touched_files_with_the_same_content_are_reused():
+    write("base.fctr", BASE)
+    factory = ChainFactory.from_file("base.fctr")
+
+    touch("base.fctr")
+
+    assert ChainFactory.from_file("base.fctr") is factory
+
+
+def test_changes_to_the_base_chain_invalidate_the_child():
+    write("base.fctr", BASE)
+    write("child.fctr", CHILD)
+    factory = ChainFactory.from_file("child.fctr")
+
+    write("base.fctr", BASE.replace("list items", "name items"))
+    touch("base.fctr")
+
+    reparsed = ChainFactory.from_file("child.fctr")
+    assert reparsed is not factory
+    assert "name items" in reparsed.links[0].prompt.template
+
+
+def make_tool():
+    def shout(items: list[str]) -> dict:
+        return {"shout": items}
+
+    return shout
+
+
+def test_factories_are_cached_per_config():
+    write("base.fctr", BASE)
+    config = EngineConfig(tools={"shout": make_tool()})
+    factory = ChainFactory.from_file("base.fctr", config=config)
+
+    assert ChainFactory.from_file("base.fctr", config=config) is factory
+    assert ChainFactory.from_file("base.fctr") is not factory
+
+    # a function of the same name is another tool
+    other = EngineConfig(tools={"shout": make_tool()})
+    assert ChainFactory.from_file("base.fctr", config=other) is not factory
+
+
+def test_the_cache_can_be_disabled():
+    write("base.fctr", BASE)
+    config = EngineConfig(cache_factories=False)
+
+    assert ChainFactory.from_file("base.fctr", config=config) is not (
+        ChainFactory.from_file("base.fctr", config=config)
+    )
@@ -0,0 +1,84 @@
+import pytest
+
+from chainfactory import ChainFactory
+from chainfactory.core.parsing.fctr import parse_fctr
+
+SRC = """# a comment
+@extends chains/base.fctr
+
+@chainlink gen --
+prompt: |
+  list items about {topic}
+
+  one per line
+out:
+  items: list[str]
+
+@chainlink expand ||
+prompt: expand {items.element}
+out:
+  text: str
+
+@tool shout || process
+
+@chainlink
+prompt: summarise {text}
+"""
+
+
+def test_sections():
+    document = parse_fctr(SRC)
+
+    assert document.extends == "chains/base.fctr"
+    assert document.extends_line == 2
+
+    gen, expand, shout, unnamed = document.sections.values()
+    assert (gen.name, gen.link_type, gen.line) == ("gen", "sequential", 4)
+    assert (expand.name, expand.link_type, expand.line) == ("expand", "parallel", 12)
+    assert (shout.kind, shout.link_type, shout.target) == (
+        "tool",
+        "parallel",
+        "process",
+    )
+    assert unnamed.name.startswith("chainlink-")
+    assert unnamed.link_type == "sequential"
+
+
+def test_bodies_are_loaded_as_yaml():
+    gen = parse_fctr(SRC).sections["gen"]
+
+    assert gen.source == {
+        "prompt": "list items about {topic}\n\none per line\n",
+        "out": {"items": "list[str]"},
+    }
+    assert parse_fctr(SRC).sections["shout"].source == {}
+
+
+@pytest.mark.parametrize(
+    "content, message",
+    [
+        ("@extends a.fctr\n@extends b.fctr", "Error on line 2. @extends"),
+        ("@extends", "Error on line 1. Invalid @extends"),
+        ("@chainlink a --\n\n@chainlink a ||", "Error on line 3. Invalid @chainlink"),
+        ("@chainlink a sideways", "Error on line 1. Invalid @chainlink"),
+        ("@tool a -- gpu", "Error on line 1. Invalid @tool"),
+        ("@chainlink a\nprompt: x\n\n@chainlink b\nout: [a\n", "Error on line 5"),
+        ("@chainlink a\n- prompt", "Error on line 1. The body of a must be a mapping"),
+    ],
+)
+def test_errors_name_the_line(content, message):
+    with pytest.raises(ValueError, match=message):
+        parse_fctr(content)
+
+
+def test_type_errors_name_the_line_of_the_expression():
+    content = """
+@chainlink gen
+prompt: list items about {topic}
+out:
+  title: str
+  items: list[Item
+"""
+
+    with pytest.raises(ValueError, match="Error on line 6. Invalid @chainlink gen"):
+        ChainFactory.from_str(content)
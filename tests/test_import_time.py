@@ -0,0 +1,54 @@
+import os
+import re
+import subprocess
+import sys
+
+IMPORT = "from chainfactory import Engine, EngineConfig"
+
+# seconds, well above a local import (~0.8s) to leave room for slower CI runners
+IMPORT_TIME_BUDGET = 2.0
+
+PROVIDER_MODULES = {"langchain_openai", "langchain_anthropic", "langchain_ollama"}
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def importtime(code: str) -> list[tuple[str, int, bool]]:
+    """
+    Run `code` in a fresh interpreter with `-X importtime`. Returns the name, the cumulative
+    import time in microseconds and whether it's a top-level import, for every module.
+    """
+    path = os.pathsep.join(filter(None, [ROOT, os.environ.get("PYTHONPATH")]))
+    stderr = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        capture_output=True,
+        text=True,
+        check=True,
+        env={**os.environ, "PYTHONPATH": path},
+    ).stderr
+
+    modules = []
+    for line in stderr.splitlines():
+        match = re.match(r"import time:\s+\d+ \|\s+(\d+) \| (\s*)(\S+)", line)
+        if match:
+            modules.append((match.group(3), int(match.group(1)), not match.group(2)))
+
+    return modules
+
+
+def test_import_time_is_within_budget():
+    startup = {name for name, _, _ in importtime("pass")}
+    modules = importtime(IMPORT)
+
+    # the top-level imports of the statement, without the ones of the interpreter startup
+    total = sum(
+        us for name, us, top_level in modules if top_level and name not in startup
+    )
+
+    slowest = sorted(modules, key=lambda module: -module[1])[:10]
+    assert total / 1e6 < IMPORT_TIME_BUDGET, slowest
+
+
+def test_provider_sdks_are_not_imported():
+    packages = {name.split(".")[0] for name, _, _ in importtime(IMPORT)}
+    assert not packages & PROVIDER_MODULES
@@ -0,0 +1,44 @@
+import pytest
+
+import chainfactory.core.engine.chainfactory_engine as engine_module
+from chainfactory import Engine, EngineConfig
+
+SRC = """
+@chainlink summary
+prompt: summarise {topic}
+out:
+  summary: str
+"""
+
+
+@pytest.fixture
+def console(monkeypatch) -> list:
+    calls = []
+    monkeypatch.setattr(
+        engine_module, "enable_console_logging", lambda: calls.append(True)
+    )
+    return calls
+
+
+def test_print_trace_prints_to_the_console_in_development(model, console):
+    Engine.from_str(SRC, config=EngineConfig(print_trace=True))
+
+    assert console
+
+
+def test_production_leaves_the_logging_setup_to_the_application(model, console):
+    Engine.from_str(SRC, config=EngineConfig(profile="production", print_trace=True))
+
+    assert not console
+    with pytest.raises(ValueError):
+        EngineConfig(profile="production", console_logging=True)
+    with pytest.raises(ValueError):
+        EngineConfig(profile="production", pause_between_executions=True)
+
+
+def test_traces_are_logged(model, caplog):
+    caplog.set_level("INFO", logger="chainfactory")
+    config = EngineConfig(profile="production", print_trace_for_single_chain=True)
+    Engine.from_str(SRC, config=config)(topic="x")
+
+    assert "Output from 'summary'" in caplog.text
@@ -0,0 +1,73 @@
+import pytest
+
+from chainfactory import Engine, EngineConfig
+from chainfactory.core.engine.chainfactory_engine_config import ModelProfile
+
+SRC = """
+@chainlink gen --
+prompt: list items about {topic}
+out:
+  items: list[str]
+
+@chainlink extract ||
+prompt: extract the claims of {items.element}
+model: fast
+out:
+  claims: str
+
+@chainlink summary --
+prompt: summarise {summary}
+model:
+  temperature: 0.2
+mask:
+  template: "{claims}"
+out:
+  final: str
+"""
+
+CONFIG = EngineConfig(
+    model="gpt-4o",
+    temperature=0.5,
+    model_profiles={"fast": ModelProfile(model="gpt-4o-mini", temperature=0)},
+)
+
+
+def test_links_are_routed_to_their_models(model):
+    engine = Engine.from_str(SRC, config=CONFIG)
+    engine(topic="x")
+
+    assert {(kwargs["model"], kwargs["temperature"]) for kwargs in model.models} == {
+        ("gpt-4o", 0.5),
+        ("gpt-4o-mini", 0),
+        ("gpt-4o", 0.2),  # the inline profile inherits the model of the config
+    }
+    assert [entry["model"] for entry in engine.execution_trace_list] == [
+        "openai:gpt-4o",
+        "openai:gpt-4o-mini",
+        "openai:gpt-4o",
+    ]
+
+
+def test_profiles_inherit_the_unset_fields():
+    config = EngineConfig(
+        provider="anthropic",
+        temperature=0.3,
+        model_profiles={"local": ModelProfile(provider="ollama")},
+    )
+
+    assert config.resolve_model(None).describe() == "anthropic:claude-3-5-sonnet-latest"
+    local = config.resolve_model("local")
+    assert local.model == "llama3.2"
+    assert local.temperature == 0.3
+
+
+def test_unknown_profiles_are_rejected(model):
+    with pytest.raises(ValueError, match="Unknown model profile: fast"):
+        Engine.from_str(SRC)
+
+
+def test_inline_profiles_only_take_the_profile_fields():
+    src = SRC.replace("temperature: 0.2", "top_p: 0.2")
+
+    with pytest.raises(ValueError, match="Invalid model section in chainlink summary"):
+        Engine.from_str(src, config=CONFIG)
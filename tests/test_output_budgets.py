@@ -0,0 +1,35 @@
+from chainfactory import Engine, EngineConfig
+
+SRC = """
+@chainlink summary
+prompt: summarise {topic}
+out:
+  summary: str
+
+@chainlink check
+prompt: is {summary} spam?
+out:
+  is_spam: bool
+"""
+
+
+def test_unbounded_outputs_have_no_limit_by_default(model):
+    Engine.from_str(SRC)(topic="x")
+
+    limits = [kwargs.get("max_tokens") for kwargs in model.models]
+    assert None in limits  # the summary
+    assert any(limit and limit < 100 for limit in limits)  # the bool
+
+
+def test_config_max_tokens_caps_every_link(model):
+    Engine.from_str(SRC, config=EngineConfig(max_tokens=20))(topic="x")
+
+    assert sorted(kwargs.get("max_tokens") for kwargs in model.models)[-1] == 20
+    assert all(kwargs.get("max_tokens") for kwargs in model.models)
+
+
+def test_max_tokens_section_takes_precedence(model):
+    src = SRC.replace("out:\n  summary", "max_tokens: 300\nout:\n  summary")
+    Engine.from_str(src, config=EngineConfig(max_tokens=20))(topic="x")
+
+    assert 300 in [kwargs.get("max_tokens") for kwargs in model.models]
@@ -0,0 +1,64 @@
+import re
+
+import pytest
+
+from chainfactory.core.parsing.predicate import Predicate, PredicateError
+
+
+@pytest.mark.parametrize(
+    "expression, variables, expected",
+    [
+        ('label == "spam"', {"label": "spam"}, True),
+        (
+            'classification.confidence in ["low", "none"]',
+            {"classification": {"confidence": "low"}},
+            True,
+        ),
+        ("len(items) > 2 and not done", {"items": [1, 2, 3], "done": False}, True),
+        (
+            'lower(label) != "spam" or score >= 0.5',
+            {"label": "SPAM", "score": 0.2},
+            False,
+        ),
+        ("items[0] is None", {"items": []}, True),
+        ("missing is None", {}, True),
+        ("-1 < score < 1", {"score": 0}, True),
+    ],
+)
+def test_predicates_evaluate_on_the_variables(expression, variables, expected):
+    assert Predicate(expression)(variables) is expected
+
+
+def test_fields_of_objects_are_looked_up():
+    class Output:
+        label = "spam"
+
+    assert Predicate('label == "spam"')(Output())
+    assert Predicate("len(label)").names == {"label"}
+
+
+@pytest.mark.parametrize(
+    "expression, message",
+    [
+        ("label.__class__", "Invalid field __class__"),
+        ("_private", "Invalid field _private"),
+        ("open('x')", "Unsupported function open"),
+        ("label.lower()", "Unsupported expression Call"),
+        ("(lambda: 1)()", "Unsupported expression Call"),
+        ("lambda: 1", "Unsupported expression Lambda"),
+        ("[x for x in items]", "Unsupported expression ListComp"),
+        ("(x := 1)", "Unsupported expression NamedExpr"),
+        ("items[0:1]", "Unsupported expression Subscript"),
+        ("len(items, key=1)", "Unsupported expression Call"),
+        ("label ==", "Invalid syntax"),
+        (" ", "Empty predicate"),
+    ],
+)
+def test_everything_else_is_rejected(expression, message):
+    with pytest.raises(PredicateError, match=re.escape(message)):
+        Predicate(expression)
+
+
+def test_failed_evaluations_raise():
+    with pytest.raises(PredicateError, match="Evaluation failed"):
+        Predicate("len(label)")({})
@@ -0,0 +1,67 @@
+import threading
+
+import pytest
+
+from chainfactory import Engine, EngineConfig
+
+SRC = """
+@chainlink gen --
+prompt: list items about {topic}
+out:
+  items: list[str]
+
+@tool measure || process
+in:
+  - items.element as item
+"""
+
+
+def measure(element: str) -> dict:
+    return {"length": len(element)}
+
+
+def broken(element: str) -> dict:
+    return {"length": len(element.missing)}  # type: ignore
+
+
+def unpicklable(element: str) -> dict:
+    return {"length": threading.Lock()}
+
+
+def run(fn, src: str = SRC, **input) -> list:
+    config = EngineConfig(tools={"measure": fn}, max_process_workers=2)
+    return Engine.from_str(src, config=config)(**{"topic": "x", **input})
+
+
+def test_tools_run_on_the_process_pool(model):
+    model.items = ["a", "bb", "ccc"]
+
+    assert [output["length"] for output in run(measure)] == [1, 2, 3]
+
+
+def test_errors_of_the_tool_are_raised_as_is(model):
+    with pytest.raises(AttributeError, match="missing"):
+        run(broken)
+
+
+def test_unpicklable_outputs_are_reported(model, caplog):
+    with pytest.raises(ValueError):
+        run(unpicklable)
+
+    assert "The outputs cannot be pickled" in caplog.text
+
+
+def test_unpicklable_inputs_are_reported(model, caplog):
+    src = SRC.replace(
+        "@tool measure || process\nin:\n  - items.element as item",
+        "@tool measure -- process\nneeds: input\nin:\n  - element",
+    )
+    with pytest.raises(ValueError):
+        run(measure, src, element=threading.Lock())
+
+    assert "The inputs cannot be pickled" in caplog.text
+
+
+def test_tools_that_cannot_be_pickled_are_rejected(model):
+    with pytest.raises(ValueError, match="cannot be pickled"):
+        run(lambda element: {"length": len(element)})
@@ -0,0 +1,110 @@
+import pytest
+from langchain_core.messages import AIMessage
+from langchain_core.outputs import ChatGeneration, LLMResult
+
+import chainfactory.core.engine.models as models
+from chainfactory import Engine, EngineConfig
+from chainfactory.core.engine.models import UsageTracker
+
+SRC = """
+@chainlink gen --
+prompt: "{topic} - list items"
+out:
+  items: list[str]
+
+@chainlink review ||
+prompt: You are a strict critic of haikus. Review this haiku - {items.element}
+out:
+  text: str
+"""
+
+
+@pytest.fixture
+def anthropic(model, monkeypatch):
+    monkeypatch.setattr(models, "ChatAnthropic", model.chat, raising=False)
+    return model
+
+
+def reviews(model) -> list:
+    """
+    The content of the review prompts, in the order of the elements.
+    """
+    return sorted(
+        (messages[-1].content for messages in model.messages[1:]),
+        key=lambda content: str(
+            content[-1]["text"] if isinstance(content, list) else content
+        ),
+    )
+
+
+def test_the_static_prefix_is_marked_for_anthropic(anthropic):
+    config = EngineConfig(provider="anthropic", prompt_caching=True)
+    Engine.from_str(SRC, config=config)(topic="x")
+
+    prefix = {
+        "type": "text",
+        "text": "You are a strict critic of haikus. Review this haiku - ",
+        "cache_control": {"type": "ephemeral"},
+    }
+    assert reviews(anthropic) == [
+        [prefix, {"type": "text", "text": item}] for item in anthropic.items
+    ]
+    # without a static prefix there's nothing to cache
+    assert anthropic.messages[0][-1].content == "x - list items"
+
+
+def test_the_static_prefix_is_sent_first_for_openai(model):
+    Engine.from_str(SRC, config=EngineConfig(prompt_caching=True))(topic="x")
+
+    assert [block["text"] for block in reviews(model)[0]] == [
+        "You are a strict critic of haikus. Review this haiku - ",
+        "a",
+    ]
+    assert "cache_control" not in reviews(model)[0][0]
+
+
+def test_prompts_are_unchanged_without_prompt_caching(model):
+    Engine.from_str(SRC)(topic="x")
+
+    assert (
+        reviews(model)[0] == "You are a strict critic of haikus. Review this haiku - a"
+    )
+
+
+def test_usage_counts_the_cached_tokens():
+    message = AIMessage(
+        content="",
+        usage_metadata={
+            "input_tokens": 1200,
+            "output_tokens": 20,
+            "total_tokens": 1220,
+            "input_token_details": {"cache_read": 1024, "cache_creation": 0},
+        },
+    )
+    result = LLMResult(generations=[[ChatGeneration(message=message)]])
+
+    usage = UsageTracker()
+    usage.on_llm_end(result)
+    usage.on_llm_end(result)
+    usage.on_llm_end(LLMResult(generations=[[ChatGeneration(message=AIMessage(""))]]))
+
+    assert usage.snapshot() == {
+        "calls": 2,
+        "input_tokens": 2400,
+        "output_tokens": 40,
+        "cache_read_tokens": 2048,
+        "cache_creation_tokens": 0,
+    }
+
+
+def test_the_usage_of_every_link_is_traced(model):
+    engine = Engine.from_str(SRC)
+    engine(topic="x")
+
+    assert set(engine.execution_trace["review"]["usage"]) == {
+        "calls",
+        "input_tokens",
+        "output_tokens",
+        "cache_read_tokens",
+        "cache_creation_tokens",
+    }
@@ -0,0 +1,98 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from chainfactory import ChainRegistry, Engine
+
+BASE = """
+@chainlink gen
+prompt: list items about {topic}
+out:
+  items: list[str]
+"""
+
+CHILD = """
+@extends chains/base.fctr
+
+@chainlink each ||
+prompt: expand {items.element}
+out:
+  text: str
+"""
+
+
+def write(path, text: str) -> None:
+    path.write_text(text)
+    os.utime(path, ns=(os.stat(path).st_mtime_ns + 10**9,) * 2)  # a distinct mtime
+
+
+def prompt(engine: Engine, name: str) -> str:
+    return engine.chains[name]["link"].prompt.template
+
+
+def test_changes_reload_the_chain_and_the_chains_extending_it(model, tmp_path):
+    chains = tmp_path / "chains"
+    chains.mkdir()
+    write(chains / "base.fctr", BASE)
+    write(chains / "child.fctr", CHILD)
+    registry = ChainRegistry(str(chains)).load()
+    assert registry.names() == ["base", "child"]
+    assert registry.check() == []
+
+    write(chains / "base.fctr", BASE.replace("list items", "list ideas"))
+    assert sorted(registry.check()) == ["base", "child"]
+    assert "list ideas" in prompt(registry.get("child"), "gen")
+
+    write(chains / "child.fctr", CHILD.replace("expand", "describe"))
+    assert registry.check() == ["child"]
+
+
+def test_files_saved_while_parsing_are_reloaded(model, tmp_path, monkeypatch):
+    chains = tmp_path / "chains"
+    chains.mkdir()
+    write(chains / "base.fctr", BASE)
+    from_file = Engine.from_file
+
+    def save_while_parsing(path, *args, **kwargs):
+        engine = from_file(path, *args, **kwargs)
+        write(chains / "base.fctr", BASE.replace("list items", "list ideas"))
+        return engine
+
+    monkeypatch.setattr(Engine, "from_file", save_while_parsing)
+    registry = ChainRegistry(str(chains)).load()
+    monkeypatch.setattr(Engine, "from_file", from_file)
+
+    assert registry.check() == ["base"]
+    assert "list ideas" in prompt(registry.get("base"), "gen")
+
+
+def test_engines_serve_concurrent_runs(model, tmp_path):
+    chains = tmp_path / "chains"
+    chains.mkdir()
+    write(
+        chains / "title.fctr",
+        """
+@chainlink title
+prompt: write a title about {topic}
+out:
+  title: str
+
+@chainlink body
+prompt: write about {title}
+out:
+  body: str
+
+@chainlink final
+needs: [title, body]
+prompt: join {title} and {body}
+out:
+  text: str
+""",
+    )
+    engine = ChainRegistry(str(chains)).load().get("title")
+    model.delay = 0.05
+
+    with ThreadPoolExecutor(4) as executor:
+        outputs = list(executor.map(lambda topic: engine(topic=topic), "abcd"))
+
+    for topic, output in zip("abcd", outputs):
+        assert output.text.count(f"write a title about {topic}") == 2
@@ -0,0 +1,56 @@
+import pytest
+
+from chainfactory import Engine
+from chainfactory.core.utils import count_tokens
+
+SRC = """
+@chainlink gen --
+prompt: list items about {topic}
+out:
+  items: list[str]
+
+@chainlink each ||
+prompt: expand {items.element}
+out:
+  text: str
+
+@chainlink summary --
+prompt: PREAMBLE summarise {summary}
+mask:
+  template: "{text}"
+reduce:
+  type: tree
+  chunk_tokens: 120
+out:
+  final: str
+"""
+
+
+@pytest.fixture
+def items(model) -> list[str]:
+    model.items = [f"item{i}" for i in range(30)]
+    return model.items
+
+
+def leaf_calls(model) -> list[str]:
+    """
+    The reduces of the first round, on the masked elements rather than partial results.
+    """
+    return [call for call in model.calls_with("summarise") if "final:" not in call]
+
+
+def test_chunks_are_reduced_until_one_output_remains(model, items):
+    output = Engine.from_str(SRC.replace("PREAMBLE ", ""))(topic="x")
+
+    leaves = leaf_calls(model)
+    assert len(leaves) > 1
+    assert sum(call.count("expand") for call in leaves) == len(items)
+    assert len(model.calls_with("summarise")) > len(leaves)
+    assert output.final.startswith("final: Human: summarise")
+
+
+def test_the_template_counts_against_the_chunk_budget(model, items):
+    Engine.from_str(SRC.replace("PREAMBLE", "word " * 60))(topic="x")
+
+    for call in leaf_calls(model):
+        assert count_tokens(call, "gpt-4o") <= 130  # the list adds a few tokens
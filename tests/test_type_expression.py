@@ -0,0 +1,115 @@
+import re
+from typing import Any, ForwardRef, Literal, Optional, Union
+
+import pytest
+from pydantic import BaseModel
+
+from chainfactory.core.parsing.type_expression import (
+    TypeExpressionError,
+    TypeResolver,
+    parse_attribute,
+    parse_type_expression,
+)
+
+
+class Foo(BaseModel):
+    name: str
+
+
+def resolve(expression: str) -> Any:
+    return TypeResolver({"Foo": Foo}).resolve(expression)
+
+
+@pytest.mark.parametrize(
+    "expression, expected",
+    [
+        ("str", str),
+        ("int", int),
+        ("float", float),
+        ("bool", bool),
+        ("bytes", bytes),
+        ("Any", Any),
+        ("list", list),
+        ("dict", dict),
+        ("list[str]", list[str]),
+        ("set[int]", set[int]),
+        ("tuple[int, str]", tuple[int, str]),
+        ("dict[str, list[Foo]]", dict[str, list[Foo]]),
+        ("dict[str, dict[str, list[int]]]", dict[str, dict[str, list[int]]]),
+        ("Optional[int]", Optional[int]),
+        ("Union[int, str]", Union[int, str]),
+        ("int | None", Optional[int]),
+        ("Foo?", Optional[Foo]),
+        ("list[Foo?]", list[Optional[Foo]]),
+        ("list[Foo]?", Optional[list[Foo]]),
+    ],
+)
+def test_resolve(expression, expected):
+    assert resolve(expression) == expected
+
+
+def test_literals():
+    assert (
+        resolve("Literal['a', \"b, c\", 1, 2.5, True, None]")
+        == Literal["a", "b, c", 1, 2.5, True, None]
+    )
+
+
+def test_forward_references():
+    resolver = TypeResolver({}, forward_refs={"Node"})
+
+    assert resolver.resolve("list[Node]") == list[ForwardRef("Node")]
+    assert resolver.uses_forward_refs
+
+
+def test_defined_types_take_precedence_over_forward_references():
+    resolver = TypeResolver({"Foo": Foo}, forward_refs={"Foo"})
+
+    assert resolver.resolve("Foo") is Foo
+    assert not resolver.uses_forward_refs
+
+
+@pytest.mark.parametrize(
+    "expression, message",
+    [
+        ("Bar", "Unknown type 'Bar'"),
+        ("object", "Unknown type 'object'"),
+        ("str[int]", "not generic"),
+        ("list[str", "column"),
+        ("list[str]]", "column"),
+        ("list[str;]", "Unexpected character ';' at column 9"),
+        ("'a'", "outside of Literal"),
+        ("Literal[str]", "Literal values"),
+        ("Optional[int, str]", "Invalid Optional"),
+        ("__import__('os')", "Unexpected character '('"),
+    ],
+)
+def test_invalid_expressions(expression, message):
+    with pytest.raises(TypeExpressionError, match=re.escape(message)):
+        resolve(expression)
+
+
+def test_syntax_trees_are_memoised():
+    assert parse_type_expression("list[Foo]") is parse_type_expression("list[Foo]")
+
+
+@pytest.mark.parametrize(
+    "spec, expected",
+    [
+        ("str", ("str", None, None)),
+        ("str = 'a' % the name", ("str", "'a'", "the name")),
+        ("str % the name = 'a'", ("str", "'a'", "the name")),
+        (
+            'Literal["50%", "100%"] % a ratio',
+            ('Literal["50%", "100%"]', None, "a ratio"),
+        ),
+        ("dict[str, int] = {}", ("dict[str, int]", "{}", None)),
+    ],
+)
+def test_parse_attribute(spec, expected):
+    assert parse_attribute(spec) == expected
+
+
+def test_percent_can_only_be_used_once():
+    with pytest.raises(ValueError, match="% can only be used once"):
+        parse_attribute("str % a % b")